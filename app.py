@@ -5,16 +5,25 @@ from typing import Optional, List
 from dotenv import load_dotenv
 import logging
 import sys
-
-from flask import Flask, abort, jsonify, request, send_from_directory
+import threading
+import time
+import base64
+import hashlib
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from urllib.parse import unquote
+
+from flask import Flask, Response, abort, g, has_request_context, jsonify, request, send_file, send_from_directory, stream_with_context, url_for
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from sqlalchemy import create_engine, Column, Integer, String, Date, DateTime, ForeignKey, Text, Table, UniqueConstraint, Boolean, inspect, text
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship, scoped_session, backref
+from sqlalchemy import create_engine, event, insert, case, Insert, Update, Delete, Column, Integer, String, Date, DateTime, ForeignKey, MetaData, Text, Table, UniqueConstraint, Boolean, Index, and_, func, inspect, or_, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import declarative_base, sessionmaker, Session, relationship, scoped_session, backref, selectinload
 from pydantic import BaseModel, EmailStr, Field, field_validator
 import jwt
-import bcrypt
+from werkzeug.http import is_resource_modified
 
 # Load environment variables from .env file
 load_dotenv()
@@ -50,8 +59,15 @@ except ImportError:
     SUPABASE_AVAILABLE = False
     logger.warning("Supabase not installed. Run: pip install supabase")
 
+from document_cache import document_cache
+from password_hashing import PasswordHashingBusy, password_hasher
+from media_processing import IMAGE_TYPES, PIL_AVAILABLE, PROFILE_PHOTO_SIZES, can_preview, profile_variant_path, render_profile_variants, render_thumbnail, run_media, thumbnail_path
+from presence import presence, viewer_key
+from prompt_templates import registry as prompt_registry
+from triage_model import merge_fallback, train_triage_model
+
 try:
-    from llm_service import get_symptom_analyzer
+    from llm_service import blocked_log_writer, get_symptom_analyzer, semantic_cache, PRIORITY_BACKGROUND
     LLM_SERVICE_AVAILABLE = True
     logger.info("LLM service loaded successfully")
 except ImportError as e:
@@ -64,18 +80,66 @@ JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key-change-in-production")
 logger.info(f"JWT_SECRET loaded: {JWT_SECRET[:30]}... (length: {len(JWT_SECRET)})")
 JWT_EXPIRATION = 7 * 24 * 60 * 60  # 7 days in seconds
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "")
+DOCUMENT_LINK_TTL = int(os.getenv("DOCUMENT_LINK_TTL", "300"))  # seconds a signed document link stays valid
+
+# Blocking third-party I/O (Gemini, SMTP, storage cleanup) runs on these pools so
+# request threads/greenlets are never tied up longer than LLM_REQUEST_TIMEOUT
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", "4"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))  # seconds, below gunicorn's 120s
+background_executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix="medicare-bg")
+llm_executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="medicare-llm")
+
+# Batch symptom analysis (clinic intake)
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+
+# Bulk document operations (move, update, delete): max document ids per request
+DOCUMENT_BULK_MAX = int(os.getenv("DOCUMENT_BULK_MAX", "200"))
+
+# Local triage model: retrained from consultations/diseases at most this often (seconds)
+TRIAGE_RETRAIN_INTERVAL = int(os.getenv("TRIAGE_RETRAIN_INTERVAL", "3600"))
+
+# SQLite production profile (applied on every new DBAPI connection)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))  # 16 MB page cache per connection
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024)))  # 128 MB memory-mapped I/O
+SQLITE_MAINTENANCE_INTERVAL = int(os.getenv("SQLITE_MAINTENANCE_INTERVAL", "300"))  # seconds, 0 disables
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record=None) -> None:
+    """Tune a raw sqlite3 connection for concurrent web workers.
+
+    WAL lets notification polls read while a message send is writing,
+    busy_timeout makes writers wait for the lock instead of failing with
+    "database is locked", and synchronous=NORMAL only fsyncs at checkpoints.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")  # silently ignored for :memory: databases
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+
+def build_engine(url: str):
+    """Create an engine with the pool/profile settings appropriate for the backend"""
+    if url.startswith("sqlite"):
+        sqlite_engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            future=True,
+        )
+        event.listen(sqlite_engine, "connect", apply_sqlite_pragmas)
+        logger.info(f"SQLite profile enabled: WAL, synchronous=NORMAL, busy_timeout={SQLITE_BUSY_TIMEOUT_MS}ms")
+        return sqlite_engine
 
-# Create engine with optimized connection pooling
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={"check_same_thread": False},
-        future=True,
-    )
-else:
     # For PostgreSQL/MySQL: Configure connection pool
-    engine = create_engine(
-        DATABASE_URL,
+    pooled_engine = create_engine(
+        url,
         pool_size=10,  # Number of connections to keep open
         max_overflow=20,  # Max additional connections beyond pool_size
         pool_pre_ping=True,  # Verify connections before using
@@ -83,8 +147,121 @@ else:
         future=True,
     )
     logger.info("Database connection pool configured: pool_size=10, max_overflow=20")
+    return pooled_engine
+
+
+# Create engine with optimized connection pooling
+engine = build_engine(DATABASE_URL)
+
+# Optional read replica: GET requests read from here, writes always go to `engine`
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", "")
+REPLICA_LAG_TOLERANCE = float(os.getenv("REPLICA_LAG_TOLERANCE", "5"))  # seconds
+read_engine = build_engine(DATABASE_READ_URL) if DATABASE_READ_URL else None
+if read_engine is not None:
+    logger.info(f"Read replica configured, lag tolerance {REPLICA_LAG_TOLERANCE}s")
+
+# Principals that wrote recently read from the primary until the replica catches up
+_primary_pins = {}  # {principal_key: monotonic expiry}
+_primary_pins_lock = threading.Lock()
+_replica_lag = {"checked_at": 0.0, "seconds": 0.0}
+
+
+def _auth_key(auth_header: str) -> str:
+    return hashlib.sha256(auth_header.encode('utf-8')).hexdigest()
+
 
-SessionLocal = scoped_session(sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True))
+def _principal_keys() -> List[str]:
+    """Keys identifying the caller: the bearer token, or the client address for anonymous requests
+
+    The address is never used alongside a token: everyone behind a shared NAT (a
+    clinic's front desk) would otherwise be pinned by any one of them writing.
+    """
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header:
+        return [_auth_key(auth_header)]
+    return [f"ip:{get_remote_address()}"]
+
+
+def pin_to_primary(issued_token: Optional[str] = None) -> None:
+    """Route the current principal's reads to the primary for REPLICA_LAG_TOLERANCE seconds
+
+    issued_token: a token this response hands out (login/registration), whose
+    first requests must see the account that was just written.
+    """
+    if read_engine is None or not has_request_context():
+        return
+    keys = _principal_keys()
+    if issued_token:
+        keys.append(_auth_key(f"Bearer {issued_token}"))
+    now = time.monotonic()
+    with _primary_pins_lock:
+        for key in keys:
+            _primary_pins[key] = now + REPLICA_LAG_TOLERANCE
+        if len(_primary_pins) > 10000:
+            for key in [k for k, until in _primary_pins.items() if until <= now]:
+                del _primary_pins[key]
+
+
+def replica_lag_seconds() -> float:
+    """Replication lag of the read replica, re-measured at most once per second (PostgreSQL only)"""
+    now = time.monotonic()
+    if read_engine is None or read_engine.dialect.name != "postgresql" or now - _replica_lag["checked_at"] < 1:
+        return _replica_lag["seconds"]
+    _replica_lag["checked_at"] = now
+    try:
+        with read_engine.connect() as conn:
+            lag = conn.execute(text(
+                "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+            )).scalar()
+        _replica_lag["seconds"] = float(lag or 0)
+    except Exception as exc:
+        logger.warning(f"Replica lag check failed, using primary: {exc}")
+        _replica_lag["seconds"] = float("inf")
+    return _replica_lag["seconds"]
+
+
+def use_read_replica() -> bool:
+    """Whether reads in the current context may be served by the replica"""
+    if read_engine is None or not has_request_context():
+        return False
+    if request.method not in ("GET", "HEAD") or g.get("db_wrote"):
+        return False
+    now = time.monotonic()
+    with _primary_pins_lock:
+        if any(_primary_pins.get(key, 0) > now for key in _principal_keys()):
+            return False
+    return replica_lag_seconds() <= REPLICA_LAG_TOLERANCE
+
+
+class RoutingSession(Session):
+    """Session that sends GET-request reads to the replica pool and everything else to the primary"""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if isinstance(clause, (Insert, Update, Delete)):
+            # Core and bulk DML (query.update(), db.execute(insert(...))) never flush
+            mark_request_wrote()
+            return engine
+        if self._flushing:
+            return engine
+        if use_read_replica():
+            return read_engine
+        return engine
+
+
+def mark_request_wrote():
+    # Read-your-writes: once a request has written, the rest of it (and the
+    # caller's next requests) must not read stale rows from the replica
+    if read_engine is not None and has_request_context():
+        g.db_wrote = True
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def _mark_request_wrote(session, flush_context, instances):
+    if session.new or session.dirty or session.deleted:
+        mark_request_wrote()
+
+
+SessionLocal = scoped_session(sessionmaker(class_=RoutingSession, bind=engine, autoflush=False, autocommit=False, future=True))
 Base = declarative_base()
 
 
@@ -107,6 +284,40 @@ disease_symptom_table = Table(
 
 
 # Models
+def photo_urls(principal) -> dict:
+    """{size: url} of a user's or doctor's generated profile photo sizes"""
+    return {str(size): getattr(principal, f'photo_url_{size}') for size in PROFILE_PHOTO_SIZES if getattr(principal, f'photo_url_{size}')}
+
+
+def storage_path(public_url: Optional[str]) -> Optional[str]:
+    """Bucket path behind a medical-documents public URL, None for any other URL"""
+    marker = '/medical-documents/'
+    if not public_url or marker not in public_url:
+        return None
+    return unquote(public_url.split(marker, 1)[1].split('?', 1)[0]) or None
+
+
+def set_profile_photo(principal, url: Optional[str]) -> List[str]:
+    """Point a user/doctor at a new photo; sizes generated for the previous one no longer apply
+
+    Returns the storage paths of those replaced sizes, to remove once the change is committed.
+    """
+    if url == principal.photo_url:
+        return []
+    stale = [storage_path(getattr(principal, f'photo_url_{size}')) for size in PROFILE_PHOTO_SIZES]
+    principal.photo_url = url
+    for size in PROFILE_PHOTO_SIZES:
+        setattr(principal, f'photo_url_{size}', None)
+    return [path for path in stale if path]
+
+
+def avatar_url(principal) -> Optional[str]:
+    """Profile photo for list/card avatars: the 256px size once generated, else the upload"""
+    if principal is None:
+        return None
+    return principal.photo_url_256 or principal.photo_url
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -119,16 +330,19 @@ class User(Base):
     gender = Column(String(20), nullable=True)
     medical_history = Column(Text, nullable=True)
     photo_url = Column(String(300), nullable=True)
+    photo_url_64 = Column(String(300), nullable=True)  # normalized WebP sizes, see media_processing
+    photo_url_256 = Column(String(300), nullable=True)
+    photo_url_1024 = Column(String(300), nullable=True)
     role = Column(String(20), default='patient', nullable=False)
     is_cured = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(), nullable=False)
     updated_at = Column(DateTime, default=lambda: datetime.now(), onupdate=lambda: datetime.now(), nullable=False)
 
     def set_password(self, password: str):
-        self.password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        self.password = password_hasher.hash(password)
 
     def check_password(self, password: str) -> bool:
-        return bcrypt.checkpw(password.encode('utf-8'), self.password.encode('utf-8'))
+        return password_hasher.verify(password, self.password)
 
     def to_dict(self):
         return {
@@ -140,6 +354,7 @@ class User(Base):
             'gender': self.gender,
             'medical_history': self.medical_history,
             'photo_url': self.photo_url,
+            'photo_urls': photo_urls(self),
             'role': self.role,
             'is_cured': self.is_cured,
             'created_at': self.created_at.isoformat() if self.created_at else None,
@@ -209,6 +424,9 @@ class Doctor(Base):
     phone = Column(String(50), nullable=True)
     bio = Column(String(500), nullable=True)
     photo_url = Column(String(300), nullable=True)
+    photo_url_64 = Column(String(300), nullable=True)  # normalized WebP sizes, see media_processing
+    photo_url_256 = Column(String(300), nullable=True)
+    photo_url_1024 = Column(String(300), nullable=True)
     id_card_url = Column(String(300), nullable=True)
     is_active = Column(Boolean, default=True, nullable=False)
     is_online = Column(Boolean, default=False, nullable=False)
@@ -218,10 +436,10 @@ class Doctor(Base):
     ratings = relationship("Rating", back_populates="doctor", cascade="all, delete-orphan")
 
     def set_password(self, password: str):
-        self.password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        self.password = password_hasher.hash(password)
 
     def check_password(self, password: str) -> bool:
-        return bcrypt.checkpw(password.encode('utf-8'), self.password.encode('utf-8'))
+        return password_hasher.verify(password, self.password)
 
     def to_dict(self):
         return {
@@ -233,6 +451,7 @@ class Doctor(Base):
             'phone': self.phone,
             'bio': self.bio,
             'photo_url': self.photo_url,
+            'photo_urls': photo_urls(self),
             'id_card_url': self.id_card_url,
             'is_active': self.is_active,
             'is_online': self.is_online,
@@ -241,6 +460,20 @@ class Doctor(Base):
         }
 
 
+# Every login principal keyed by email. A view, not a table: kept out of
+# Base.metadata so create_all() never tries to create it (see create_accounts_view)
+ACCOUNTS_VIEW_SQL = (
+    "SELECT 'doctor' AS principal_type, id, email FROM doctors "
+    "UNION ALL SELECT 'user' AS principal_type, id, email FROM users"
+)
+accounts_view = Table(
+    "accounts", MetaData(),
+    Column("principal_type", String(10)),
+    Column("id", Integer),
+    Column("email", String(120)),
+)
+
+
 class DocumentFolder(Base):
     __tablename__ = "document_folders"
 
@@ -254,14 +487,17 @@ class DocumentFolder(Base):
     children = relationship("DocumentFolder", backref=backref('parent', remote_side=[id]))
     documents = relationship("Document", back_populates="folder")
 
-    def to_dict(self):
+    def to_dict(self, document_count: Optional[int] = None):
+        # Pass document_count from a grouped query; the fallback loads every document
+        if document_count is None:
+            document_count = len(self.documents) if self.documents else 0
         return {
             'id': self.id,
             'user_id': self.user_id,
             'name': self.name,
             'parent_id': self.parent_id,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'document_count': len(self.documents) if self.documents else 0
+            'document_count': document_count
         }
 
 
@@ -278,6 +514,10 @@ class Document(Base):
     file_size = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     folder_id = Column(Integer, ForeignKey("document_folders.id"), nullable=True, index=True)
+    thumbnail_url = Column(String(500), nullable=True)  # set by the post-upload preview pipeline
+
+    # Newest-first feeds per patient (doctor reports keyset pagination)
+    __table_args__ = (Index("ix_documents_user_created_id", "user_id", "created_at", "id"),)
 
     owner = relationship("User")
     folder = relationship("DocumentFolder", back_populates="documents")
@@ -294,6 +534,7 @@ class Document(Base):
             'file_size': self.file_size,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'folder_id': self.folder_id,
+            'thumbnail_url': self.thumbnail_url,
         }
 
 
@@ -315,6 +556,8 @@ class Consultation(Base):
     messages = relationship("Message", back_populates="consultation", cascade="all, delete-orphan")
     documents = relationship("ConsultationDocument", back_populates="consultation", cascade="all, delete-orphan")
     rating = relationship("Rating", back_populates="consultation", uselist=False, cascade="all, delete-orphan")
+    thread = relationship("ConsultationThread", back_populates="consultation", uselist=False, cascade="all, delete-orphan")
+    read_cursors = relationship("MessageReadCursor", cascade="all, delete-orphan")
 
 
 class Rating(Base):
@@ -343,11 +586,69 @@ class Message(Base):
     sender_id = Column(Integer, nullable=False)
     content = Column(Text, nullable=False)
     sent_at = Column(DateTime, default=lambda: datetime.now(), nullable=False)
-    is_read = Column(Boolean, default=False, nullable=False)
+    is_read = Column(Boolean, default=False, nullable=False)  # legacy; read state now lives in MessageReadCursor
+
+    # Unread counts are range scans: sender_type != reader AND id > cursor
+    __table_args__ = (Index("ix_messages_consultation_sender_id", "consultation_id", "sender_type", "id"),)
     
     consultation = relationship("Consultation", back_populates="messages")
 
 
+class ConsultationPresence(Base):
+    """Viewer heartbeats shared by all workers (see presence.py); expired rows are swept"""
+    __tablename__ = "consultation_presence"
+
+    consultation_id = Column(Integer, primary_key=True)
+    viewer_key = Column(String(40), primary_key=True)  # "<role>_<id>"
+    last_seen = Column(DateTime, nullable=False, index=True)
+
+
+class MessageReadCursor(Base):
+    """How far each participant has read a consultation's messages (one row per side)"""
+    __tablename__ = "message_read_cursors"
+
+    consultation_id = Column(Integer, ForeignKey("consultations.id"), primary_key=True)
+    reader_type = Column(String(10), primary_key=True)  # 'doctor' or 'patient', as Message.sender_type
+    reader_id = Column(Integer, nullable=False)
+    last_read_message_id = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=lambda: datetime.now(), nullable=False)
+
+
+class ConsultationThread(Base):
+    """Per-consultation chat summary kept current by send_message, so inboxes never scan messages"""
+    __tablename__ = "consultation_threads"
+
+    consultation_id = Column(Integer, ForeignKey("consultations.id"), primary_key=True)
+    doctor_id = Column(Integer, ForeignKey("doctors.id"), nullable=True)
+    patient_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    last_message_id = Column(Integer, nullable=True)
+    last_message_preview = Column(String(200), nullable=True)
+    last_sender_type = Column(String(10), nullable=True)
+    last_sent_at = Column(DateTime, nullable=True)
+    last_activity_at = Column(DateTime, default=lambda: datetime.now(), nullable=False)
+    doctor_unread = Column(Integer, default=0, nullable=False)
+    patient_unread = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        Index("ix_threads_doctor_activity", "doctor_id", "last_activity_at"),
+        Index("ix_threads_patient_activity", "patient_id", "last_activity_at"),
+    )
+
+    consultation = relationship("Consultation", back_populates="thread")
+
+    def to_dict(self, viewer_role: str) -> dict:
+        return {
+            "last_message": {
+                "id": self.last_message_id,
+                "preview": self.last_message_preview,
+                "sender_type": self.last_sender_type,
+                "sent_at": self.last_sent_at.isoformat() if self.last_sent_at else None,
+            } if self.last_message_id else None,
+            "unread_count": self.doctor_unread if viewer_role == 'doctor' else self.patient_unread,
+            "last_activity_at": self.last_activity_at.isoformat() if self.last_activity_at else None,
+        }
+
+
 class MessageDocument(Base):
     __tablename__ = "message_documents"
 
@@ -488,6 +789,14 @@ limiter = Limiter(
 )
 logger.info("Rate limiting configured: 2000/day, 500/hour globally")
 
+@app.after_request
+def pin_writers_to_primary(response):
+    """Keep a principal's reads on the primary right after it writes (e.g. after send_message)"""
+    if read_engine is not None and g.get("db_wrote"):
+        body = response.get_json(silent=True) if response.is_json else None
+        pin_to_primary(body.get("token") if isinstance(body, dict) and isinstance(body.get("token"), str) else None)
+    return response
+
 # Supabase initialization for file uploads
 if SUPABASE_AVAILABLE:
     SUPABASE_URL = os.getenv("SUPABASE_URL", "https://icvtjsfcuwqjhgduntyw.supabase.co")
@@ -537,6 +846,19 @@ def ratelimit_error(error):
     }), 429
 
 
+@app.errorhandler(PasswordHashingBusy)
+def password_hashing_busy_error(error):
+    """Shed load when logins/password changes back up the hashing pool"""
+    logger.warning(f"Password hashing busy: {error}")
+    response = jsonify({
+        "error": "Service busy",
+        "message": "Too many sign-in requests right now. Please try again in a moment.",
+        "status": 503
+    })
+    response.headers["Retry-After"] = "2"
+    return response, 503
+
+
 @app.errorhandler(Exception)
 def handle_exception(error):
     """Handle all unhandled exceptions"""
@@ -553,9 +875,20 @@ def handle_exception(error):
 def init_db() -> None:
     """Initialize database by creating all tables"""
     Base.metadata.create_all(bind=engine)
+    create_accounts_view(engine)
+    if read_engine is not None and DATABASE_READ_URL.startswith("sqlite"):
+        # Local two-file replica setup: make sure the schema exists on both sides
+        Base.metadata.create_all(bind=read_engine)
+        create_accounts_view(read_engine)
     logger.info("Database tables created successfully")
 
 
+def create_accounts_view(target_engine) -> None:
+    create = "CREATE OR REPLACE VIEW" if target_engine.dialect.name == "postgresql" else "CREATE VIEW IF NOT EXISTS"
+    with target_engine.begin() as conn:
+        conn.execute(text(f"{create} accounts AS {ACCOUNTS_VIEW_SQL}"))
+
+
 def seed_demo_data() -> None:
     """Seed database with demo data for development/testing"""
     db = SessionLocal()
@@ -625,18 +958,135 @@ def run_startup_migrations() -> None:
         if 'folder_id' not in columns:
             with engine.begin() as conn:
                 conn.execute(text('ALTER TABLE documents ADD COLUMN folder_id INTEGER'))
+        if 'thumbnail_url' not in columns:
+            with engine.begin() as conn:
+                conn.execute(text('ALTER TABLE documents ADD COLUMN thumbnail_url VARCHAR(500)'))
     
     if 'users' in existing_tables:
         columns = [col['name'] for col in inspector.get_columns('users')]
         if 'is_cured' not in columns:
             with engine.begin() as conn:
                 conn.execute(text('ALTER TABLE users ADD COLUMN is_cured BOOLEAN DEFAULT 0'))
+        for size in PROFILE_PHOTO_SIZES:
+            if f'photo_url_{size}' not in columns:
+                with engine.begin() as conn:
+                    conn.execute(text(f'ALTER TABLE users ADD COLUMN photo_url_{size} VARCHAR(300)'))
     
     if 'doctors' in existing_tables:
         columns = [col['name'] for col in inspector.get_columns('doctors')]
         if 'id_card_url' not in columns:
             with engine.begin() as conn:
                 conn.execute(text('ALTER TABLE doctors ADD COLUMN id_card_url VARCHAR(300)'))
+        for size in PROFILE_PHOTO_SIZES:
+            if f'photo_url_{size}' not in columns:
+                with engine.begin() as conn:
+                    conn.execute(text(f'ALTER TABLE doctors ADD COLUMN photo_url_{size} VARCHAR(300)'))
+
+    # create_all() does not add indexes to existing tables
+    for table_name, index_sql in (
+        ('messages', 'CREATE INDEX IF NOT EXISTS ix_messages_consultation_sender_id ON messages (consultation_id, sender_type, id)'),
+        ('documents', 'CREATE INDEX IF NOT EXISTS ix_documents_user_created_id ON documents (user_id, created_at, id)'),
+    ):
+        if table_name in existing_tables:
+            with engine.begin() as conn:
+                conn.execute(text(index_sql))
+
+    backfill_consultation_threads()
+    backfill_read_cursors()
+
+
+def run_sqlite_maintenance() -> None:
+    """Checkpoint the WAL and refresh query planner statistics"""
+    if not DATABASE_URL.startswith("sqlite") or ":memory:" in DATABASE_URL:
+        return
+    try:
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)")
+            conn.exec_driver_sql("PRAGMA optimize")
+    except Exception as exc:
+        logger.warning(f"SQLite maintenance failed: {exc}")
+
+
+def start_sqlite_maintenance() -> None:
+    """Run run_sqlite_maintenance() every SQLITE_MAINTENANCE_INTERVAL seconds on a daemon thread"""
+    if not DATABASE_URL.startswith("sqlite") or SQLITE_MAINTENANCE_INTERVAL <= 0:
+        return
+
+    def _tick():
+        run_sqlite_maintenance()
+        timer = threading.Timer(SQLITE_MAINTENANCE_INTERVAL, _tick)
+        timer.daemon = True
+        timer.start()
+
+    timer = threading.Timer(SQLITE_MAINTENANCE_INTERVAL, _tick)
+    timer.daemon = True
+    timer.start()
+    logger.info(f"SQLite maintenance scheduled every {SQLITE_MAINTENANCE_INTERVAL}s")
+
+
+def run_in_background(func, *args, **kwargs) -> None:
+    """Fire-and-forget a blocking call (SMTP, storage cleanup) on the background pool"""
+    def _runner():
+        try:
+            func(*args, **kwargs)
+        except Exception as exc:
+            logger.error(f"Background task {getattr(func, '__name__', func)} failed: {exc}", exc_info=True)
+
+    background_executor.submit(_runner)
+
+
+def run_llm(func, *args, timeout: Optional[float] = None, **kwargs):
+    """Run an LLM-bound call on the bounded LLM pool and wait at most `timeout` seconds.
+
+    Raises concurrent.futures.TimeoutError when the call (including time queued
+    behind other analyses) exceeds the timeout.
+    """
+    future = llm_executor.submit(func, *args, **kwargs)
+    return future.result(timeout=timeout if timeout is not None else LLM_REQUEST_TIMEOUT)
+
+
+_triage_model = None
+_triage_lock = threading.Lock()
+
+
+def load_triage_model():
+    """Train the local triage model from labelled consultations and the disease tables"""
+    db = SessionLocal.session_factory()
+    try:
+        consultations = db.query(Consultation.primary_symptoms, Consultation.llm_summary).filter(
+            Consultation.primary_symptoms.isnot(None),
+            Consultation.llm_summary.isnot(None)
+        ).all()
+        diseases = [
+            (d.name, [s.name for s in d.symptoms], d.precaution)
+            for d in db.query(Disease).options(selectinload(Disease.symptoms)).all()
+        ]
+    finally:
+        db.close()
+    model = train_triage_model(consultations, diseases)
+    logger.info(f"Triage model trained on {model.examples} examples, {len(model.diseases)} diseases")
+    return model
+
+
+def get_triage_model():
+    """Current triage model; trained on first use, refreshed in the background when stale"""
+    global _triage_model
+    model = _triage_model
+    if model is None:
+        with _triage_lock:
+            if _triage_model is None:
+                _triage_model = load_triage_model()
+            return _triage_model
+
+    if time.time() - model.trained_at > TRIAGE_RETRAIN_INTERVAL and _triage_lock.acquire(blocking=False):
+        def _refresh():
+            global _triage_model
+            try:
+                _triage_model = load_triage_model()
+            finally:
+                _triage_lock.release()
+        run_in_background(_refresh)
+    return model
 
 
 def get_token_identity():
@@ -650,8 +1100,10 @@ def get_token_identity():
 
 
 def create_notification(user_id: int, role: str, title: str, message: str = '', notif_type: str = 'general') -> None:
+    # Own session (not the request's scoped one) so committing/closing here
+    # never expires or detaches objects the caller is still using
+    db = SessionLocal.session_factory()
     try:
-        db = SessionLocal()
         notification = Notification(
             user_id=user_id,
             role=role,
@@ -668,6 +1120,216 @@ def create_notification(user_id: int, role: str, title: str, message: str = '',
         db.close()
 
 
+def message_preview(content: str, limit: int = 120) -> str:
+    content = (content or '').strip()
+    return (content[:limit] + '...') if len(content) > limit else content
+
+
+def ensure_thread(db, consultation: Consultation) -> ConsultationThread:
+    """The consultation's chat summary row, added to the session if it does not exist yet"""
+    thread = db.get(ConsultationThread, consultation.id)
+    if thread is None:
+        thread = ConsultationThread(
+            consultation_id=consultation.id,
+            doctor_id=consultation.doctor_id,
+            patient_id=consultation.patient_id,
+            last_activity_at=consultation.started_at or datetime.now()
+        )
+        db.add(thread)
+    else:
+        thread.doctor_id = consultation.doctor_id
+    return thread
+
+
+def record_thread_message(db, consultation: Consultation, message: Message) -> None:
+    """Point the thread summary at a new (flushed) message and bump the recipient's unread count"""
+    ensure_thread(db, consultation)
+    db.flush()
+    unread = ConsultationThread.patient_unread if message.sender_type == 'doctor' else ConsultationThread.doctor_unread
+    db.query(ConsultationThread).filter(
+        ConsultationThread.consultation_id == consultation.id
+    ).update({unread: unread + 1}, synchronize_session=False)
+    # Guarded so a slower concurrent send never moves the summary back to an older message
+    db.query(ConsultationThread).filter(
+        ConsultationThread.consultation_id == consultation.id,
+        (ConsultationThread.last_message_id == None) | (ConsultationThread.last_message_id < message.id)
+    ).update({
+        ConsultationThread.last_message_id: message.id,
+        ConsultationThread.last_message_preview: message_preview(message.content),
+        ConsultationThread.last_sender_type: message.sender_type,
+        ConsultationThread.last_sent_at: message.sent_at,
+        ConsultationThread.last_activity_at: message.sent_at,
+    }, synchronize_session=False)
+
+
+def read_cursor_positions(db, consultation_id: int) -> dict:
+    """{'doctor': last_read_message_id, 'patient': ...} for a consultation (0 when nothing read yet)"""
+    positions = {'doctor': 0, 'patient': 0}
+    for reader_type, last_read in db.query(MessageReadCursor.reader_type, MessageReadCursor.last_read_message_id).filter(
+        MessageReadCursor.consultation_id == consultation_id
+    ):
+        positions[reader_type] = last_read
+    return positions
+
+
+def upsert_read_cursor(db, consultation_id: int, reader_type: str, reader_id: int, message_id: int) -> None:
+    """Create or advance a read cursor in one statement, so concurrent first reads (a poll and POST /read) cannot collide"""
+    table = MessageReadCursor.__table__
+    row = {'consultation_id': consultation_id, 'reader_type': reader_type, 'reader_id': reader_id,
+           'last_read_message_id': message_id, 'updated_at': datetime.now()}
+    # Native upsert where the dialect has one (as presence.py); otherwise insert, then advance on conflict
+    if engine.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        dialect_insert = None
+    if dialect_insert is not None:
+        stmt = dialect_insert(table).values(**row)
+        newer = stmt.excluded.last_read_message_id > table.c.last_read_message_id
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.consultation_id, table.c.reader_type],
+            set_={
+                'last_read_message_id': case((newer, stmt.excluded.last_read_message_id), else_=table.c.last_read_message_id),
+                'reader_id': stmt.excluded.reader_id,
+                'updated_at': case((newer, stmt.excluded.updated_at), else_=table.c.updated_at),
+            },
+        ))
+        return
+    try:
+        with db.begin_nested():
+            db.execute(insert(table).values(**row))
+    except IntegrityError:
+        db.query(MessageReadCursor).filter(
+            MessageReadCursor.consultation_id == consultation_id,
+            MessageReadCursor.reader_type == reader_type,
+            MessageReadCursor.last_read_message_id < message_id
+        ).update({
+            MessageReadCursor.last_read_message_id: message_id,
+            MessageReadCursor.reader_id: reader_id,
+            MessageReadCursor.updated_at: row['updated_at'],
+        }, synchronize_session=False)
+
+
+def advance_read_cursor(db, consultation: Consultation, reader_type: str, message_id: int) -> int:
+    """Move the reader's cursor forward to message_id (never back) and return their unread count
+
+    Nothing is written or committed when neither the cursor nor the stored unread
+    count changes, so re-reading an already read thread stays a plain read.
+    """
+    reader_id = consultation.doctor_id if reader_type == 'doctor' else consultation.patient_id
+    cursor = db.get(MessageReadCursor, (consultation.id, reader_type), populate_existing=True)
+    moved = cursor is None or cursor.last_read_message_id < message_id
+    if moved:
+        upsert_read_cursor(db, consultation.id, reader_type, reader_id, message_id)
+        cursor = db.get(MessageReadCursor, (consultation.id, reader_type), populate_existing=True)
+
+    unread_column = ConsultationThread.doctor_unread if reader_type == 'doctor' else ConsultationThread.patient_unread
+    thread = ensure_thread(db, consultation)
+    if thread.last_message_id is None or cursor.last_read_message_id >= thread.last_message_id:
+        unread = 0
+    else:
+        # Index range over (consultation_id, sender_type, id) past the cursor
+        unread = db.query(func.count(Message.id)).filter(
+            Message.consultation_id == consultation.id,
+            Message.sender_type != reader_type,
+            Message.id > cursor.last_read_message_id
+        ).scalar()
+    stale = getattr(thread, unread_column.key) != unread
+    if stale:
+        db.flush()
+        db.query(ConsultationThread).filter(
+            ConsultationThread.consultation_id == consultation.id
+        ).update({unread_column: unread}, synchronize_session=False)
+    if moved or stale or db.new or any(db.is_modified(obj) for obj in db.dirty):
+        db.commit()
+    return unread
+
+
+def backfill_read_cursors() -> None:
+    """Seed cursors for consultations without one: legacy is_read flags, or the reader's own last reply"""
+    db = SessionLocal.session_factory()
+    try:
+        existing = {(cid, reader) for cid, reader in db.query(MessageReadCursor.consultation_id, MessageReadCursor.reader_type)}
+        consultations = {
+            c.id: c for c in db.query(Consultation).filter(Consultation.status != 'pending', Consultation.doctor_id != None)
+        }
+        positions = {}
+        for cid, sender_type, last_id in db.query(
+            Message.consultation_id, Message.sender_type, func.max(Message.id)
+        ).group_by(Message.consultation_id, Message.sender_type):
+            positions[(cid, sender_type)] = max(positions.get((cid, sender_type), 0), last_id)
+        for cid, sender_type, last_id in db.query(
+            Message.consultation_id, Message.sender_type, func.max(Message.id)
+        ).filter(Message.is_read == True).group_by(Message.consultation_id, Message.sender_type):
+            reader = 'patient' if sender_type == 'doctor' else 'doctor'
+            positions[(cid, reader)] = max(positions.get((cid, reader), 0), last_id)
+
+        added = 0
+        for cid, consultation in consultations.items():
+            for reader_type, reader_id in (('doctor', consultation.doctor_id), ('patient', consultation.patient_id)):
+                if (cid, reader_type) in existing:
+                    continue
+                db.add(MessageReadCursor(
+                    consultation_id=cid,
+                    reader_type=reader_type,
+                    reader_id=reader_id,
+                    last_read_message_id=positions.get((cid, reader_type), 0)
+                ))
+                added += 1
+        if added:
+            db.commit()
+            logger.info(f"Seeded {added} message read cursors")
+    finally:
+        db.close()
+
+
+def backfill_consultation_threads() -> None:
+    """Create thread summaries for consultations that predate the consultation_threads table"""
+    db = SessionLocal.session_factory()
+    try:
+        missing = db.query(Consultation).outerjoin(ConsultationThread).filter(
+            ConsultationThread.consultation_id == None,
+            Consultation.status != 'pending'
+        ).all()
+        if not missing:
+            return
+        ids = [c.id for c in missing]
+        history = {}
+        for consultation_id, message_id, sender_type in db.query(
+            Message.consultation_id, Message.id, Message.sender_type
+        ).filter(Message.consultation_id.in_(ids)).order_by(Message.id):
+            history.setdefault(consultation_id, []).append((message_id, sender_type))
+        last_ids = [messages[-1][0] for messages in history.values()]
+        last_messages = {m.id: m for m in db.query(Message).filter(Message.id.in_(last_ids))} if last_ids else {}
+
+        for consultation in missing:
+            thread = ConsultationThread(
+                consultation_id=consultation.id,
+                doctor_id=consultation.doctor_id,
+                patient_id=consultation.patient_id,
+                last_activity_at=consultation.started_at or consultation.created_at
+            )
+            messages = history.get(consultation.id, [])
+            if messages:
+                last = last_messages[messages[-1][0]]
+                thread.last_message_id = last.id
+                thread.last_message_preview = message_preview(last.content)
+                thread.last_sender_type = last.sender_type
+                thread.last_sent_at = last.sent_at
+                thread.last_activity_at = last.sent_at
+                # Messages were never flagged read; count what arrived after each side last replied
+                for reader, other in (('doctor', 'patient'), ('patient', 'doctor')):
+                    last_reply = max((mid for mid, sender in messages if sender == reader), default=0)
+                    count = sum(1 for mid, sender in messages if sender == other and mid > last_reply)
+                    setattr(thread, f"{reader}_unread", count)
+            db.add(thread)
+        db.commit()
+        logger.info(f"Backfilled {len(missing)} consultation thread summaries")
+    finally:
+        db.close()
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -744,6 +1406,10 @@ def verify_token(token: str) -> Optional[dict]:
     """Verify JWT token and return payload with user_id and role"""
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+        if 'purpose' in payload or payload.get('user_id') is None:
+            # Scoped tokens (document links) share the secret but are not sessions
+            logger.error("Token verification failed: not a session token")
+            return None
         return {
             'user_id': payload.get('user_id'),
             'role': payload.get('role', 'patient')
@@ -753,6 +1419,26 @@ def verify_token(token: str) -> Optional[dict]:
         return None
 
 
+def create_document_token(document_id: int) -> str:
+    """Short-lived token that lets its bearer fetch one document's content"""
+    now = datetime.now(timezone.utc)
+    payload = {
+        'doc': document_id,
+        'purpose': 'document',
+        'exp': int((now + timedelta(seconds=DOCUMENT_LINK_TTL)).timestamp()),
+        'iat': int(now.timestamp())
+    }
+    return jwt.encode(payload, JWT_SECRET, algorithm='HS256')
+
+
+def verify_document_token(token: str, document_id: int) -> bool:
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+    except jwt.InvalidTokenError:
+        return False
+    return payload.get('purpose') == 'document' and payload.get('doc') == document_id
+
+
 def get_current_user() -> Optional[User]:
     """Get current authenticated patient user from Bearer token"""
     auth_header = request.headers.get('Authorization', '')
@@ -850,7 +1536,7 @@ class AdminAudit(Base):
 
 def log_admin_action(admin_id: int, action: str, target_user_id: Optional[int] = None, meta: Optional[dict] = None):
     """Log an admin action to audit log"""
-    db = SessionLocal()
+    db = SessionLocal.session_factory()
     try:
         import json
         audit = AdminAudit(
@@ -967,9 +1653,8 @@ def register():
         
         db = SessionLocal()
         try:
-            # Check if user already exists
-            existing_user = db.query(User).filter(User.email == register_data.email).first()
-            if existing_user:
+            # Doctors and users share one email namespace (see authenticate)
+            if email_taken(db, register_data.email):
                 return jsonify({"error": "Email already registered"}), 400
             
             # Create new user (patient only)
@@ -993,18 +1678,70 @@ def register():
                 "user": user.to_dict(),
                 "role": "patient"
             }), 201
+        except PasswordHashingBusy:
+            raise
         except Exception as e:
             db.rollback()
             logger.error(f"Registration error: {str(e)}")
             return jsonify({"error": str(e)}), 500
         finally:
             db.close()
+    except PasswordHashingBusy:
+        raise
     except Exception as e:
         # Pydantic validation error
         logger.warning(f"Registration validation failed: {str(e)}")
         return jsonify({"error": f"Validation error: {str(e)}"}), 400
 
 
+def authenticate(db, email: str, password: str):
+    """(principal, role) for valid credentials, else (None, None).
+
+    One query over the accounts view loads whichever Doctor or User owns the
+    email, so a login costs one lookup and at most one bcrypt verify. New
+    accounts cannot reuse an email (see email_taken); should legacy data hold
+    one in both tables, the doctor account is the one that can log in.
+    """
+    row = db.query(Doctor, User).select_from(accounts_view).outerjoin(
+        Doctor, and_(accounts_view.c.principal_type == 'doctor', Doctor.id == accounts_view.c.id)
+    ).outerjoin(
+        User, and_(accounts_view.c.principal_type == 'user', User.id == accounts_view.c.id)
+    ).filter(accounts_view.c.email == email).order_by(accounts_view.c.principal_type).first()
+    if row is None:
+        return None, None
+    doctor, user = row
+    principal = doctor if doctor is not None else user
+    if not principal.check_password(password):
+        return None, None
+    if password_hasher.needs_rehash(principal.password):
+        run_in_background(rehash_password, type(principal), principal.id, password, principal.password)
+    return principal, 'doctor' if doctor is not None else (user.role.lower() if user.role else 'patient')
+
+
+def email_taken(db, email: str, principal=None) -> bool:
+    """Whether a doctor or user other than `principal` already has this email (one query over the accounts view)"""
+    query = db.query(accounts_view.c.id).filter(accounts_view.c.email == email)
+    if principal is not None:
+        principal_type = 'doctor' if isinstance(principal, Doctor) else 'user'
+        query = query.filter(~and_(accounts_view.c.principal_type == principal_type, accounts_view.c.id == principal.id))
+    return query.first() is not None
+
+
+def rehash_password(model, principal_id: int, password: str, old_hash: str) -> None:
+    """Re-hash at the calibrated cost after a successful login (unless the password changed meanwhile)"""
+    new_hash = password_hasher.hash(password)
+    db = SessionLocal.session_factory()
+    try:
+        updated = db.query(model).filter(model.id == principal_id, model.password == old_hash).update(
+            {model.password: new_hash}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+    if updated:
+        password_hasher.record("rehashes")
+
+
 @app.post("/api/auth/login")
 @limiter.limit("5 per minute")  # Rate limit: 5 login attempts per minute
 def login():
@@ -1018,9 +1755,9 @@ def login():
         
         db = SessionLocal()
         try:
-            # Check if it's a doctor first
-            doctor = db.query(Doctor).filter(Doctor.email == email).first()
-            if doctor and doctor.check_password(password):
+            principal, role = authenticate(db, email, password)
+            if role == 'doctor':
+                doctor = principal
                 if not doctor.is_active:
                     return jsonify({"error": "Doctor account is inactive"}), 403
                 
@@ -1032,14 +1769,13 @@ def login():
                     "role": "doctor"
                 }), 200
             
-            # Check if it's a user (patient or admin)
-            user = db.query(User).filter(User.email == email).first()
-            if user and user.check_password(password):
+            # A user (patient or admin)
+            user = principal
+            if user:
                 # Check if user is active (for all roles)
                 if hasattr(user, 'is_active') and not user.is_active:
                     return jsonify({"error": "Account is inactive"}), 403
                 
-                role = user.role.lower() if user.role else 'patient'
                 token = create_token(user.id, role)
                 logger.info(f"{role.capitalize()} login successful: {user.name}")
                 return jsonify({
@@ -1052,6 +1788,8 @@ def login():
             return jsonify({"error": "Invalid email or password"}), 401
         finally:
             db.close()
+    except PasswordHashingBusy:
+        raise
     except Exception as e:
         # Pydantic validation error
         logger.warning(f"Login validation failed: {str(e)}")
@@ -1127,17 +1865,19 @@ def update_current_user():
             db_user.medical_history = data['medical_history']
         if 'name' in data:
             db_user.name = data['name']
+        stale_photos = []
         if 'photo_url' in data:
-            db_user.photo_url = data['photo_url']
+            stale_photos = set_profile_photo(db_user, data['photo_url'])
         if 'email' in data:
             # Check if email is already taken
-            existing = db.query(User).filter(User.email == data['email'], User.id != user.id).first()
-            if existing:
+            if email_taken(db, data['email'], db_user):
                 return jsonify({"error": "Email already in use"}), 400
             db_user.email = data['email']
         
         db.commit()
         db.refresh(db_user)
+        if stale_photos and supabase:
+            run_in_background(remove_from_storage, stale_photos)
         
         return jsonify(db_user.to_dict()), 200
     finally:
@@ -1191,12 +1931,14 @@ def google_auth():
     try:
         user = db.query(User).filter(User.email == email).first()
         if not user:
+            if email_taken(db, email):
+                return jsonify({"error": "This email belongs to a doctor account; sign in with your password"}), 409
             user = User(
                 name=name[:100] if name else "Google User",
                 email=email,
                 role="patient",
                 photo_url=picture if picture else None,
-                password=bcrypt.hashpw(os.urandom(32), bcrypt.gensalt()).decode("utf-8"),
+                password=password_hasher.hash(os.urandom(32).hex()),
             )
             db.add(user)
             db.commit()
@@ -1702,7 +2444,7 @@ def doctor_requests():
                 "patient_name": patient.name if patient else "Unknown",
                 "patient_age": patient.age if patient else None,
                 "patient_gender": patient.gender if patient else None,
-                "patient_photo_url": patient.photo_url if patient else None,
+                "patient_photo_url": avatar_url(patient),
                 "primary_symptoms": req.primary_symptoms or "",
                 "llm_summary": req.llm_summary or "",
                 "document_count": shared_doc_count,
@@ -1724,21 +2466,26 @@ def doctor_consultations():
     
     db = SessionLocal()
     try:
-        consultations = db.query(Consultation).filter(
-            Consultation.doctor_id == doctor.id,
+        # One indexed read over the thread summaries, most recent activity first
+        rows = db.query(ConsultationThread, Consultation, User.name, func.coalesce(User.photo_url_256, User.photo_url)).join(
+            Consultation, Consultation.id == ConsultationThread.consultation_id
+        ).outerjoin(
+            User, User.id == ConsultationThread.patient_id
+        ).filter(
+            ConsultationThread.doctor_id == doctor.id,
             Consultation.status == 'active'
-        ).order_by(Consultation.started_at.desc()).all()
+        ).order_by(ConsultationThread.last_activity_at.desc()).all()
         
         result = []
-        for cons in consultations:
-            patient = db.query(User).filter(User.id == cons.patient_id).first()
+        for thread, cons, patient_name, patient_photo_url in rows:
             result.append({
                 "id": cons.id,
                 "patient_id": cons.patient_id,
-                "patient_name": patient.name if patient else "Unknown",
-                "patient_photo_url": patient.photo_url if patient else None,
+                "patient_name": patient_name or "Unknown",
+                "patient_photo_url": patient_photo_url,
                 "started_at": cons.started_at.isoformat() if cons.started_at else None,
-                "status": cons.status
+                "status": cons.status,
+                **thread.to_dict('doctor')
             })
         
         return jsonify(result), 200
@@ -1768,6 +2515,7 @@ def accept_consultation(consultation_id):
         consultation.status = 'active'
         consultation.started_at = datetime.now()
         consultation.doctor_id = doctor.id
+        ensure_thread(db, consultation)
         db.commit()
         
         # Mark related notification as read when accepting
@@ -1970,6 +2718,25 @@ def submit_rating(consultation_id):
         db.close()
 
 
+# Only what the chat UI renders for a document (name, size, date, link)
+CHAT_DOCUMENT_COLUMNS = (
+    Document.id, Document.file_name, Document.file_type, Document.file_size,
+    Document.download_url, Document.thumbnail_url, Document.created_at,
+)
+
+
+def chat_document(row) -> dict:
+    return {
+        'id': row.id,
+        'file_name': row.file_name,
+        'file_type': row.file_type,
+        'file_size': row.file_size,
+        'download_url': row.download_url,
+        'thumbnail_url': row.thumbnail_url,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+    }
+
+
 @app.get("/api/consultation/<int:consultation_id>/messages")
 def get_consultation_messages(consultation_id):
     """Get messages for a consultation with pagination"""
@@ -1995,6 +2762,15 @@ def get_consultation_messages(consultation_id):
             return jsonify({"error": "Unauthorized"}), 403
         if user and consultation.patient_id != user.id:
             return jsonify({"error": "Unauthorized"}), 403
+
+        # Opening the thread reads it up to the newest message
+        reader_type = 'doctor' if doctor else 'patient'
+        thread = db.get(ConsultationThread, consultation_id)
+        read_upto = read_cursor_positions(db, consultation_id)
+        # Polls of a thread that is already read must not write (or pin the caller to the primary)
+        if thread is not None and thread.last_message_id and read_upto[reader_type] < thread.last_message_id:
+            advance_read_cursor(db, consultation, reader_type, thread.last_message_id)
+            read_upto = read_cursor_positions(db, consultation_id)
         
         # Query with pagination
         query = db.query(Message).filter(
@@ -2004,21 +2780,22 @@ def get_consultation_messages(consultation_id):
         total = query.count()
         messages = query.offset((page - 1) * per_page).limit(per_page).all()
         
-        # Get all consultation documents
-        consultation_docs = {}
-        if consultation:
-            for link in consultation.documents:
-                if link.document:
-                    consultation_docs[link.document_id] = link.document.to_dict()
+        # Shared documents and this page's attachments: one joined, projected query each
+        consultation_docs = [
+            chat_document(row) for row in db.query(*CHAT_DOCUMENT_COLUMNS).join(
+                ConsultationDocument, ConsultationDocument.document_id == Document.id
+            ).filter(
+                ConsultationDocument.consultation_id == consultation_id
+            ).order_by(ConsultationDocument.shared_at)
+        ]
         
-        # Build attachments map for these messages
         message_ids = [m.id for m in messages]
-        attachments_map = {mid: [] for mid in message_ids}
+        attachments_map = {}
         if message_ids:
-            links = db.query(MessageDocument).filter(MessageDocument.message_id.in_(message_ids)).all()
-            for link in links:
-                if link.document:
-                    attachments_map.setdefault(link.message_id, []).append(link.document.to_dict())
+            for row in db.query(MessageDocument.message_id, *CHAT_DOCUMENT_COLUMNS).join(
+                Document, Document.id == MessageDocument.document_id
+            ).filter(MessageDocument.message_id.in_(message_ids)).order_by(MessageDocument.id):
+                attachments_map.setdefault(row.message_id, []).append(chat_document(row))
 
         result = []
         for msg in messages:
@@ -2028,17 +2805,15 @@ def get_consultation_messages(consultation_id):
                 "sender_id": msg.sender_id,
                 "content": msg.content,
                 "sent_at": msg.sent_at.isoformat() if msg.sent_at else None,
-                "is_read": msg.is_read,
+                # Read once the other side's cursor has passed it
+                "is_read": msg.id <= read_upto['patient' if msg.sender_type == 'doctor' else 'doctor'],
                 "attachments": attachments_map.get(msg.id, [])
             }
             result.append(msg_data)
         
-        # Add consultation documents separately
-        consultation_docs_list = list(consultation_docs.values())
-        
         return jsonify({
             "messages": result,
-            "documents": consultation_docs_list,
+            "documents": consultation_docs,
             "pagination": {
                 "page": page,
                 "per_page": per_page,
@@ -2050,34 +2825,101 @@ def get_consultation_messages(consultation_id):
         db.close()
 
 
-# Track active viewers for consultations (in-memory, resets on server restart)
-active_viewers = {}  # {consultation_id: {user_id: timestamp, ...}}
+@app.post("/api/consultation/<int:consultation_id>/read")
+def mark_consultation_read(consultation_id):
+    """Advance the caller's read cursor (to message_id, or to the newest message)"""
+    doctor = get_current_doctor()
+    user = get_current_user()
+    
+    if not doctor and not user:
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    data = request.get_json(force=True, silent=True) or {}
+    message_id = data.get('message_id')
+    if message_id is not None and (not isinstance(message_id, int) or isinstance(message_id, bool) or message_id < 0):
+        return jsonify({"error": "message_id must be a non-negative integer"}), 400
+    
+    db = SessionLocal()
+    try:
+        consultation = db.query(Consultation).filter(Consultation.id == consultation_id).first()
+        if not consultation:
+            return jsonify({"error": "Consultation not found"}), 404
+        
+        if doctor and consultation.doctor_id != doctor.id:
+            return jsonify({"error": "Unauthorized"}), 403
+        if user and consultation.patient_id != user.id:
+            return jsonify({"error": "Unauthorized"}), 403
+        
+        reader_type = 'doctor' if doctor else 'patient'
+        thread = db.get(ConsultationThread, consultation_id)
+        newest = thread.last_message_id if thread and thread.last_message_id else 0
+        target = newest if message_id is None else min(message_id, newest)
+        unread = advance_read_cursor(db, consultation, reader_type, target)
+        last_read = read_cursor_positions(db, consultation_id)[reader_type]
+        
+        return jsonify({"last_read_message_id": last_read, "unread_count": unread}), 200
+    finally:
+        db.close()
+
+
+def get_viewer_consultation(db, consultation_id, doctor, user):
+    """(consultation, error response) for a participant of the consultation"""
+    consultation = db.get(Consultation, consultation_id)
+    if not consultation:
+        return None, (jsonify({"error": "Consultation not found"}), 404)
+    if doctor and consultation.doctor_id != doctor.id:
+        return None, (jsonify({"error": "Unauthorized"}), 403)
+    if user and consultation.patient_id != user.id:
+        return None, (jsonify({"error": "Unauthorized"}), 403)
+    return consultation, None
+
 
 @app.post("/api/consultation/<int:consultation_id>/viewing")
 def mark_viewing(consultation_id):
-    """Mark that user is currently viewing this consultation"""
+    """Heartbeat: the caller is currently viewing this consultation"""
     doctor = get_current_doctor()
     user = get_current_user()
     
     if not doctor and not user:
         return jsonify({"error": "Unauthorized"}), 401
     
-    viewer_id = doctor.id if doctor else user.id
-    viewer_role = 'doctor' if doctor else 'patient'
+    db = SessionLocal()
+    try:
+        _, error = get_viewer_consultation(db, consultation_id, doctor, user)
+        if error:
+            return error
+    finally:
+        db.close()
     
-    if consultation_id not in active_viewers:
-        active_viewers[consultation_id] = {}
+    role = 'doctor' if doctor else 'patient'
+    presence.heartbeat(consultation_id, viewer_key(role, doctor.id if doctor else user.id))
     
-    active_viewers[consultation_id][f"{viewer_role}_{viewer_id}"] = datetime.now()
+    return jsonify({"success": True}), 200
+
+
+@app.get("/api/consultation/<int:consultation_id>/presence")
+def get_presence(consultation_id):
+    """Participants currently viewing this consultation"""
+    doctor = get_current_doctor()
+    user = get_current_user()
     
-    # Clean up old entries (older than 30 seconds)
-    cutoff = datetime.now() - timedelta(seconds=30)
-    active_viewers[consultation_id] = {
-        k: v for k, v in active_viewers[consultation_id].items()
-        if v > cutoff
-    }
+    if not doctor and not user:
+        return jsonify({"error": "Unauthorized"}), 401
     
-    return jsonify({"success": True}), 200
+    db = SessionLocal()
+    try:
+        _, error = get_viewer_consultation(db, consultation_id, doctor, user)
+        if error:
+            return error
+    finally:
+        db.close()
+    
+    viewers = []
+    for key, last_seen in presence.viewers(consultation_id).items():
+        role, _, viewer_id = key.partition('_')
+        viewers.append({"role": role, "id": int(viewer_id), "last_seen": last_seen.isoformat()})
+    
+    return jsonify({"consultation_id": consultation_id, "viewers": viewers}), 200
 
 
 @app.post("/api/consultation/<int:consultation_id>/messages")
@@ -2091,7 +2933,13 @@ def send_message(consultation_id):
     
     data = request.get_json(force=True, silent=True) or {}
     content = data.get('content', '').strip()
-    document_ids = data.get('document_ids', [])  # New: support sharing documents
+    document_ids = data.get('document_ids') or []  # New: support sharing documents
+    if not isinstance(document_ids, list):  # a string would be read digit by digit
+        return jsonify({"error": "document_ids must be a list of document ids"}), 400
+    try:
+        document_ids = list(dict.fromkeys(int(doc_id) for doc_id in document_ids))
+    except (TypeError, ValueError):
+        return jsonify({"error": "document_ids must be a list of document ids"}), 400
     
     if not content and not document_ids:
         return jsonify({"error": "Message content or documents are required"}), 400
@@ -2119,47 +2967,47 @@ def send_message(consultation_id):
         )
         
         db.add(message)
-        db.commit()
-        db.refresh(message)
+        db.flush()
         
         # Link documents to consultation and this message if provided (only patients can share documents for now)
         if document_ids and user:
-            for doc_id in document_ids:
-                doc = db.query(Document).filter(Document.id == doc_id, Document.user_id == user.id).first()
-                if doc:
-                    # Create consultation document link if not exists
-                    existing = db.query(ConsultationDocument).filter(
-                        ConsultationDocument.consultation_id == consultation_id,
-                        ConsultationDocument.document_id == doc_id
-                    ).first()
-                    if not existing:
-                        link = ConsultationDocument(
-                            consultation_id=consultation_id,
-                            document_id=doc_id
-                        )
-                        db.add(link)
-
-                    # Create message attachment link
-                    msg_link = MessageDocument(
-                        message_id=message.id,
-                        document_id=doc_id
-                    )
-                    db.add(msg_link)
-            db.commit()
+            owned = {doc_id for (doc_id,) in db.query(Document.id).filter(
+                Document.id.in_(document_ids),
+                Document.user_id == user.id
+            )}
+            shared = [doc_id for doc_id in document_ids if doc_id in owned]
+            if shared:
+                already_linked = {doc_id for (doc_id,) in db.query(ConsultationDocument.document_id).filter(
+                    ConsultationDocument.consultation_id == consultation_id,
+                    ConsultationDocument.document_id.in_(shared)
+                )}
+                # One executemany INSERT per link table, in the message's transaction
+                new_links = [
+                    {"consultation_id": consultation_id, "document_id": doc_id}
+                    for doc_id in shared if doc_id not in already_linked
+                ]
+                if new_links:
+                    db.execute(ConsultationDocument.__table__.insert(), new_links)
+                db.execute(MessageDocument.__table__.insert(), [
+                    {"message_id": message.id, "document_id": doc_id} for doc_id in shared
+                ])
+        
+        # Message, attachments and thread summary commit together
+        record_thread_message(db, consultation, message)
+        db.commit()
+        db.refresh(message)
 
-        # Check if recipient is actively viewing this consultation
+        # Check if recipient is actively viewing this consultation (on any worker)
         recipient_viewing = False
-        if consultation_id in active_viewers:
-            if sender_type == 'doctor':
-                recipient_key = f"patient_{consultation.patient_id}"
-            else:
-                recipient_key = f"doctor_{consultation.doctor_id}"
-            
-            if recipient_key in active_viewers[consultation_id]:
-                # Check if viewing is recent (within last 30 seconds)
-                last_view = active_viewers[consultation_id][recipient_key]
-                if (datetime.now() - last_view).total_seconds() < 30:
-                    recipient_viewing = True
+        if sender_type == 'doctor':
+            recipient_key = viewer_key('patient', consultation.patient_id)
+        else:
+            recipient_key = viewer_key('doctor', consultation.doctor_id) if consultation.doctor_id else None
+        if recipient_key:
+            try:
+                recipient_viewing = presence.is_viewing(consultation_id, recipient_key)
+            except Exception as presence_err:
+                logger.warning(f"Presence lookup failed, notifying anyway: {presence_err}")
 
         # Only send notification if recipient is NOT actively viewing
         if not recipient_viewing:
@@ -2199,49 +3047,94 @@ def send_message(consultation_id):
         db.close()
 
 
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque keyset cursor for (created_at, id) newest-first feeds"""
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    created_at, _, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().partition('|')
+    return datetime.fromisoformat(created_at), int(row_id)
+
+
 @app.get("/api/doctor/reports")
 def doctor_reports():
-    """Get all documents/reports from patients who have consulted with this doctor"""
+    """Documents from patients who have consulted with this doctor, newest first.
+
+    Without query parameters this returns the full list (as before). With
+    ?limit=, ?cursor= or ?unviewed_only=1 it returns one keyset page:
+    {"data": [...], "next_cursor": "..." or null}.
+    """
     doctor = get_current_doctor()
     if not doctor:
         return jsonify({"error": "Unauthorized"}), 401
     
+    paginated = any(key in request.args for key in ('limit', 'cursor', 'unviewed_only'))
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    unviewed_only = request.args.get('unviewed_only', '').lower() in ('1', 'true', 'yes')
+    cursor = None
+    if request.args.get('cursor'):
+        try:
+            cursor = decode_cursor(request.args['cursor'])
+        except (ValueError, UnicodeDecodeError):
+            return jsonify({"error": "Invalid cursor"}), 400
+    
     db = SessionLocal()
     try:
-        # Get all consultations with this doctor
-        consultations = db.query(Consultation).filter(
+        # Each patient once, however many consultations they had with this doctor
+        patients = db.query(Consultation.patient_id).filter(
             Consultation.doctor_id == doctor.id
-        ).all()
-        
-        patient_ids = [c.patient_id for c in consultations]
-        
-        if not patient_ids:
-            return jsonify([]), 200
-        
-        # Get all documents from these patients
-        documents = db.query(Document).filter(
-            Document.user_id.in_(patient_ids)
-        ).order_by(Document.created_at.desc()).all()
+        ).distinct().subquery()
+        
+        query = db.query(
+            Document.id, Document.file_name, Document.file_path, Document.download_url,
+            Document.file_size, Document.file_type, Document.created_at, Document.user_id,
+            Document.description, Document.thumbnail_url, User.name.label('patient_name'), User.email.label('patient_email'),
+            DocumentView.id.label('view_id')
+        ).join(
+            patients, patients.c.patient_id == Document.user_id
+        ).outerjoin(
+            User, User.id == Document.user_id
+        ).outerjoin(
+            DocumentView, and_(DocumentView.document_id == Document.id, DocumentView.doctor_id == doctor.id)
+        )
+        if unviewed_only:
+            query = query.filter(DocumentView.id.is_(None))  # anti-join
+        if cursor:
+            created_at, doc_id = cursor
+            query = query.filter(or_(
+                Document.created_at < created_at,
+                and_(Document.created_at == created_at, Document.id < doc_id)
+            ))
+        query = query.order_by(Document.created_at.desc(), Document.id.desc())
+        rows = query.limit(limit + 1).all() if paginated else query.all()
+        
+        next_cursor = None
+        if paginated and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
         
-        # Get patient info for each document
         result = []
-        for doc in documents:
-            patient = db.query(User).filter(User.id == doc.user_id).first()
+        for row in rows:
             result.append({
-                "id": doc.id,
-                "file_name": doc.file_name,
-                "file_url": doc.file_path,
-                "download_url": doc.download_url or doc.file_path,
-                "file_size": doc.file_size,
-                "mime_type": doc.file_type or "application/octet-stream",
-                "uploaded_at": doc.created_at.isoformat() if doc.created_at else None,
-                "created_at": doc.created_at.isoformat() if doc.created_at else None,
-                "patient_id": doc.user_id,
-                "patient_name": patient.name if patient else "Unknown",
-                "patient_email": patient.email if patient else None,
-                "description": doc.description or ""
+                "id": row.id,
+                "file_name": row.file_name,
+                "file_url": row.file_path,
+                "download_url": row.download_url or row.file_path,
+                "file_size": row.file_size,
+                "mime_type": row.file_type or "application/octet-stream",
+                "uploaded_at": row.created_at.isoformat() if row.created_at else None,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+                "patient_id": row.user_id,
+                "patient_name": row.patient_name or "Unknown",
+                "patient_email": row.patient_email,
+                "description": row.description or "",
+                "thumbnail_url": row.thumbnail_url,
+                "viewed": row.view_id is not None
             })
         
+        if paginated:
+            return jsonify({"data": result, "next_cursor": next_cursor}), 200
         return jsonify(result), 200
     except Exception as e:
         db.rollback()
@@ -2429,6 +3322,7 @@ def update_doctor_profile():
         if not db_doctor:
             return jsonify({"error": "Doctor not found"}), 404
         
+        stale_photos = []
         if 'name' in data:
             db_doctor.name = data['name']
         if 'specialization' in data:
@@ -2440,20 +3334,21 @@ def update_doctor_profile():
         if 'bio' in data:
             db_doctor.bio = data['bio']
         if 'photo_url' in data:
-            db_doctor.photo_url = data['photo_url']
+            stale_photos = set_profile_photo(db_doctor, data['photo_url'])
         if 'id_card_url' in data:
             db_doctor.id_card_url = data['id_card_url']
         if 'is_online' in data:
             db_doctor.is_online = data['is_online']
         if 'email' in data:
             # Check if email is already taken
-            existing = db.query(Doctor).filter(Doctor.email == data['email'], Doctor.id != doctor.id).first()
-            if existing:
+            if email_taken(db, data['email'], db_doctor):
                 return jsonify({"error": "Email already in use"}), 400
             db_doctor.email = data['email']
         
         db.commit()
         db.refresh(db_doctor)
+        if stale_photos and supabase:
+            run_in_background(remove_from_storage, stale_photos)
         
         return jsonify(db_doctor.to_dict()), 200
     finally:
@@ -2541,12 +3436,63 @@ def list_document_folders():
 
     db = SessionLocal()
     try:
-        folders = db.query(DocumentFolder).filter(DocumentFolder.user_id == user.id).order_by(DocumentFolder.name.asc()).all()
-        return jsonify([folder.to_dict() for folder in folders]), 200
+        rows = folders_with_counts(db, user.id)
+        return jsonify([folder.to_dict(document_count=count) for folder, count in rows]), 200
     finally:
         db.close()
 
 
+def folders_with_counts(db, user_id: int):
+    """[(folder, direct document count)] for a user's folders, counted in one grouped query"""
+    return db.query(DocumentFolder, func.count(Document.id)).outerjoin(
+        Document, Document.folder_id == DocumentFolder.id
+    ).filter(
+        DocumentFolder.user_id == user_id
+    ).group_by(DocumentFolder.id).order_by(DocumentFolder.name.asc()).all()
+
+
+@app.get("/api/patient/folders/tree")
+def document_folder_tree():
+    """All of the user's folders as a nested tree with direct and subtree document counts"""
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    db = SessionLocal()
+    try:
+        rows = folders_with_counts(db, user.id)
+        unfiled = db.query(func.count(Document.id)).filter(
+            Document.user_id == user.id,
+            Document.folder_id.is_(None)
+        ).scalar()
+    finally:
+        db.close()
+
+    nodes = {}
+    for folder, count in rows:
+        node = folder.to_dict(document_count=count)
+        node['children'] = []
+        nodes[folder.id] = node
+    roots = []
+    for node in nodes.values():  # name order is kept within each level
+        parent = nodes.get(node['parent_id'])
+        (parent['children'] if parent else roots).append(node)
+
+    def total(node, depth=0):
+        # Depth guard: a parent_id cycle would otherwise recurse forever
+        node['total_document_count'] = node['document_count'] + (
+            sum(total(child, depth + 1) for child in node['children']) if depth < 100 else 0
+        )
+        return node['total_document_count']
+
+    filed = sum(total(root) for root in roots)
+    return jsonify({
+        "folders": roots,
+        "unfiled_document_count": unfiled,
+        "total_document_count": filed + unfiled,
+    }), 200
+
+
 @app.delete("/api/patient/folders/<int:folder_id>")
 def delete_document_folder(folder_id: int):
     user = get_current_user()
@@ -2616,21 +3562,278 @@ def delete_document(document_id: int):
         if not document:
             return jsonify({"error": "Document not found"}), 404
 
-        file_path = document.file_path
+        file_paths = [document.file_path] + ([thumbnail_path(document.file_path)] if document.thumbnail_url else [])
         db.delete(document)
         db.commit()
 
-        try:
-            if supabase:
-                supabase.storage.from_('medical-documents').remove([file_path])
-        except Exception as supabase_err:
-            print(f"[WARN] Failed to delete file from storage: {supabase_err}")
+        if supabase:
+            run_in_background(remove_from_storage, file_paths)
 
         return ("", 204)
     finally:
         db.close()
 
 
+def bulk_document_ids(data: dict):
+    """Deduplicated int ids from data['document_ids'], or an error response"""
+    raw_ids = data.get('document_ids')
+    if not isinstance(raw_ids, list) or not raw_ids:
+        return None, (jsonify({"error": "document_ids must be a non-empty list of document ids"}), 400)
+    try:
+        document_ids = list(dict.fromkeys(int(doc_id) for doc_id in raw_ids))
+    except (TypeError, ValueError):
+        return None, (jsonify({"error": "document_ids must be a list of document ids"}), 400)
+    if len(document_ids) > DOCUMENT_BULK_MAX:
+        return None, (jsonify({"error": f"At most {DOCUMENT_BULK_MAX} documents per request"}), 400)
+    return document_ids, None
+
+
+@app.put("/api/patient/documents/bulk")
+def bulk_update_documents():
+    """Move documents to a folder and/or set their description with one UPDATE"""
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(force=True, silent=True) or {}
+    document_ids, error = bulk_document_ids(data)
+    if error:
+        return error
+
+    values = {}
+    if 'description' in data:
+        values[Document.description] = data.get('description')
+    db = SessionLocal()
+    try:
+        if 'folder_id' in data:
+            new_folder_id = data.get('folder_id')
+            if new_folder_id is not None:
+                folder = db.query(DocumentFolder.id).filter(DocumentFolder.id == new_folder_id, DocumentFolder.user_id == user.id).first()
+                if not folder:
+                    return jsonify({"error": "Folder not found"}), 404
+                new_folder_id = folder.id
+            values[Document.folder_id] = new_folder_id
+        if not values:
+            return jsonify({"error": "Nothing to update: pass folder_id and/or description"}), 400
+
+        owned = {doc_id for (doc_id,) in db.query(Document.id).filter(
+            Document.id.in_(document_ids),
+            Document.user_id == user.id
+        )}
+        if owned:
+            db.query(Document).filter(Document.id.in_(owned)).update(values, synchronize_session=False)
+        db.commit()
+        return jsonify({
+            "updated": [doc_id for doc_id in document_ids if doc_id in owned],
+            "not_found": [doc_id for doc_id in document_ids if doc_id not in owned],
+        }), 200
+    finally:
+        db.close()
+
+
+@app.post("/api/patient/documents/bulk-delete")
+def bulk_delete_documents():
+    """Delete documents and their share/view links in one transaction, then remove the files in one storage call"""
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(force=True, silent=True) or {}
+    document_ids, error = bulk_document_ids(data)
+    if error:
+        return error
+
+    db = SessionLocal()
+    try:
+        paths = {
+            doc_id: [file_path] + ([thumbnail_path(file_path)] if thumbnail_url else [])
+            for doc_id, file_path, thumbnail_url in db.query(Document.id, Document.file_path, Document.thumbnail_url).filter(
+                Document.id.in_(document_ids),
+                Document.user_id == user.id
+            )
+        }
+        if paths:
+            owned = list(paths)
+            for link in (MessageDocument, ConsultationDocument, DocumentView):
+                db.query(link).filter(link.document_id.in_(owned)).delete(synchronize_session=False)
+            db.query(Document).filter(Document.id.in_(owned)).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+    all_paths = [path for doc_paths in paths.values() for path in doc_paths]
+    failed_paths = set(remove_from_storage(all_paths)) if supabase and all_paths else set()
+    return jsonify({
+        "deleted": [doc_id for doc_id in document_ids if doc_id in paths],
+        "not_found": [doc_id for doc_id in document_ids if doc_id not in paths],
+        "storage_failed": [doc_id for doc_id, doc_paths in paths.items() if failed_paths.intersection(doc_paths)],
+    }), 200
+
+
+@app.get("/api/documents/<int:document_id>/link")
+def document_link(document_id: int):
+    """Signed content URL for the document's owner or a doctor the patient has consulted"""
+    identity = get_token_identity()
+    if not identity:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    db = SessionLocal()
+    try:
+        owner_id = db.query(Document.user_id).filter(Document.id == document_id).scalar()
+        if owner_id is None:
+            return jsonify({"error": "Document not found"}), 404
+        if identity['role'] == 'patient':
+            allowed = owner_id == identity['user_id']
+        elif identity['role'] == 'doctor':
+            allowed = db.query(Consultation.id).filter(
+                Consultation.doctor_id == identity['user_id'],
+                Consultation.patient_id == owner_id
+            ).first() is not None
+        else:
+            allowed = False
+        if not allowed:
+            return jsonify({"error": "Forbidden"}), 403
+    finally:
+        db.close()
+
+    token = create_document_token(document_id)
+    return jsonify({
+        "url": url_for('document_content', document_id=document_id, token=token, _external=True),
+        "expires_in": DOCUMENT_LINK_TTL,
+    }), 200
+
+
+@app.get("/api/documents/<int:document_id>/content")
+def document_content(document_id: int):
+    """Serve a document via a signed link, with ETag/Last-Modified revalidation and byte ranges.
+
+    Storage objects never change under a path, so the ETag is derived from it and
+    a conditional request is answered before touching storage. Bodies come from
+    the local disk cache (send_file streams the file) when one is configured.
+    """
+    if not verify_document_token(request.args.get('token', ''), document_id):
+        return jsonify({"error": "Invalid or expired document link"}), 403
+
+    db = SessionLocal()
+    try:
+        document = db.query(
+            Document.file_path, Document.file_name, Document.file_type, Document.created_at
+        ).filter(Document.id == document_id).first()
+    finally:
+        db.close()
+    if not document:
+        return jsonify({"error": "Document not found"}), 404
+
+    etag = hashlib.sha256(document.file_path.encode('utf-8')).hexdigest()[:32]
+    last_modified = document.created_at
+    if last_modified is not None and last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)  # stored as naive UTC on SQLite
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+    else:
+        # An open handle, not a path: another worker may evict the file before it is sent
+        source = document_cache.open(document.file_path)
+        if source is None:
+            if not supabase:
+                return jsonify({"error": "Document storage not configured"}), 503
+            try:
+                data = supabase.storage.from_('medical-documents').download(document.file_path)
+            except Exception as storage_err:
+                logger.error(f"Document {document_id} download from storage failed: {storage_err}")
+                return jsonify({"error": "Document is temporarily unavailable"}), 502
+            document_cache.put(document.file_path, data)
+            source = io.BytesIO(data)
+
+        response = send_file(
+            source,
+            mimetype=document.file_type or None,
+            download_name=document.file_name,
+            as_attachment=request.args.get('download', 'false').lower() == 'true',
+            etag=etag,
+            last_modified=last_modified,
+            max_age=DOCUMENT_LINK_TTL,
+            conditional=True,
+        )
+    # Medical records: browsers may cache them, shared proxies may not
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.max_age = DOCUMENT_LINK_TTL
+    return response
+
+
+def generate_document_thumbnail(document_id: int, file_path: str, content: bytes, content_type: str) -> None:
+    """Render a thumbnail in the media process pool, store it next to the original and record its URL"""
+    rendered = run_media(render_thumbnail, content, content_type)
+    if not rendered:
+        return
+    thumbnail, thumbnail_type = rendered
+    path = thumbnail_path(file_path)
+    bucket = supabase.storage.from_('medical-documents')
+    bucket.upload(path, thumbnail, {'content-type': thumbnail_type})
+    url_response = bucket.get_public_url(path)
+    thumbnail_url = url_response if isinstance(url_response, str) else url_response.get('publicUrl', '')
+
+    db = SessionLocal.session_factory()
+    try:
+        updated = db.query(Document).filter(Document.id == document_id).update(
+            {Document.thumbnail_url: thumbnail_url}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+    if not updated:  # deleted while rendering
+        remove_from_storage([path])
+    logger.info(f"Thumbnail for document {document_id}: {len(content)} -> {len(thumbnail)} bytes")
+
+
+def generate_profile_photo_sizes(role: str, principal_id: int, file_path: str, photo_url: str, content: bytes) -> None:
+    """Render the PROFILE_PHOTO_SIZES WebP sizes of a profile photo and record their URLs"""
+    variants = run_media(render_profile_variants, content)
+    if not variants:
+        return
+    bucket = supabase.storage.from_('medical-documents')
+    urls = {}
+    for size, data in variants.items():
+        path = profile_variant_path(file_path, size)
+        bucket.upload(path, data, {'content-type': 'image/webp'})
+        url_response = bucket.get_public_url(path)
+        urls[size] = url_response if isinstance(url_response, str) else url_response.get('publicUrl', '')
+
+    model = Doctor if role == 'doctor' else User
+    db = SessionLocal.session_factory()
+    try:
+        # Only if the photo was not replaced meanwhile
+        updated = db.query(model).filter(model.id == principal_id, model.photo_url == photo_url).update(
+            {getattr(model, f'photo_url_{size}'): url for size, url in urls.items()}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+    if not updated:
+        remove_from_storage([profile_variant_path(file_path, size) for size in variants])
+    logger.info(f"Profile photo sizes for {role} {principal_id}: {len(content)} -> "
+                + ", ".join(f"{size}px {len(data)}" for size, data in sorted(variants.items())) + " bytes")
+
+
+def remove_from_storage(file_paths: List[str]) -> List[str]:
+    """Remove files in one storage call (and their local cached copies); returns the paths storage did not confirm as removed"""
+    for path in file_paths:
+        document_cache.discard(path)
+    try:
+        removed = supabase.storage.from_('medical-documents').remove(file_paths) or []
+    except Exception as supabase_err:
+        print(f"[WARN] Failed to delete file from storage: {supabase_err}")
+        return list(file_paths)
+    removed_names = {item.get('name') for item in removed if isinstance(item, dict)}
+    failed = [path for path in file_paths if path not in removed_names]
+    if failed:
+        print(f"[WARN] Storage did not remove {len(failed)} of {len(file_paths)} file(s): {failed[:5]}")
+    return failed
+
+
 @app.get("/api/notifications")
 def list_notifications():
     identity = get_token_identity()
@@ -2769,7 +3972,8 @@ def request_consultation():
     if symptoms and not llm_summary and LLM_SERVICE_AVAILABLE:
         try:
             analyzer = get_symptom_analyzer()
-            analysis = analyzer.analyze_symptoms(symptoms)
+            # Background priority: queues behind interactive /api/analyze-symptoms calls
+            analysis = run_llm(analyzer.analyze_symptoms, symptoms, priority=PRIORITY_BACKGROUND)
             # Create a concise summary for doctor
             llm_summary = f"[AI Analysis] Severity: {analysis.get('severity', 'unknown').upper()} | {analysis.get('summary', '')}"
             logger.info(f"Auto-generated LLM summary for consultation request")
@@ -2894,7 +4098,7 @@ def list_doctors():
                 "name": doctor.name,
                 "specialization": doctor.specialization,
                 "hospital": doctor.hospital,
-                "photo_url": doctor.photo_url,
+                "photo_url": avatar_url(doctor),
                 "is_online": doctor.is_online
             })
         
@@ -2923,7 +4127,11 @@ def analyze_symptoms():
         "gender": "male/female/other" (optional)
     }
     
-    Returns structured health analysis
+    Returns structured health analysis. With ?stream=1 (or Accept: text/event-stream)
+    the response is Server-Sent Events: an immediate "triage" event from the local
+    model, one "field" event per top-level field as Gemini produces it (severity and
+    summary first), then a final "result" event carrying the full analysis, or an
+    "error" event. With ?instant=1 only the local triage result is returned.
     """
     user = get_current_user()
     if not user:
@@ -2938,6 +4146,9 @@ def analyze_symptoms():
     if len(symptoms) < 10:
         return jsonify({"error": "Please provide more detailed symptom description (minimum 10 characters)"}), 400
     
+    if request.args.get('instant', '').lower() in ('1', 'true', 'yes'):
+        return jsonify(local_triage(symptoms)), 200
+
     if not LLM_SERVICE_AVAILABLE:
         logger.warning("LLM service not available, returning error")
         return jsonify({
@@ -2952,11 +4163,23 @@ def analyze_symptoms():
         
         # Get LLM analyzer and perform analysis
         analyzer = get_symptom_analyzer()
-        analysis_result = analyzer.analyze_symptoms(
+        # Providers get whatever is left of this request's budget
+        deadline = time.monotonic() + LLM_REQUEST_TIMEOUT
+
+        if wants_event_stream():
+            return stream_symptom_analysis(analyzer, user.id, symptoms, age, gender, deadline)
+
+        analysis_result = run_llm(
+            analyzer.analyze_symptoms,
             symptoms=symptoms,
             patient_age=age,
-            patient_gender=gender
+            patient_gender=gender,
+            deadline=deadline
         )
+
+        if analysis_result.get('source') == 'local_fallback':
+            # No provider answered: combine the trained triage model with the keyword fallback
+            analysis_result = {**local_triage(symptoms, analysis_result), 'rate_limited': analysis_result.get('rate_limited', False)}
         
         # Add metadata
         analysis_result['analysis_available'] = True
@@ -2965,6 +4188,9 @@ def analyze_symptoms():
         logger.info(f"Symptom analysis completed for user {user.id}")
         return jsonify(analysis_result), 200
         
+    except FutureTimeoutError:
+        logger.warning(f"Symptom analysis timed out after {LLM_REQUEST_TIMEOUT}s for user {user.id}, answering with local triage")
+        return jsonify({**local_triage(symptoms), 'llm_timeout': True}), 200
     except Exception as e:
         logger.error(f"Error in symptom analysis: {e}", exc_info=True)
         return jsonify({
@@ -2973,6 +4199,148 @@ def analyze_symptoms():
         }), 500
 
 
+def local_triage(symptoms: str, fallback: Optional[dict] = None) -> dict:
+    """Instant severity/summary from the local triage model, never rated below the keyword fallback"""
+    if fallback is None and LLM_SERVICE_AVAILABLE:
+        fallback = get_symptom_analyzer().local_fallback(symptoms)
+    result = get_triage_model().predict(symptoms, floor=fallback['severity'] if fallback else None)
+    if fallback:
+        result = merge_fallback(result, fallback)
+    result['analysis_available'] = True
+    result['analyzed_at'] = datetime.now(timezone.utc).isoformat()
+    return result
+
+
+def wants_event_stream() -> bool:
+    """True when the client asked for a streamed (SSE) response"""
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_symptom_analysis(analyzer, user_id, symptoms, age, gender, deadline=None):
+    """Stream an analysis as Server-Sent Events so the UI can render severity before the rest arrives"""
+    def generate():
+        yield ": analyzing\n\n"  # flush headers immediately through proxies
+        try:
+            yield sse_event('triage', local_triage(symptoms))
+            for event_name, payload in analyzer.analyze_symptoms_stream(
+                symptoms=symptoms,
+                patient_age=age,
+                patient_gender=gender,
+                user_id=user_id,
+                deadline=deadline
+            ):
+                if event_name == 'result' and payload.get('source') == 'local_fallback':
+                    payload = {**local_triage(symptoms, payload), 'rate_limited': payload.get('rate_limited', False)}
+                if event_name == 'result':
+                    payload['analysis_available'] = True
+                    payload['analyzed_at'] = datetime.now(timezone.utc).isoformat()
+                    logger.info(f"Streamed symptom analysis completed for user {user_id}")
+                yield sse_event(event_name, payload)
+        except Exception as e:
+            logger.error(f"Error in streamed symptom analysis: {e}", exc_info=True)
+            yield sse_event('error', {
+                "error": "Failed to analyze symptoms",
+                "message": "An error occurred during analysis. Please try again or consult a doctor directly."
+            })
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.post("/api/analyze-symptoms/batch")
+def analyze_symptoms_batch():
+    """
+    Analyze many symptom descriptions in one request (clinic intake / kiosks)
+
+    Request body:
+    {
+        "items": [{"id": "kiosk-1", "symptoms": "...", "age": 25, "gender": "female"}, ...]
+    }
+
+    Batches always queue for Gemini quota at background priority, behind
+    interactive analyses; a client-supplied "priority" is ignored.
+
+    Identical inputs are analyzed once. Results stream back as Server-Sent Events
+    in completion order: one "item" event per input ({"id", "result"} or {"id", "error"}),
+    then a "done" event with counts.
+    """
+    caller = get_current_user() or get_current_doctor()
+    if not caller:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(force=True, silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "items array required"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {BATCH_MAX_ITEMS} items per batch"}), 400
+
+    if not LLM_SERVICE_AVAILABLE:
+        return jsonify({
+            "error": "AI service not available",
+            "message": "AI analysis service is not configured. Please contact administrator."
+        }), 503
+
+    # Dedupe identical inputs: key -> case, key -> ids waiting on it
+    cases, waiting, invalid = {}, {}, []
+    for index, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        item_id = item.get('id', index)
+        symptoms = str(item.get('symptoms') or '').strip()
+        if len(symptoms) < 10:
+            invalid.append(item_id)
+            continue
+        case = {'symptoms': symptoms, 'age': item.get('age'), 'gender': item.get('gender')}
+        key = hashlib.sha256(json.dumps([symptoms.lower(), case['age'], case['gender']]).encode('utf-8')).hexdigest()
+        cases.setdefault(key, case)
+        waiting.setdefault(key, []).append(item_id)
+
+    deadline = time.monotonic() + LLM_REQUEST_TIMEOUT
+    analyzer = get_symptom_analyzer()
+    logger.info(f"Batch analysis: {len(items)} item(s), {len(cases)} distinct, {len(invalid)} invalid")
+
+    def generate():
+        yield ": analyzing\n\n"
+        for item_id in invalid:
+            yield sse_event('item', {"id": item_id, "error": "Please provide more detailed symptom description (minimum 10 characters)"})
+        analyzed = 0
+        try:
+            for key, analysis in analyzer.analyze_batch(cases, priority=PRIORITY_BACKGROUND, deadline=deadline):
+                if analysis.get('source') == 'local_fallback':
+                    analysis = local_triage(cases[key]['symptoms'], analysis)
+                analysis['analysis_available'] = True
+                analysis['analyzed_at'] = datetime.now(timezone.utc).isoformat()
+                analyzed += 1
+                for item_id in waiting.pop(key, []):
+                    yield sse_event('item', {"id": item_id, "result": analysis})
+        except Exception as e:
+            logger.error(f"Error in batch symptom analysis: {e}", exc_info=True)
+            for item_ids in waiting.values():
+                for item_id in item_ids:
+                    yield sse_event('item', {"id": item_id, "error": "Failed to analyze symptoms"})
+        yield sse_event('done', {
+            "items": len(items),
+            "distinct": len(cases),
+            "analyzed": analyzed,
+            "invalid": len(invalid),
+        })
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @app.get("/api/doctors/<int:doctor_id>")
 def get_doctor(doctor_id):
     """Get a single doctor by ID"""
@@ -2990,6 +4358,7 @@ def get_doctor(doctor_id):
             "specialization": doctor.specialization,
             "hospital": doctor.hospital,
             "photo_url": doctor.photo_url,
+            "photo_urls": photo_urls(doctor),
             "id_card_url": doctor.id_card_url if hasattr(doctor, 'id_card_url') else None,
             "is_online": doctor.is_online,
             "is_verified": doctor.is_verified if hasattr(doctor, 'is_verified') else False,
@@ -3079,7 +4448,7 @@ def get_consultation_history():
                 'created_at': cons.created_at.isoformat() if cons.created_at else None,
                 'doctor_id': cons.doctor_id,
                 'doctor_name': doctor.name if doctor else None,
-                'doctor_photo_url': doctor.photo_url if doctor else None,
+                'doctor_photo_url': avatar_url(doctor),
                 'doctor_specialization': doctor.specialization if doctor else None,
                 'patient_id': cons.patient_id,
                 'patient_name': patient.name if patient else None,
@@ -3100,21 +4469,25 @@ def get_active_consultations_patient():
     
     db = SessionLocal()
     try:
-        consultations = db.query(Consultation).filter(
-            Consultation.patient_id == user.id,
+        rows = db.query(ConsultationThread, Consultation, Doctor.name, func.coalesce(Doctor.photo_url_256, Doctor.photo_url)).join(
+            Consultation, Consultation.id == ConsultationThread.consultation_id
+        ).outerjoin(
+            Doctor, Doctor.id == ConsultationThread.doctor_id
+        ).filter(
+            ConsultationThread.patient_id == user.id,
             Consultation.status == 'active'
-        ).order_by(Consultation.started_at.desc()).all()
+        ).order_by(ConsultationThread.last_activity_at.desc()).all()
         
         result = []
-        for cons in consultations:
-            doctor = db.query(Doctor).filter(Doctor.id == cons.doctor_id).first()
+        for thread, cons, doctor_name, doctor_photo_url in rows:
             result.append({
                 "id": cons.id,
                 "doctor_id": cons.doctor_id,
-                "doctor_name": doctor.name if doctor else "Unknown",
-                "doctor_photo_url": doctor.photo_url if doctor else None,
+                "doctor_name": doctor_name or "Unknown",
+                "doctor_photo_url": doctor_photo_url,
                 "started_at": cons.started_at.isoformat() if cons.started_at else None,
-                "status": cons.status
+                "status": cons.status,
+                **thread.to_dict('patient')
             })
         
         return jsonify(result), 200
@@ -3143,7 +4516,7 @@ def get_pending_requests():
                 "id": cons.id,
                 "doctor_id": cons.doctor_id,
                 "doctor_name": doctor.name if doctor else "Any Available Doctor",
-                "doctor_photo_url": doctor.photo_url if doctor else None,
+                "doctor_photo_url": avatar_url(doctor),
                 "doctor_specialization": doctor.specialization if doctor else None,
                 "symptoms": cons.primary_symptoms,
                 "created_at": cons.created_at.isoformat() if cons.created_at else None,
@@ -3350,13 +4723,14 @@ def upload_file():
             # If it's a profile photo or ID card, update user/doctor's photo_url or id_card_url
             document_record = None
             if is_profile_photo or is_doctor_card:
+                stale_photos = []
                 db_session = SessionLocal()
                 try:
                     if user_role == 'doctor':
                         db_doctor = db_session.query(Doctor).filter(Doctor.id == user_id).first()
                         if db_doctor:
                             if is_profile_photo:
-                                db_doctor.photo_url = public_url
+                                stale_photos = set_profile_photo(db_doctor, public_url)
                                 print(f"[INFO] Profile photo updated for doctor {user_id}")
                             elif is_doctor_card:
                                 db_doctor.id_card_url = public_url
@@ -3366,11 +4740,16 @@ def upload_file():
                         if is_profile_photo:
                             db_user = db_session.query(User).filter(User.id == user_id).first()
                             if db_user:
-                                db_user.photo_url = public_url
+                                stale_photos = set_profile_photo(db_user, public_url)
                                 db_session.commit()
                                 print(f"[INFO] Profile photo updated for user {user_id}")
                 finally:
                     db_session.close()
+
+                if stale_photos:
+                    run_in_background(remove_from_storage, stale_photos)
+                if is_profile_photo and PIL_AVAILABLE and file.content_type in IMAGE_TYPES:
+                    run_in_background(generate_profile_photo_sizes, user_role, user_id, file_path, public_url, file_content)
             else:
                 db_session = SessionLocal()
                 try:
@@ -3391,6 +4770,9 @@ def upload_file():
                 finally:
                     db_session.close()
 
+                if can_preview(file.content_type):
+                    run_in_background(generate_document_thumbnail, document_record.id, file_path, file_content, file.content_type)
+
                 create_notification(
                     user_id,
                     user_role,
@@ -3494,6 +4876,35 @@ def admin_dashboard_stats():
         db.close()
 
 
+@app.get("/api/admin/llm/prompt-stats")
+def admin_prompt_stats():
+    """Per-template prompt usage (hits and average prompt tokens) since startup"""
+    admin = get_current_admin()
+    if not admin:
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(prompt_registry.stats()), 200
+
+
+@app.get("/api/admin/llm/cache-stats")
+def admin_cache_stats():
+    """Semantic analysis cache hit rate and size since startup"""
+    admin = get_current_admin()
+    if not admin:
+        return jsonify({"error": "Unauthorized"}), 401
+    if not LLM_SERVICE_AVAILABLE:
+        return jsonify({"error": "AI analysis service is not configured"}), 503
+    return jsonify(semantic_cache.metrics()), 200
+
+
+@app.get("/api/admin/documents/cache-stats")
+def admin_document_cache_stats():
+    """Local document cache hit rate and disk usage since startup"""
+    admin = get_current_admin()
+    if not admin:
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(document_cache.metrics()), 200
+
+
 @app.get("/api/admin/doctors")
 def admin_list_doctors():
     """List all doctors (admin only)"""
@@ -3530,9 +4941,8 @@ def admin_add_doctor():
     db = SessionLocal()
     try:
         # Check if doctor already exists
-        existing = db.query(Doctor).filter(Doctor.email == email).first()
-        if existing:
-            return jsonify({"error": "Doctor with this email already exists"}), 409
+        if email_taken(db, email):
+            return jsonify({"error": "An account with this email already exists"}), 409
         
         # Create new doctor
         doctor = Doctor(
@@ -3569,6 +4979,8 @@ def admin_add_doctor():
             "message": "Doctor added successfully. Status: Pending Verification",
             "doctor": doctor_dict
         }), 201
+    except PasswordHashingBusy:
+        raise
     except Exception as e:
         db.rollback()
         return jsonify({"error": str(e)}), 500
@@ -3594,7 +5006,10 @@ def admin_update_doctor(doctor_id):
         if 'name' in data:
             doctor.name = data['name']
         if 'email' in data:
-            doctor.email = data['email'].strip().lower()
+            email = data['email'].strip().lower()
+            if email_taken(db, email, doctor):
+                return jsonify({"error": "An account with this email already exists"}), 409
+            doctor.email = email
         if 'specialization' in data:
             doctor.specialization = data['specialization']
         if 'hospital' in data:
@@ -3627,6 +5042,8 @@ def admin_update_doctor(doctor_id):
             "message": "Doctor updated successfully",
             "doctor": doctor_dict
         }), 200
+    except PasswordHashingBusy:
+        raise
     except Exception as e:
         db.rollback()
         return jsonify({"error": str(e)}), 500
@@ -3730,6 +5147,8 @@ def admin_reset_patient_password(patient_id):
         log_admin_action(admin.id, 'reset_password', patient_id, {'user_type': 'patient'})
         
         return jsonify({"message": "Password reset successfully"}), 200
+    except PasswordHashingBusy:
+        raise
     except Exception as e:
         db.rollback()
         return jsonify({"error": str(e)}), 500
@@ -3816,6 +5235,8 @@ def admin_resolve_password_reset(reset_id):
             return jsonify({"message": "Password reset request rejected"}), 200
         else:
             return jsonify({"error": "Invalid action. Use 'approve' or 'reject'"}), 400
+    except PasswordHashingBusy:
+        raise
     except Exception as e:
         db.rollback()
         return jsonify({"error": str(e)}), 500
@@ -3947,6 +5368,11 @@ def health_check():
             "pool_info": {
                 "pool_size": engine.pool.size() if hasattr(engine.pool, 'size') else "N/A (SQLite)",
                 "checked_in": engine.pool.checkedin() if hasattr(engine.pool, 'checkedin') else "N/A"
+            },
+            "read_replica": {
+                "configured": read_engine is not None,
+                "lag_seconds": replica_lag_seconds() if read_engine is not None else None,
+                "lag_tolerance": REPLICA_LAG_TOLERANCE,
             }
         }), 200
     except Exception as e:
@@ -3959,6 +5385,27 @@ def health_check():
         db.close()
 
 
+def send_feedback_email(msg) -> None:
+    import smtplib
+
+    try:
+        with smtplib.SMTP('smtp.gmail.com', 587, timeout=10) as server:
+            server.starttls()
+            # If you have app password set in environment
+            email_user = os.getenv('EMAIL_USER', 'aadipandey223@gmail.com')
+            email_password = os.getenv('EMAIL_PASSWORD', '')
+            
+            if email_password:
+                server.login(email_user, email_password)
+                server.send_message(msg)
+                logger.info("✅ Email sent successfully via SMTP")
+            else:
+                logger.warning("⚠️  EMAIL_PASSWORD not set - email not sent. Set EMAIL_PASSWORD environment variable.")
+    except Exception as smtp_error:
+        logger.error(f"❌ SMTP Error: {str(smtp_error)}")
+        # Continue anyway - at least we logged the feedback
+
+
 @app.post("/api/feedback")
 def send_feedback():
     """Send feedback email from patient"""
@@ -3988,7 +5435,6 @@ def send_feedback():
     
     # Send actual email
     try:
-        import smtplib
         from email.mime.text import MIMEText
         from email.mime.multipart import MIMEMultipart
         
@@ -4047,23 +5493,8 @@ def send_feedback():
         msg.attach(part1)
         msg.attach(part2)
         
-        # Try to send email via Gmail SMTP
-        try:
-            with smtplib.SMTP('smtp.gmail.com', 587, timeout=10) as server:
-                server.starttls()
-                # If you have app password set in environment
-                email_user = os.getenv('EMAIL_USER', 'aadipandey223@gmail.com')
-                email_password = os.getenv('EMAIL_PASSWORD', '')
-                
-                if email_password:
-                    server.login(email_user, email_password)
-                    server.send_message(msg)
-                    logger.info("✅ Email sent successfully via SMTP")
-                else:
-                    logger.warning("⚠️  EMAIL_PASSWORD not set - email not sent. Set EMAIL_PASSWORD environment variable.")
-        except Exception as smtp_error:
-            logger.error(f"❌ SMTP Error: {str(smtp_error)}")
-            # Continue anyway - at least we logged the feedback
+        # Send via Gmail SMTP off the request path - the response doesn't depend on it
+        run_in_background(send_feedback_email, msg)
         
         return jsonify({
             "success": True,
@@ -4120,11 +5551,25 @@ def api_documentation():
     }), 200
 
 
-# Initialize database on startup
-with app.app_context():
-    init_db()
-    run_startup_migrations()
-    seed_demo_data()
+# Initialize database on startup (not in media pool processes, which import
+# this module as __mp_main__ when the app runs as `python app.py`)
+if __name__ != "__mp_main__":
+    with app.app_context():
+        init_db()
+        run_startup_migrations()
+        password_hasher.calibrate()
+        seed_demo_data()
+        start_sqlite_maintenance()
+        presence.configure(engine, ConsultationPresence.__table__)
+        presence.start_sweeper()
+        if LLM_SERVICE_AVAILABLE:
+            # Blocked-response logs share the app's pooled engine instead of opening their own connections
+            blocked_log_writer.configure(engine, BlockedAILog.__table__)
+            _db = SessionLocal.session_factory()
+            try:
+                semantic_cache.configure([name for (name,) in _db.query(Symptom.name)])
+            finally:
+                _db.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,159 @@
+"""
+Local disk cache for document delivery
+Documents fetched from Supabase storage are kept on local disk so repeat
+downloads (doctors re-opening the same report PDFs) are served straight from
+the filesystem with send_file instead of another storage round trip. Files are
+immutable per storage path, so entries never need revalidation.
+
+Every worker process on the host shares the directory: file mtimes are the LRU
+order (a hit touches its file) and DOCUMENT_CACHE_MAX_BYTES is enforced from a
+scan of the directory after each store, so the budget bounds the directory as
+a whole rather than each worker. Disabled when DOCUMENT_CACHE_DIR is empty.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_CACHE_DIR = os.getenv("DOCUMENT_CACHE_DIR", "")
+DOCUMENT_CACHE_MAX_BYTES = int(os.getenv("DOCUMENT_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))  # 1 GB, all workers together
+
+
+class DocumentCache:
+    """Size-bounded LRU of storage objects on local disk, keyed by storage path"""
+
+    def __init__(self, directory: str = DOCUMENT_CACHE_DIR, max_bytes: int = DOCUMENT_CACHE_MAX_BYTES):
+        self.directory: Optional[Path] = None
+        self.max_bytes = max_bytes
+        self._entries = 0  # as of the last directory scan
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        if directory:
+            self.configure(directory, max_bytes)
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None and self.max_bytes > 0
+
+    def configure(self, directory: str, max_bytes: int):
+        """Point the cache at `directory`, adopting files a previous process left there"""
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        self.directory = path
+        self.max_bytes = max_bytes
+        self._enforce_budget()
+
+    @staticmethod
+    def _name(key: str) -> str:
+        # Storage paths contain user-supplied file names; never use them as local paths
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _record(self, stat: str, count: int = 1):
+        with self._lock:
+            self.stats[stat] += count
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        """Open handle on the cached object, or None
+
+        The handle stays readable even if another worker evicts the file while
+        it is being sent, so callers should stream from it rather than reopen
+        the path.
+        """
+        if not self.enabled:
+            return None
+        path = self.directory / self._name(key)
+        try:
+            handle = open(path, "rb")
+        except OSError:
+            self._record("misses")
+            return None
+        try:
+            os.utime(path)  # LRU order, shared by every worker
+        except OSError:
+            pass
+        self._record("hits")
+        return handle
+
+    def put(self, key: str, data: bytes) -> bool:
+        """Store `data` under `key`; False when it is not cached"""
+        if not self.enabled or len(data) > self.max_bytes:
+            return False
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(data)
+            os.replace(tmp_path, self.directory / self._name(key))  # atomic: readers never see a partial file
+        except OSError as exc:
+            logger.warning(f"Document cache write failed: {exc}")
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return False
+        self._record("stores")
+        self._enforce_budget()
+        return True
+
+    def discard(self, key: str):
+        """Drop the cached copy of a deleted storage object"""
+        if not self.enabled:
+            return
+        try:
+            (self.directory / self._name(key)).unlink()
+        except OSError:
+            pass
+
+    def _enforce_budget(self):
+        """Evict least recently used files until the whole directory fits max_bytes"""
+        files = []
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith(".tmp"):
+                        continue
+                    try:
+                        if entry.is_file():
+                            stat = entry.stat()
+                            files.append((stat.st_mtime, stat.st_size, entry.path))
+                    except OSError:
+                        continue  # removed by another worker mid-scan
+        except OSError as exc:
+            logger.warning(f"Document cache scan failed: {exc}")
+            return
+        total = sum(size for _, size, _ in files)
+        evicted = 0
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass  # another worker evicted it first
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        with self._lock:
+            self.stats["evictions"] += evicted
+            self._entries = len(files) - evicted
+            self._bytes = total
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = self._entries
+            stats["bytes"] = self._bytes
+        stats["enabled"] = self.enabled
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+document_cache = DocumentCache()
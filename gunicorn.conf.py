@@ -0,0 +1,42 @@
+"""
+Gunicorn configuration for the Medicare backend
+
+Symptom analysis spends seconds waiting on Gemini, so plain sync workers
+(one request per process) let a few analyses starve every other endpoint.
+The default here is the threaded worker: each process serves GUNICORN_THREADS
+requests concurrently, and blocking I/O (Gemini, Supabase, SMTP) releases the
+GIL while it waits.
+
+Set GUNICORN_WORKER_CLASS=gevent (requires `pip install gevent`) for
+cooperative greenlets instead. In that mode the Gemini client is switched to
+its REST transport, since the default gRPC transport does not cooperate with
+gevent's monkey patching.
+
+Usage: gunicorn app:app -c gunicorn.conf.py
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "200"))  # gevent only
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+if worker_class == "gevent":
+    os.environ.setdefault("GEMINI_TRANSPORT", "rest")
+
+
+def on_starting(server):
+    # Workers split process-local quotas (Gemini RPM/RPD) by this count
+    os.environ["WEB_CONCURRENCY"] = str(server.cfg.workers)
+    # One bcrypt cost for every worker: calibrating per worker could pick
+    # different costs and re-hash accounts back and forth between them
+    from password_hashing import password_hasher
+    server.log.info(f"Password hashing cost {password_hasher.calibrate()}")
+
+
+def post_fork(server, worker):
+    server.log.info(f"Worker {worker.pid} started ({worker_class}, threads={threads})")
@@ -0,0 +1,193 @@
+"""
+Provider router for LLM calls
+Circuit breakers, latency-aware hedging and deadline propagation across
+interchangeable providers (Gemini, OpenAI, or local stubs in benchmarks).
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ROUTER_WORKERS = int(os.getenv("LLM_ROUTER_WORKERS", "16"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("LLM_BREAKER_RESET", "30"))  # seconds before a trial call
+HEDGE_DEFAULT_P95 = float(os.getenv("LLM_HEDGE_DEFAULT_P95", "8"))  # used until enough samples exist
+
+
+class ProviderUnavailable(Exception):
+    """A provider declined this request (quota, safety block, not configured) without being unhealthy"""
+
+
+class RoutingFailed(Exception):
+    """No provider produced a result before the deadline"""
+
+    def __init__(self, errors: Dict[str, Exception], timed_out: bool):
+        self.errors = errors
+        self.timed_out = timed_out
+        detail = ", ".join(f"{name}: {err}" for name, err in errors.items()) or "no provider available"
+        super().__init__(("deadline exceeded; " if timed_out else "") + detail)
+
+
+class CircuitBreaker:
+    """closed -> open after consecutive failures; after reset_timeout a single trial call (half-open)"""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"Circuit opened after {self.failures} failure(s)")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def record_neutral(self):
+        """The call was declined, not failed: let the next request run the trial again"""
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+                self.opened_at = time.monotonic() - self.reset_timeout
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies"""
+
+    def __init__(self, default_p95: float = HEDGE_DEFAULT_P95, window: int = 100):
+        self.default_p95 = default_p95
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def p95(self) -> float:
+        with self._lock:
+            if len(self.samples) < 5:
+                return self.default_p95
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class Provider:
+    """A named LLM backend: call(request, deadline) returns a result or raises.
+
+    deadline is a time.monotonic() value the provider should pass down as its own
+    network timeout. Raise ProviderUnavailable for refusals that say nothing about
+    the provider's health; any other exception counts against its circuit breaker.
+    """
+
+    def __init__(self, name: str, call: Callable[[Dict, float], object], default_p95: float = HEDGE_DEFAULT_P95, breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.call = call
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker(default_p95)
+
+
+class LLMRouter:
+    """Routes a request across providers in preference order.
+
+    The first provider is called immediately. If it fails, the next one starts
+    right away; if it is merely slow (no answer within its observed p95), the
+    next one is started as a hedge and whichever succeeds first wins. Providers
+    whose circuit is open are skipped. Nothing waits past the caller's deadline.
+    """
+
+    def __init__(self, providers: List[Provider], max_workers: int = ROUTER_WORKERS):
+        self.providers = providers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-router")
+        self.stats = {"routed": 0, "hedged": 0, "failovers": 0, "failed": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _call(self, provider: Provider, request: Dict, deadline: float):
+        started = time.monotonic()
+        try:
+            result = provider.call(request, deadline)
+        except ProviderUnavailable:
+            provider.breaker.record_neutral()
+            raise
+        except Exception:
+            provider.breaker.record_failure()
+            raise
+        provider.breaker.record_success()
+        provider.latency.record(time.monotonic() - started)
+        return result
+
+    def route(self, request: Dict, deadline: float) -> Tuple[str, object]:
+        """Return (provider name, result) from the first provider to succeed before `deadline`"""
+        errors: Dict[str, Exception] = {}
+        pending = {}
+        queue = iter(self.providers)
+        exhausted = False
+        hedge_at = None
+
+        def launch_next() -> bool:
+            nonlocal exhausted, hedge_at
+            for provider in queue:
+                if not provider.breaker.allow():
+                    errors[provider.name] = ProviderUnavailable("circuit open")
+                    continue
+                future = self.executor.submit(self._call, provider, request, deadline)
+                pending[future] = provider
+                hedge_at = time.monotonic() + provider.latency.p95()
+                return True
+            exhausted = True
+            return False
+
+        self._count("routed")
+        launch_next()
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            wake_at = deadline if exhausted else min(deadline, hedge_at)
+            done, _ = wait(list(pending), timeout=max(0.0, wake_at - now), return_when=FIRST_COMPLETED)
+
+            if not done:
+                if not exhausted and time.monotonic() < deadline and launch_next():
+                    self._count("hedged")
+                continue
+
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    return provider.name, future.result()
+                except Exception as exc:
+                    errors[provider.name] = exc
+                    logger.warning(f"LLM provider '{provider.name}' failed: {exc}")
+            if not pending and launch_next():
+                self._count("failovers")
+
+        self._count("failed")
+        raise RoutingFailed(errors, timed_out=bool(pending) or time.monotonic() >= deadline)
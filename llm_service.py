@@ -5,16 +5,633 @@ Uses Google Gemini API (free tier: 15 RPM, 1500 RPD)
 
 import os
 import json
+import atexit
+import copy
+import heapq
+import hashlib
+import itertools
 import logging
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
 import google.generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
-from typing import Dict, Optional, List
+from typing import Dict, Iterator, Optional, List, Tuple
 from datetime import datetime, timezone
-import sqlite3
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Text, create_engine
+
+from llm_router import LLMRouter, Provider, ProviderUnavailable, RoutingFailed
+from prompt_templates import PromptTemplate, registry as prompt_registry
+from semantic_cache import SemanticCache
 
 logger = logging.getLogger(__name__)
 
 
+# Per-call timeout for Gemini requests (seconds); the HTTP layer adds its own deadline on top
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "30"))
+
+# Client-side quota for the whole deployment (free tier: 15 RPM, 1500 RPD) and how long
+# callers may queue for it. Each worker process enforces its WEB_CONCURRENCY share.
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "15"))
+GEMINI_RPD = int(os.getenv("GEMINI_RPD", "1500"))
+GEMINI_QUOTA_SHARE = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+LLM_INTERACTIVE_DEADLINE = float(os.getenv("LLM_INTERACTIVE_DEADLINE", "8"))
+LLM_BACKGROUND_DEADLINE = float(os.getenv("LLM_BACKGROUND_DEADLINE", "45"))
+
+# Output tokens we budget per analysis; picks the shortest prompt variant whose answer fits
+LLM_OUTPUT_BUDGET = int(os.getenv("LLM_OUTPUT_BUDGET", "1000"))
+
+# Batch analysis: cases packed into one Gemini prompt, and packs/singles run concurrently
+LLM_BATCH_PACK_SIZE = int(os.getenv("LLM_BATCH_PACK_SIZE", "4"))
+LLM_BATCH_WORKERS = int(os.getenv("LLM_BATCH_WORKERS", "4"))
+
+# Blocked-response logging: bounded queue drained in batches by a background thread
+BLOCKED_LOG_QUEUE_SIZE = int(os.getenv("BLOCKED_LOG_QUEUE_SIZE", "1000"))
+BLOCKED_LOG_BATCH_SIZE = int(os.getenv("BLOCKED_LOG_BATCH_SIZE", "50"))
+BLOCKED_LOG_FLUSH_INTERVAL = float(os.getenv("BLOCKED_LOG_FLUSH_INTERVAL", "2"))
+
+# Use BLOCK_ONLY_HIGH to allow most medical content through
+SAFETY_SETTINGS = [
+    {"category": HarmCategory.HARM_CATEGORY_HARASSMENT, "threshold": HarmBlockThreshold.BLOCK_ONLY_HIGH},
+    {"category": HarmCategory.HARM_CATEGORY_HATE_SPEECH, "threshold": HarmBlockThreshold.BLOCK_ONLY_HIGH},
+    {"category": HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT, "threshold": HarmBlockThreshold.BLOCK_ONLY_HIGH},
+    {"category": HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT, "threshold": HarmBlockThreshold.BLOCK_ONLY_HIGH},
+]
+# The simplified retry only keeps the filter that actually blocks medical text
+RETRY_SAFETY_SETTINGS = SAFETY_SETTINGS[3:]
+
+# Defaults used when a truncated chest-pain analysis lost these sections
+CARDIAC_SALVAGE_DEFAULTS = {
+    'warnings': [
+        "Severe persistent chest pain needs immediate medical evaluation",
+        "Chest pain with breathlessness or sweating is an emergency",
+        "Call 108 for life-threatening symptoms"
+    ],
+    'next_steps': [
+        "Seek emergency medical assessment (ECG, vitals)",
+        "Avoid exertion; remain calm",
+        "Arrange transport to nearest hospital"
+    ],
+}
+
+# Lower value = served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+
+class QuotaExceeded(ProviderUnavailable):
+    """Raised when a Gemini call could not get quota before its deadline"""
+
+
+class UnparseableResponse(Exception):
+    """The model answered, but with no usable analysis in the text (counts against the provider)"""
+
+
+class TokenBucket:
+    """Classic token bucket; not thread-safe on its own (GeminiScheduler holds the lock)"""
+
+    def __init__(self, capacity: int, refill_per_second: float):
+        self.capacity = float(capacity)
+        self.refill_per_second = refill_per_second
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.refill_per_second
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class GeminiScheduler:
+    """Client-side throttle for Gemini: RPM/RPD token buckets, a priority queue and single-flight coalescing.
+
+    Interactive analyses are always granted quota before queued background work
+    (consultation auto-summaries). A caller whose estimated queue wait exceeds
+    its deadline gets QuotaExceeded immediately instead of sleeping, so it can
+    answer from the local fallback.
+
+    The buckets live in this process, so the account-wide limits are split
+    evenly across the `share` worker processes (WEB_CONCURRENCY) serving the app.
+    """
+
+    def __init__(self, rpm: int = GEMINI_RPM, rpd: int = GEMINI_RPD, share: int = GEMINI_QUOTA_SHARE):
+        rpm = max(1.0, rpm / share)
+        rpd = max(1.0, rpd / share)
+        self._minute = TokenBucket(rpm, rpm / 60.0)
+        self._day = TokenBucket(rpd, rpd / 86400.0)
+        self._interval = 60.0 / rpm
+        self._cond = threading.Condition()
+        self._queue = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self.stats = {"granted": 0, "rejected": 0, "coalesced": 0}
+
+    def acquire(self, priority: int, deadline: float):
+        """Block until quota is granted, or raise QuotaExceeded if that would pass `deadline` (monotonic)"""
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = max(self._minute.wait_time(now), self._day.wait_time(now))
+                    position = sum(1 for queued in self._queue if queued < ticket)
+                    if position == 0 and wait == 0:
+                        self._minute.take(now)
+                        self._day.take(now)
+                        self.stats["granted"] += 1
+                        return
+                    # Everyone ahead of us needs a token too
+                    estimated = wait + position * self._interval
+                    if now + estimated > deadline:
+                        self.stats["rejected"] += 1
+                        raise QuotaExceeded(f"Gemini quota wait {estimated:.1f}s exceeds deadline")
+                    self._cond.wait(timeout=max(0.01, min(wait or self._interval, deadline - now)))
+            finally:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+    def coalesce(self, key: str, func, deadline: float):
+        """Single-flight: concurrent calls with the same key share one execution of func()"""
+        with self._inflight_lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = Future()
+                self._inflight[key] = flight
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            try:
+                return copy.deepcopy(flight.result(timeout=max(0.0, deadline - time.monotonic())))
+            except FutureTimeoutError:
+                raise QuotaExceeded("Timed out waiting for an identical in-flight analysis")
+
+        try:
+            result = func()
+            flight.set_result(result)
+            return copy.deepcopy(result)
+        except BaseException as exc:
+            flight.set_exception(exc)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+
+class IncrementalJSONParser:
+    """Streaming parser for the analysis object: emits top-level fields as soon as their value is complete.
+
+    feed() text chunks as they arrive; each call returns the (key, value) pairs
+    completed by that chunk. Anything before the first '{' (such as a ```json
+    fence) is skipped. Scanning resumes where the previous chunk stopped, so the
+    total work over a response is O(n).
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.pos = 0
+        self.started = False
+        self.done = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.expect = 'key'  # key -> colon -> value -> comma -> key ...
+        self.key = None
+        self.token_start = None
+        self.fields: Dict[str, object] = {}
+
+    def _emit(self, raw: str, emitted: List[Tuple[str, object]]):
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = raw
+        self.fields[self.key] = value
+        emitted.append((self.key, value))
+        self.expect = 'comma'
+        self.token_start = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, object]]:
+        self.buffer += chunk
+        buf = self.buffer
+        emitted: List[Tuple[str, object]] = []
+        i = self.pos
+        while i < len(buf) and not self.done:
+            ch = buf[i]
+            if not self.started:
+                if ch == '{':
+                    self.started = True
+                    self.depth = 1
+            elif self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        raw = buf[self.token_start:i + 1]
+                        if self.expect == 'key':
+                            try:
+                                self.key = json.loads(raw)
+                            except ValueError:
+                                self.key = raw.strip('"')
+                            self.expect = 'colon'
+                            self.token_start = None
+                        else:
+                            self._emit(raw, emitted)
+            elif ch == '"':
+                self.in_string = True
+                if self.depth == 1:
+                    self.token_start = i
+            elif ch in '{[':
+                if self.depth == 1:
+                    self.token_start = i
+                self.depth += 1
+            elif ch in '}]':
+                self.depth -= 1
+                if self.depth == 1 and self.token_start is not None:
+                    self._emit(buf[self.token_start:i + 1], emitted)
+                elif self.depth == 0:
+                    if self.expect == 'value' and self.token_start is not None:
+                        self._emit(buf[self.token_start:i].strip(), emitted)
+                    self.done = True
+            elif self.depth == 1:
+                if ch == ':':
+                    self.expect = 'value'
+                elif ch == ',':
+                    if self.expect == 'value' and self.token_start is not None:
+                        self._emit(buf[self.token_start:i].strip(), emitted)
+                    self.expect = 'key'
+                elif not ch.isspace() and self.expect == 'value' and self.token_start is None:
+                    self.token_start = i  # bare scalar: number, true/false/null
+            i += 1
+        self.pos = i
+        return emitted
+
+
+class BlockedLogWriter:
+    """Buffered writer for blocked_ai_logs.
+
+    log() only enqueues, so it never adds latency to an analysis; when the bounded
+    queue is full the row is dropped and counted. A daemon thread drains the queue
+    in batches through a pooled SQLAlchemy engine, so any DATABASE_URL works. app.py
+    hands over its engine and BlockedAILog table via configure(); used standalone,
+    the writer builds its own engine from DATABASE_URL on first flush.
+    """
+
+    def __init__(self, max_queue: int = BLOCKED_LOG_QUEUE_SIZE, batch_size: int = BLOCKED_LOG_BATCH_SIZE, flush_interval: float = BLOCKED_LOG_FLUSH_INTERVAL):
+        self.engine = None
+        self.table = None
+        self.queue: "queue.Queue[Dict]" = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.written = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def configure(self, engine, table):
+        self.engine = engine
+        self.table = table
+
+    def log(self, row: Dict):
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning(f"Blocked AI log queue full, dropped {self.dropped} row(s) so far")
+            return
+        self._ensure_started()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until everything queued so far is written; returns False on timeout"""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _ensure_started(self):
+        # Threads do not survive a fork, so gunicorn workers start their own on first use
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="blocked-log-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            flush_at = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = flush_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+            for _ in batch:
+                self.queue.task_done()
+
+    def _write(self, batch: List[Dict]):
+        try:
+            engine, table = self._resolve()
+            with engine.begin() as conn:
+                conn.execute(table.insert(), batch)
+            self.written += len(batch)
+            logger.info(f"Logged {len(batch)} blocked AI response(s)")
+        except Exception as log_err:
+            logger.error(f"Failed to write {len(batch)} blocked AI log(s): {log_err}")
+
+    def _resolve(self):
+        if self.engine is None or self.table is None:
+            url = os.getenv('DATABASE_URL', 'sqlite:///medicare.db').replace('postgres://', 'postgresql://', 1)
+            metadata = MetaData()
+            self.table = Table(
+                "blocked_ai_logs", metadata,
+                Column("id", Integer, primary_key=True),
+                Column("user_id", Integer, index=True, nullable=True),
+                Column("symptoms", Text, nullable=False),
+                Column("raw_response", Text, nullable=True),
+                Column("reason", String(50), nullable=True),
+                Column("model", String(100), nullable=True),
+                Column("created_at", DateTime, nullable=False),
+            )
+            self.engine = create_engine(url, pool_pre_ping=True, future=True)
+            metadata.create_all(self.engine, checkfirst=True)
+        return self.engine, self.table
+
+
+blocked_log_writer = BlockedLogWriter()
+atexit.register(blocked_log_writer.flush)
+
+# Near-duplicate analysis cache; app.py loads the synonym map from the Symptom table
+semantic_cache = SemanticCache()
+
+
+_MISSING = object()
+
+
+class TolerantJSONParser:
+    """Single-pass, repairing JSON parser for LLM output.
+
+    Reads the first JSON object in the text (skipping markdown fences or prose
+    before it) in one left-to-right pass and repairs what models typically get
+    wrong: output cut off mid-value, trailing or missing commas, unclosed
+    strings, arrays and objects, stray quotes inside strings and unquoted
+    values. Every character is looked at a bounded number of times, so parsing
+    is O(n) however broken the input is.
+
+    parse() returns (data, recovered): recovered lists the top-level fields
+    whose values needed repair, and data is None when there is no object.
+    """
+
+    MAX_DEPTH = 64
+    _LITERALS = {'true': True, 'false': False, 'null': None}
+    _ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f'}
+    _WHITESPACE = ' \t\r\n'
+
+    def __init__(self, text: str):
+        self.text = text
+        self.n = len(text)
+        self.i = 0
+        self.depth = 0
+        self.field = None
+        self.recovered: List[str] = []
+
+    def parse(self) -> Tuple[Optional[Dict], List[str]]:
+        start = self.text.find('{')
+        if start == -1:
+            return None, []
+        self.i = start
+        try:
+            return self._object(top=True), self.recovered
+        except RecursionError:
+            return None, []
+
+    def _repaired(self):
+        if self.field is not None and self.field not in self.recovered:
+            self.recovered.append(self.field)
+
+    def _skip_ws(self):
+        while self.i < self.n and self.text[self.i] in self._WHITESPACE:
+            self.i += 1
+
+    def _value(self):
+        self._skip_ws()
+        if self.i >= self.n:
+            return _MISSING
+        ch = self.text[self.i]
+        if ch in '{[':
+            if self.depth >= self.MAX_DEPTH:
+                raise RecursionError("JSON nested too deeply")
+            self.depth += 1
+            try:
+                return self._object() if ch == '{' else self._array()
+            finally:
+                self.depth -= 1
+        if ch in '"\'':
+            return self._string()
+        return self._scalar()
+
+    def _object(self, top: bool = False) -> Dict:
+        self.i += 1
+        obj = {}
+        while True:
+            self._skip_ws()
+            if self.i >= self.n:
+                self._repaired()  # truncated before the closing brace
+                return obj
+            ch = self.text[self.i]
+            if ch == '}':
+                self.i += 1
+                return obj
+            if ch == ',':
+                self.i += 1  # trailing or doubled comma
+                continue
+            if ch == ']':
+                self.i += 1  # stray bracket
+                self._repaired()
+                continue
+
+            key = self._string() if ch in '"\'' else self._bare_key()
+            if key is None:
+                self.i += 1
+                continue
+            self._skip_ws()
+            if self.i < self.n and self.text[self.i] == ':':
+                self.i += 1
+            if top:
+                self.field = key
+            value = self._value()
+            if value is not _MISSING:
+                obj[key] = value
+            elif self.i < self.n and self.text[self.i] not in ',}':
+                self.i += 1  # unusable character where a value should be
+            if top:
+                self.field = None
+
+    def _array(self) -> List:
+        self.i += 1
+        arr = []
+        while True:
+            self._skip_ws()
+            if self.i >= self.n:
+                self._repaired()
+                return arr
+            ch = self.text[self.i]
+            if ch == ']':
+                self.i += 1
+                return arr
+            if ch == ',':
+                self.i += 1
+                continue
+            if ch == '}':
+                self._repaired()  # array closed by the enclosing object's brace
+                return arr
+            value = self._value()
+            if value is not _MISSING:
+                arr.append(value)
+            elif self.i < self.n:
+                self.i += 1
+
+    def _string(self) -> str:
+        text = self.text
+        quote = text[self.i]
+        self.i += 1
+        parts = []
+        start = self.i
+        unicode_escapes = False
+        while self.i < self.n:
+            ch = text[self.i]
+            if ch == '\\':
+                parts.append(text[start:self.i])
+                esc = text[self.i + 1:self.i + 2]
+                if esc == 'u' and len(text[self.i + 2:self.i + 6]) == 4:
+                    try:
+                        parts.append(chr(int(text[self.i + 2:self.i + 6], 16)))
+                        unicode_escapes = True
+                        self.i += 6
+                    except ValueError:
+                        parts.append(esc)
+                        self.i += 2
+                elif esc:
+                    parts.append(self._ESCAPES.get(esc, esc))
+                    self.i += 2
+                else:
+                    self.i += 1  # dangling backslash at end of input
+                start = self.i
+                continue
+            if ch == quote:
+                # A quote only closes the string if structure follows; otherwise it is
+                # an unescaped quote inside the text. A quote on the next line means a
+                # missing comma. Skipped whitespace is re-read at most once, which keeps
+                # the scan linear.
+                j = self.i + 1
+                newline = False
+                while j < self.n and text[j] in self._WHITESPACE:
+                    newline = newline or text[j] == '\n'
+                    j += 1
+                if j >= self.n or text[j] in ',:}]' or (text[j] in '"\'' and (newline or self._key_at(j))):
+                    parts.append(text[start:self.i])
+                    self.i += 1
+                    return self._join(parts, unicode_escapes)
+                self._repaired()
+            self.i += 1
+        parts.append(text[start:self.i])
+        self._repaired()  # unclosed string at end of input
+        return self._join(parts, unicode_escapes).rstrip()
+
+    def _key_at(self, j: int) -> bool:
+        """True when a quoted key and its colon start at j (a missing comma on the same line)"""
+        quote = self.text[j]
+        end = j + 1
+        while end < self.n and self.text[end] not in (quote, '\n'):
+            end += 1
+        if end >= self.n or self.text[end] != quote:
+            return False
+        end += 1
+        while end < self.n and self.text[end] in ' \t':
+            end += 1
+        return end < self.n and self.text[end] == ':'
+
+    @staticmethod
+    def _join(parts: List[str], unicode_escapes: bool) -> str:
+        value = ''.join(parts)
+        if unicode_escapes:
+            # Recombine surrogate pairs produced by \uD83D\uDE00-style escapes
+            value = value.encode('utf-16', 'surrogatepass').decode('utf-16', 'replace')
+        return value
+
+    def _bare_key(self) -> Optional[str]:
+        start = self.i
+        while self.i < self.n and self.text[self.i] not in ':,{}[]"\n':
+            self.i += 1
+        key = self.text[start:self.i].strip()
+        if not key:
+            return None
+        self._repaired()
+        return key
+
+    def _scalar(self):
+        start = self.i
+        checked = False
+        while self.i < self.n and self.text[self.i] not in ',}]\n':
+            if not checked and self.text[self.i] in '"\'' and self.text[self.i - 1] in ' \t':
+                # A number or literal followed by a quote on the same line is a missing comma
+                checked = True
+                if self._number_or_literal(self.text[start:self.i].strip()):
+                    break
+            self.i += 1
+        word = self.text[start:self.i].strip()
+        if not word:
+            return _MISSING
+        if word in self._LITERALS:
+            return self._LITERALS[word]
+        try:
+            return int(word)
+        except ValueError:
+            pass
+        try:
+            return float(word)
+        except ValueError:
+            pass
+        self._repaired()
+        if self.i >= self.n and any(lit.startswith(word) for lit in self._LITERALS):
+            return _MISSING  # literal cut off mid-word
+        return word  # unquoted text value
+
+    @classmethod
+    def _number_or_literal(cls, word: str) -> bool:
+        if word in cls._LITERALS:
+            return True
+        try:
+            float(word)
+            return True
+        except ValueError:
+            return False
+
+
 class SymptomAnalyzer:
     """AI-powered symptom analyzer using Google Gemini API"""
     
@@ -23,7 +640,9 @@ class SymptomAnalyzer:
         
         if self.api_token:
             try:
-                genai.configure(api_key=self.api_token)
+                # "rest" avoids the gRPC transport, which blocks gevent workers
+                transport = os.getenv("GEMINI_TRANSPORT") or None
+                genai.configure(api_key=self.api_token, transport=transport)
                 
                 # Use Gemini 2.5 Flash - fast, cheap, best for medical analysis
                 self.model = genai.GenerativeModel('models/gemini-2.5-flash')
@@ -34,8 +653,18 @@ class SymptomAnalyzer:
         else:
             self.model = None
             logger.warning("GEMINI_API_KEY not set. Get free key at: https://makersuite.google.com/app/apikey")
+
+        self.scheduler = GeminiScheduler()
+
+        # Preference order; OpenAI only joins when a key is configured
+        providers = [Provider('gemini', self._gemini_provider)]
+        if os.getenv('OPENAI_API_KEY'):
+            providers.append(Provider('openai', self._openai_provider))
+        self.router = LLMRouter(providers)
+        self.batch_executor = ThreadPoolExecutor(max_workers=LLM_BATCH_WORKERS, thread_name_prefix="llm-batch")
+        self.cache = semantic_cache
     
-    def analyze_symptoms(self, symptoms: str, patient_age: Optional[int] = None, patient_gender: Optional[str] = None, user_id: Optional[int] = None) -> Dict:
+    def analyze_symptoms(self, symptoms: str, patient_age: Optional[int] = None, patient_gender: Optional[str] = None, user_id: Optional[int] = None, priority: int = PRIORITY_INTERACTIVE, deadline: Optional[float] = None) -> Dict:
         """
         Analyze patient symptoms and return structured health insights
         
@@ -43,6 +672,9 @@ class SymptomAnalyzer:
             symptoms: Patient's symptom description
             patient_age: Optional patient age for context
             patient_gender: Optional patient gender for context
+            priority: PRIORITY_INTERACTIVE or PRIORITY_BACKGROUND
+            deadline: time.monotonic() value by which the caller needs an answer (usually
+                the HTTP request's deadline); providers get whatever time remains
             
         Returns:
             Dict with keys: severity, summary, recommendations, warnings, next_steps
@@ -53,320 +685,394 @@ class SymptomAnalyzer:
         # Force API usage - no fallback
         if not self.api_token or not self.model:
             raise Exception("GEMINI_API_KEY not configured. Get free key at: https://makersuite.google.com/app/apikey")
-        
+
+        cached = self.cache.lookup(symptoms, patient_age, patient_gender)
+        if cached is not None:
+            return cached
+
+        deadline, queue_deadline = self._deadlines(priority, deadline)
+
+        key = hashlib.sha256(json.dumps([symptoms.strip().lower(), patient_age, patient_gender]).encode('utf-8')).hexdigest()
         try:
-            # Preprocess symptoms to more clinical phrasing (reduces safety blocks)
-            processed_symptoms = self._preprocess_symptoms(symptoms)
-            # Build context-aware prompt using processed symptoms
-            prompt = self._build_prompt(processed_symptoms, patient_age, patient_gender)
-            
-            logger.info(f"Calling Google Gemini API")
-            
-            # Try using list format for safety settings - Gemini API might be version-specific
-            # Use BLOCK_ONLY_HIGH to allow most medical content through
-            safety_settings = [
-                {"category": HarmCategory.HARM_CATEGORY_HARASSMENT, "threshold": HarmBlockThreshold.BLOCK_ONLY_HIGH},
-                {"category": HarmCategory.HARM_CATEGORY_HATE_SPEECH, "threshold": HarmBlockThreshold.BLOCK_ONLY_HIGH},
-                {"category": HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT, "threshold": HarmBlockThreshold.BLOCK_ONLY_HIGH},
-                {"category": HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT, "threshold": HarmBlockThreshold.BLOCK_ONLY_HIGH},
-            ]
-            
-            # Generate content with relaxed safety settings
-            response = self.model.generate_content(
-                prompt,
-                generation_config={
-                    'temperature': 0.7,
-                    'max_output_tokens': 1000,
-                    'top_p': 0.9,
-                    'top_k': 40
-                },
-                safety_settings=safety_settings
+            return self.scheduler.coalesce(
+                key,
+                lambda: self._cache_result(symptoms, patient_age, patient_gender, self._analyze(symptoms, patient_age, patient_gender, user_id, priority, deadline, queue_deadline)),
+                deadline,
             )
-            
-            logger.info(f"Received response from Gemini API")
-            
-            # Log full response for debugging
-            try:
-                logger.info(f"Response candidates: {len(response.candidates) if response.candidates else 0}")
-                if response.candidates:
-                    logger.info(f"Finish reason: {response.candidates[0].finish_reason}")
-                    logger.info(f"Safety ratings: {response.candidates[0].safety_ratings}")
-                logger.info(f"Response parts: {response.parts if hasattr(response, 'parts') else 'No parts'}")
-            except Exception as debug_err:
-                logger.error(f"Debug logging error: {debug_err}")
-            
-            # Check if response was blocked
-            if not response.parts:
-                logger.warning(f"Response blocked by safety filters. Finish reason: {response.candidates[0].finish_reason if response.candidates else 'unknown'}")
-                self._log_blocked(user_id, symptoms, None, "blocked_no_parts")
-                # Automatic single retry with simplified prompt
-                retry_prompt = self._build_prompt(self._simplify_for_retry(symptoms), patient_age, patient_gender, simple=True)
-                try:
-                    retry_response = self.model.generate_content(
-                        retry_prompt,
-                        generation_config={
-                            'temperature': 0.2,
-                            'max_output_tokens': 400,
-                            'top_p': 0.8,
-                            'top_k': 20
-                        },
-                        safety_settings=[
-                            {"category": HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT, "threshold": HarmBlockThreshold.BLOCK_ONLY_HIGH},
-                        ]
-                    )
-                    if retry_response.parts:
-                        text_retry = retry_response.text
-                        parsed_retry = self._parse_llm_response(text_retry, symptoms)
-                        parsed_retry['retried'] = True
-                        return self._enrich_local(symptoms, parsed_retry)
-                except Exception as retry_err:
-                    logger.error(f"Retry failed: {retry_err}")
-                # Attempt OpenAI fallback before returning generic fallback
-                try:
-                    openai_text = self._call_openai(symptoms, simple=True)
-                    if openai_text:
-                        parsed_openai = self._parse_llm_response(openai_text, symptoms)
-                        return self._enrich_local(symptoms, parsed_openai)
-                except Exception as oe:
-                    logger.error(f"OpenAI fallback after retry failed: {oe}")
-
-                return self._enrich_local(symptoms, self._get_fallback_response(symptoms))
-            
-            # Get the text response
+        except QuotaExceeded as quota_err:
+            logger.warning(f"Gemini quota unavailable, answering locally: {quota_err}")
+            fallback = self.local_fallback(symptoms)
+            fallback['rate_limited'] = True
+            return fallback
+
+    def _cache_result(self, symptoms: str, patient_age: Optional[int], patient_gender: Optional[str], analysis: Dict) -> Dict:
+        """Remember complete provider answers; fallbacks and salvaged partial answers are not reused"""
+        if analysis.get('provider') and not analysis.get('recovered_fields') and analysis.get('source') != 'local_fallback':
+            self.cache.store(symptoms, analysis, patient_age, patient_gender)
+        return analysis
+
+    def _deadlines(self, priority: int, deadline: Optional[float]) -> Tuple[float, float]:
+        """(overall deadline, deadline for waiting on Gemini quota), both time.monotonic() values"""
+        now = time.monotonic()
+        budget = LLM_INTERACTIVE_DEADLINE if priority == PRIORITY_INTERACTIVE else LLM_BACKGROUND_DEADLINE
+        if deadline is None:
+            deadline = now + budget + GEMINI_TIMEOUT
+        return deadline, min(deadline, now + budget)
+
+    def _analyze(self, symptoms: str, patient_age: Optional[int], patient_gender: Optional[str], user_id: Optional[int], priority: int, deadline: float, queue_deadline: float) -> Dict:
+        """Provider chain behind analyze_symptoms (runs once per coalesced key)"""
+        request = {
+            'symptoms': symptoms,
+            'patient_age': patient_age,
+            'patient_gender': patient_gender,
+            'user_id': user_id,
+            'priority': priority,
+            'queue_deadline': queue_deadline,
+        }
+        try:
+            provider, analysis = self.router.route(request, deadline)
+        except RoutingFailed as route_err:
+            if any(isinstance(err, QuotaExceeded) for err in route_err.errors.values()):
+                raise QuotaExceeded(str(route_err))
+            logger.warning(f"No LLM provider answered, using local fallback: {route_err}")
+            return self.local_fallback(symptoms)
+
+        analysis = self._enrich_local(symptoms, analysis)
+        analysis['provider'] = provider
+        logger.info(f"Successfully analyzed symptoms via {provider} (length: {len(symptoms)})")
+        return analysis
+
+    def _gemini_provider(self, request: Dict, deadline: float) -> Dict:
+        """Gemini call with one simplified retry when the response is safety-blocked"""
+        symptoms = request['symptoms']
+        patient_age = request['patient_age']
+        patient_gender = request['patient_gender']
+        queue_deadline = min(request['queue_deadline'], deadline)
+
+        # Preprocess symptoms to more clinical phrasing (reduces safety blocks)
+        processed_symptoms = self._preprocess_symptoms(symptoms)
+        # Build context-aware prompt using processed symptoms
+        template, prompt = self._build_prompt(processed_symptoms, patient_age, patient_gender)
+
+        logger.info(f"Calling Google Gemini API ({template.key})")
+
+        # Generate content with relaxed safety settings
+        self.scheduler.acquire(request['priority'], queue_deadline)
+        response = self.model.generate_content(
+            prompt,
+            generation_config=template.generation_config,
+            safety_settings=SAFETY_SETTINGS,
+            request_options={'timeout': self._remaining(deadline)}
+        )
+
+        logger.info(f"Received response from Gemini API")
+
+        # Log full response for debugging
+        try:
+            logger.info(f"Response candidates: {len(response.candidates) if response.candidates else 0}")
+            if response.candidates:
+                logger.info(f"Finish reason: {response.candidates[0].finish_reason}")
+                logger.info(f"Safety ratings: {response.candidates[0].safety_ratings}")
+            logger.info(f"Response parts: {response.parts if hasattr(response, 'parts') else 'No parts'}")
+        except Exception as debug_err:
+            logger.error(f"Debug logging error: {debug_err}")
+
+        if response.parts:
             response_text = response.text
-            
-            # Log the full raw response for debugging
             logger.info(f"Raw Gemini response (full): {response_text}")
-            
-            # Parse JSON response
             analysis = self._parse_llm_response(response_text, symptoms)
-            analysis = self._enrich_local(symptoms, analysis)
-            logger.info(f"Successfully analyzed symptoms (length: {len(symptoms)})")
+            analysis['prompt_template'] = template.key
             return analysis
-            
-        except Exception as e:
-            logger.error(f"Error during symptom analysis: {e}", exc_info=True)
-            raise Exception(f"AI analysis failed: {str(e)}")
-    
-    def _build_prompt(self, symptoms: str, age: Optional[int], gender: Optional[str], simple: bool = False) -> str:
-        """Build a structured prompt for the LLM"""
+
+        # Blocked: automatic single retry with simplified prompt
+        logger.warning(f"Response blocked by safety filters. Finish reason: {response.candidates[0].finish_reason if response.candidates else 'unknown'}")
+        self._log_blocked(request['user_id'], symptoms, None, "blocked_no_parts")
+        retry_template, retry_prompt = self._build_prompt(self._simplify_for_retry(symptoms), patient_age, patient_gender, simple=True)
+        self.scheduler.acquire(request['priority'], queue_deadline)
+        retry_response = self.model.generate_content(
+            retry_prompt,
+            generation_config=retry_template.generation_config,
+            safety_settings=RETRY_SAFETY_SETTINGS,
+            request_options={'timeout': self._remaining(deadline)}
+        )
+        if not retry_response.parts:
+            raise ProviderUnavailable("Gemini blocked the response and the simplified retry")
+        parsed_retry = self._parse_llm_response(retry_response.text, symptoms)
+        parsed_retry['retried'] = True
+        parsed_retry['prompt_template'] = retry_template.key
+        return parsed_retry
+
+    def _openai_provider(self, request: Dict, deadline: float) -> Dict:
+        openai_text = self._call_openai(request['symptoms'], simple=True, timeout=self._remaining(deadline))
+        if not openai_text:
+            raise ProviderUnavailable("OpenAI returned no response")
+        return self._parse_llm_response(openai_text, request['symptoms'])
+
+    @staticmethod
+    def _remaining(deadline: float) -> float:
+        """Network timeout for a provider call: what is left of the deadline, capped at GEMINI_TIMEOUT"""
+        return max(1.0, min(GEMINI_TIMEOUT, deadline - time.monotonic()))
+
+    def analyze_symptoms_stream(self, symptoms: str, patient_age: Optional[int] = None, patient_gender: Optional[str] = None, user_id: Optional[int] = None, priority: int = PRIORITY_INTERACTIVE, deadline: Optional[float] = None) -> Iterator[Tuple[str, object]]:
+        """
+        Streaming variant of analyze_symptoms using Gemini's streamed generation
+
+        Yields:
+            ("field", {"key": ..., "value": ...}) as each top-level JSON field completes
+            (the prompt asks for severity and summary first), then exactly one
+            ("result", analysis) with the same shape analyze_symptoms returns.
+        """
+        if not symptoms or not symptoms.strip():
+            yield ('result', self._get_empty_response())
+            return
+
+        if not self.api_token or not self.model:
+            raise Exception("GEMINI_API_KEY not configured. Get free key at: https://makersuite.google.com/app/apikey")
+
+        cached = self.cache.lookup(symptoms, patient_age, patient_gender)
+        if cached is not None:
+            yield ('result', cached)
+            return
+
+        deadline, queue_deadline = self._deadlines(priority, deadline)
+
+        try:
+            self.scheduler.acquire(priority, queue_deadline)
+        except QuotaExceeded as quota_err:
+            logger.warning(f"Gemini quota unavailable, answering locally: {quota_err}")
+            fallback = self.local_fallback(symptoms)
+            fallback['rate_limited'] = True
+            yield ('result', fallback)
+            return
+
+        template, prompt = self._build_prompt(self._preprocess_symptoms(symptoms), patient_age, patient_gender)
+        parser = IncrementalJSONParser()
+        chunks: List[str] = []
+        try:
+            response = self.model.generate_content(
+                prompt,
+                generation_config=template.generation_config,
+                safety_settings=SAFETY_SETTINGS,
+                stream=True,
+                request_options={'timeout': self._remaining(deadline)}
+            )
+            for chunk in response:
+                if not chunk.parts:
+                    continue
+                chunks.append(chunk.text)
+                for key, value in parser.feed(chunk.text):
+                    if key == 'severity' and isinstance(value, str):
+                        value = value.lower() if value.lower() in ('mild', 'moderate', 'severe') else 'moderate'
+                    yield ('field', {'key': key, 'value': value})
+        except Exception as stream_err:
+            logger.warning(f"Streaming analysis interrupted: {stream_err}")
+
+        response_text = ''.join(chunks)
+        if not response_text:
+            # Blocked before producing any text: use the regular retry/fallback chain
+            yield ('result', self.analyze_symptoms(symptoms, patient_age, patient_gender, user_id, priority, deadline))
+            return
+
+        try:
+            analysis = self._parse_llm_response(response_text, symptoms)
+        except UnparseableResponse:
+            yield ('result', self.local_fallback(symptoms))
+            return
+        analysis['prompt_template'] = template.key
+        analysis['provider'] = 'gemini'
+        analysis = self._enrich_local(symptoms, analysis)
+        yield ('result', self._cache_result(symptoms, patient_age, patient_gender, analysis))
+
+    def analyze_batch(self, cases: Dict[str, Dict], priority: int = PRIORITY_BACKGROUND, deadline: Optional[float] = None) -> Iterator[Tuple[str, Dict]]:
+        """
+        Analyze many distinct cases, yielding (key, analysis) as each one finishes
+
+        Args:
+            cases: key -> {"symptoms": ..., "age": ..., "gender": ...}; callers dedupe first
+
+        Cases are packed LLM_BATCH_PACK_SIZE to a Gemini prompt, so a pack costs one
+        quota token. Any case a packed answer drops or truncates is re-run on its own
+        through analyze_symptoms. Packs and singles run concurrently on the batch
+        pool; cases still unanswered at the deadline get the local fallback.
+        """
+        deadline, queue_deadline = self._deadlines(priority, deadline)
+        keys = []
+        for key, case in cases.items():
+            cached = self.cache.lookup(case['symptoms'], case.get('age'), case.get('gender'))
+            if cached is not None:
+                yield key, cached
+            else:
+                keys.append(key)
+        pending = {}
+
+        def submit_single(key):
+            case = cases[key]
+            future = self.batch_executor.submit(
+                self.analyze_symptoms, case['symptoms'], case.get('age'), case.get('gender'),
+                priority=priority, deadline=deadline
+            )
+            pending[future] = [key]
+
+        for start in range(0, len(keys), LLM_BATCH_PACK_SIZE):
+            pack = keys[start:start + LLM_BATCH_PACK_SIZE]
+            if len(pack) == 1:
+                submit_single(pack[0])
+            else:
+                future = self.batch_executor.submit(self._analyze_pack, {k: cases[k] for k in pack}, priority, deadline, queue_deadline)
+                pending[future] = pack
+
+        while pending:
+            done, _ = wait(list(pending), timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                pack = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as batch_err:
+                    logger.warning(f"Batch analysis of {len(pack)} case(s) failed: {batch_err}")
+                    result = None
+
+                if len(pack) == 1 and isinstance(result, dict) and 'severity' in result:
+                    yield pack[0], result
+                    continue
+                for key in pack:
+                    if isinstance(result, dict) and key in result:
+                        yield key, result[key]
+                    elif len(pack) > 1:
+                        submit_single(key)
+                    else:
+                        yield key, self.local_fallback(cases[key]['symptoms'])
+
+        for pack in pending.values():
+            for key in pack:
+                yield key, self.local_fallback(cases[key]['symptoms'])
+
+    def _analyze_pack(self, pack: Dict[str, Dict], priority: int, deadline: float, queue_deadline: float) -> Dict[str, Dict]:
+        """One Gemini call for several cases; returns analyses for the cases it answered completely"""
+        if not self.model:
+            raise ProviderUnavailable("Gemini not configured")
+        labels = {f"case_{i + 1}": key for i, key in enumerate(pack)}
+        template, prompt = self._build_batch_prompt([(label, pack[key]) for label, key in labels.items()])
+
+        self.scheduler.acquire(priority, min(queue_deadline, deadline))
+        response = self.model.generate_content(
+            prompt,
+            generation_config=self._pack_generation_config(template, len(pack)),
+            safety_settings=SAFETY_SETTINGS,
+            request_options={'timeout': self._remaining(deadline)}
+        )
+        if not response.parts:
+            raise ProviderUnavailable("Gemini blocked the packed prompt")
+
+        data, recovered = TolerantJSONParser(response.text).parse()
+        results = {}
+        for label, key in labels.items():
+            item = (data or {}).get(label)
+            # A repaired (truncated) case is re-run alone rather than served half-finished
+            if isinstance(item, dict) and label not in recovered and 'severity' in item and 'summary' in item:
+                analysis = self._normalize_analysis(item, pack[key]['symptoms'], [], '')
+                analysis = self._enrich_local(pack[key]['symptoms'], analysis)
+                analysis['provider'] = 'gemini'
+                analysis['batched'] = True
+                analysis['prompt_template'] = template.key
+                results[key] = self._cache_result(pack[key]['symptoms'], pack[key].get('age'), pack[key].get('gender'), analysis)
+        logger.info(f"Packed Gemini call answered {len(results)}/{len(pack)} case(s)")
+        return results
+
+    def _build_batch_prompt(self, cases: List[Tuple[str, Dict]]) -> Tuple[PromptTemplate, str]:
+        """Several patient reports in one prompt, answered as one JSON object keyed by case label"""
+        reports = []
+        for label, case in cases:
+            context = self._patient_context(case.get('age'), case.get('gender'))
+            reports.append(f"{label}: {self._preprocess_symptoms(case['symptoms'])} ({context})")
+        labels = ", ".join(label for label, _ in cases)
+        return prompt_registry.render("batch", LLM_OUTPUT_BUDGET, reports="\n".join(reports), labels=labels)
+
+    _pack_configs: Dict[Tuple[str, int], Dict] = {}
+
+    @classmethod
+    def _pack_generation_config(cls, template: PromptTemplate, pack_size: int) -> Dict:
+        """Template config with the output limit scaled to the pack, built once per size"""
+        key = (template.key, pack_size)
+        config = cls._pack_configs.get(key)
+        if config is None:
+            config = dict(template.generation_config)
+            config['max_output_tokens'] = min(8192, template.generation_config['max_output_tokens'] * pack_size)
+            cls._pack_configs[key] = config
+        return config
+
+    def local_fallback(self, symptoms: str) -> Dict:
+        """Keyword-rule analysis used when no provider answers"""
+        fallback = self._enrich_local(symptoms, self._get_fallback_response(symptoms))
+        fallback['source'] = 'local_fallback'
+        return fallback
+
+    @staticmethod
+    def _patient_context(age: Optional[int], gender: Optional[str]) -> str:
         context_parts = []
         if age:
             context_parts.append(f"Age: {age}")
         if gender:
             context_parts.append(f"Gender: {gender}")
-        
-        context_str = ", ".join(context_parts) if context_parts else "No additional context"
-        
-        # Rephrase prompt to avoid safety triggers - use clinical, educational framing
-        if simple:
-            # Short, strict JSON schema to reduce token usage and truncation
-            return (
-                "You are a medical education AI for an Indian telehealth platform. Provide a concise JSON assessment.\n\n"
-                f"Input: {symptoms}\n\n"
-                "Respond ONLY as JSON with this schema:\n{\n  \"severity\": \"mild|moderate|severe\",\n  \"summary\": \"Under 25 words clinical info\",\n  \"recommendations\": [\"Rec 1\",\"Rec 2\"],\n  \"warnings\": [\"Warn 1\"],\n  \"next_steps\": [\"Step 1\"]\n}\nUse Indian context, Celsius, no extra text."
-            )
+        return ", ".join(context_parts) if context_parts else "No additional context"
 
-        prompt = f"""You are a medical education AI providing health information for a telehealth platform in India. 
-
-A patient reports the following for educational consultation purposes:
-Patient Context: {context_str}
-Patient Report: {symptoms}
-
-As a healthcare information system, provide a clinical assessment in JSON format for the medical team to review.
-
-Respond with ONLY valid JSON in this EXACT format:
-
-{{
-  "severity": "mild",
-  "summary": "Clinical assessment in 1-2 sentences",
-  "recommendations": [
-    "Recommendation 1 with specific details",
-    "Recommendation 2 with specific details", 
-    "Recommendation 3 with specific details",
-    "Recommendation 4 with specific details",
-    "Recommendation 5 with specific details",
-    "Recommendation 6 with specific details"
-  ],
-  "warnings": [
-    "Warning sign 1",
-    "Warning sign 2",
-    "Warning sign 3"
-  ],
-  "next_steps": [
-    "Next step 1",
-    "Next step 2",
-    "Next step 3"
-  ]
-}}
-
-Clinical Guidelines:
-- severity: must be "mild", "moderate", or "severe"
-- summary: brief medical assessment under 30 words
-- recommendations: 5-6 specific healthcare recommendations for Indian context
-  * Include common Indian medications when appropriate (Paracetamol/Dolo, antacids, etc.)
-  * Mention home care methods suitable for India (steam, warm water, rest, etc.)
-  * Consider Indian healthcare infrastructure (PHCs, district hospitals, emergency 108)
-- warnings: 3 specific indicators requiring immediate medical attention
-- next_steps: 3 specific actions for the patient to take
-- Use Celsius for temperatures
-- Frame as educational health information, not diagnosis
-- Provide only the JSON, no other text"""
-        
-        return prompt
+    def _build_prompt(self, symptoms: str, age: Optional[int], gender: Optional[str], simple: bool = False) -> Tuple[PromptTemplate, str]:
+        """Render the registered prompt (see prompt_templates) for one patient report"""
+        # Short, strict JSON schema to reduce token usage and truncation on retries
+        if simple:
+            return prompt_registry.render("retry", LLM_OUTPUT_BUDGET, symptoms=symptoms)
+        return prompt_registry.render("analysis", LLM_OUTPUT_BUDGET, symptoms=symptoms, context=self._patient_context(age, gender))
     
     def _parse_llm_response(self, response_text: str, original_symptoms: str) -> Dict:
-        """Parse LLM response into structured format"""
-        try:
-            # Clean the response text
-            response_text = response_text.strip()
-            
-            # Try to extract JSON from response
-            # Handle cases where LLM adds markdown code blocks or extra text
-            if "```json" in response_text:
-                json_start = response_text.find("```json") + 7
-                json_end = response_text.find("```", json_start)
-                if json_end == -1:  # No closing backticks
-                    response_text = response_text[json_start:].strip()
-                else:
-                    response_text = response_text[json_start:json_end].strip()
-            elif "```" in response_text:
-                json_start = response_text.find("```") + 3
-                json_end = response_text.find("```", json_start)
-                if json_end == -1:  # No closing backticks
-                    response_text = response_text[json_start:].strip()
-                else:
-                    response_text = response_text[json_start:json_end].strip()
-            
-            # Find JSON object boundaries
-            if "{" in response_text:
-                json_start = response_text.find("{")
-                # Find the last complete closing brace
-                json_end = response_text.rfind("}")
-                if json_end > json_start:
-                    response_text = response_text[json_start:json_end + 1]
-                else:
-                    # Try to close incomplete JSON by adding missing braces
-                    open_braces = response_text[json_start:].count("{")
-                    close_braces = response_text[json_start:].count("}")
-                    if open_braces > close_braces:
-                        response_text = response_text[json_start:] + ("}" * (open_braces - close_braces))
-                    else:
-                        response_text = response_text[json_start:]
-            
-            # Fix common JSON issues from LLM
-            # Remove trailing commas before closing braces/brackets
-            import re
-            response_text = re.sub(r',(\s*[}\]])', r'\1', response_text)
-            
-            # Try to fix incomplete strings by closing quotes
-            # Count quotes to see if we have unclosed strings
-            quote_count = response_text.count('"')
-            if quote_count % 2 != 0:  # Odd number of quotes = unclosed string
-                # Find last quote and add closing quote before last brace
-                last_brace = response_text.rfind("}")
-                if last_brace > 0:
-                    response_text = response_text[:last_brace] + '"' + response_text[last_brace:]
-            
-            # Parse JSON
-            data = json.loads(response_text)
-            
-            # Validate required fields
-            required_fields = ['severity', 'summary', 'recommendations', 'warnings', 'next_steps']
-            for field in required_fields:
-                if field not in data:
-                    logger.warning(f"Missing field '{field}' in LLM response")
-                    parsed = self._get_fallback_response(original_symptoms)
-                    return parsed
-            
-            # Ensure severity is valid and lowercase
-            if isinstance(data['severity'], str):
-                data['severity'] = data['severity'].lower()
-                if data['severity'] not in ['mild', 'moderate', 'severe']:
-                    data['severity'] = 'moderate'
-            else:
-                data['severity'] = 'moderate'
-            
-            # Ensure lists are actually lists
-            for field in ['recommendations', 'warnings', 'next_steps']:
-                if not isinstance(data[field], list):
-                    data[field] = [str(data[field])]
-            
-            logger.info(f"Successfully parsed Gemini response: severity={data['severity']}")
-            return data
-            
-        except json.JSONDecodeError as e:
-            # Attempt salvage for truncated cardiac/chest pain responses
-            salvage_text = response_text
-            logger.error(f"Failed to parse LLM JSON response: {e}. Attempting salvage logic.")
-            chest_related = any(k in salvage_text.lower() for k in ['chest pain', 'heart paining', 'heart pain'])
+        """Parse LLM response into structured format, repairing truncated or malformed JSON
 
-            try:
-                # If recommendations list opened but not closed, close it
-                if '"recommendations": [' in salvage_text and ']' not in salvage_text.split('"recommendations": [', 1)[1]:
-                    # Insert closing bracket before final brace
-                    last_brace_index = salvage_text.rfind('}')
-                    if last_brace_index != -1:
-                        salvage_text = salvage_text[:last_brace_index] + ']' + salvage_text[last_brace_index:]
-
-                # Ensure required keys exist; if missing add defaults
-                for key in ['warnings', 'next_steps']:
-                    if f'"{key}"' not in salvage_text:
-                        insertion_point = salvage_text.rfind('}')
-                        if insertion_point != -1:
-                            default_block = ''
-                            if key == 'warnings':
-                                default_block = '"warnings": ["Severe persistent chest pain needs immediate medical evaluation","Chest pain with breathlessness or sweating is an emergency","Call 108 for life-threatening symptoms"],'
-                            else:
-                                default_block = '"next_steps": ["Seek emergency medical assessment (ECG, vitals)","Avoid exertion; remain calm","Arrange transport to nearest hospital"],'
-                            salvage_text = salvage_text[:insertion_point] + default_block + salvage_text[insertion_point:]
-
-                # If severity missing but chest related, add severe
-                if '"severity"' not in salvage_text and chest_related:
-                    insertion_point = salvage_text.find('{') + 1
-                    salvage_text = salvage_text[:insertion_point] + '"severity": "severe",' + salvage_text[insertion_point:]
-
-                # If object does not end properly, add closing brace
-                open_braces = salvage_text.count('{')
-                close_braces = salvage_text.count('}')
-                if close_braces < open_braces:
-                    salvage_text += '}' * (open_braces - close_braces)
-
-                # Final trailing comma cleanup
-                salvage_text = re.sub(r',\s*}', '}', salvage_text)
-
-                data = json.loads(salvage_text)
-                logger.info("Salvage successful for truncated LLM response")
-
-                # Normalize fields
-                for field in ['recommendations', 'warnings', 'next_steps']:
-                    if field not in data or not isinstance(data[field], list):
-                        data[field] = []
-                if 'summary' not in data:
-                    data['summary'] = 'Automated salvage of truncated response. Clinical review advised.'
-                if 'severity' not in data:
-                    data['severity'] = 'moderate'
-                else:
-                    data['severity'] = data['severity'].lower()
-                if data['severity'] not in ['mild', 'moderate', 'severe']:
-                    data['severity'] = 'moderate'
-                return data
-            except Exception as salvage_err:
-                logger.error(f"Salvage failed: {salvage_err}")
-                logger.error(f"Original truncated text: {response_text[:800]}")
-                self._log_blocked(None, original_symptoms, response_text, "salvage_failed")
-                # Try OpenAI fallback if available
-                try:
-                    openai_text = self._call_openai(original_symptoms, simple=True)
-                    if openai_text:
-                        parsed = self._parse_llm_response(openai_text, original_symptoms)
-                        return self._enrich_local(original_symptoms, parsed)
-                except Exception as oe:
-                    logger.error(f"OpenAI fallback failed: {oe}")
-                return self._enrich_local(original_symptoms, self._get_fallback_response(original_symptoms))
-        except Exception as e:
-            logger.error(f"Error parsing LLM response: {e}")
-            return self._enrich_local(original_symptoms, self._get_fallback_response(original_symptoms))
+        Raises UnparseableResponse when the text holds no analysis, so the router
+        fails over and nothing is cached.
+        """
+        data, recovered = TolerantJSONParser(response_text or '').parse()
+        if not data or not any(k in data for k in ('severity', 'summary', 'recommendations')):
+            logger.error(f"Unparseable LLM response: {(response_text or '')[:800]}")
+            self._log_blocked(None, original_symptoms, response_text, "unparseable")
+            raise UnparseableResponse("LLM response contained no analysis")
+
+        return self._normalize_analysis(data, original_symptoms, recovered, response_text)
+
+    def _normalize_analysis(self, data: Dict, original_symptoms: str, recovered: List[str], response_text: str) -> Dict:
+        """Validate and default the analysis fields parsed from a model response"""
+        chest_related = any(
+            k in original_symptoms.lower() or k in response_text.lower()
+            for k in ['chest pain', 'heart paining', 'heart pain']
+        )
+
+        missing = [f for f in ('severity', 'summary', 'recommendations', 'warnings', 'next_steps') if f not in data]
+        if missing:
+            logger.warning(f"Missing fields in LLM response, using defaults: {', '.join(missing)}")
+
+        # Ensure severity is valid and lowercase
+        severity = data.get('severity')
+        if isinstance(severity, str) and severity.strip().lower() in ('mild', 'moderate', 'severe'):
+            data['severity'] = severity.strip().lower()
+        else:
+            data['severity'] = 'severe' if severity is None and chest_related else 'moderate'
+
+        if not isinstance(data.get('summary'), str) or not data['summary'].strip():
+            data['summary'] = 'Automated salvage of truncated response. Clinical review advised.'
+
+        # Ensure lists are actually lists
+        for field in ['recommendations', 'warnings', 'next_steps']:
+            value = data.get(field)
+            if value is None:
+                data[field] = list(CARDIAC_SALVAGE_DEFAULTS.get(field, [])) if chest_related else []
+            elif not isinstance(value, list):
+                data[field] = [str(value)]
+
+        if recovered:
+            data['recovered_fields'] = recovered
+            logger.warning(f"Repaired malformed LLM JSON, recovered fields: {', '.join(recovered)}")
+
+        logger.info(f"Successfully parsed Gemini response: severity={data['severity']}")
+        return data
 
     def _preprocess_symptoms(self, symptoms: str) -> str:
         """Rephrase raw user symptom text into more clinical, structured form to reduce safety blocking."""
@@ -403,7 +1109,7 @@ Clinical Guidelines:
         """Return fallback response when LLM is unavailable"""
         # Keyword sets for severity classification
         severe_keywords = [
-            'chest pain', 'heart pain', 'heart is paining', 'severe pain', 'crushing pain',
+            'chest pain', 'chest is paining', 'heart pain', 'heart is paining', 'severe pain', 'crushing pain',
             'difficulty breathing', 'shortness of breath', 'blood', 'unconscious', 'seizure'
         ]
         moderate_keywords = [
@@ -421,7 +1127,7 @@ Clinical Guidelines:
             severity = 'mild'
 
         # Specialized fallback for cardiac/chest pain scenarios (LLM safety blocks these often)
-        cardiac_trigger = any(k in symptoms_lower for k in ['chest pain', 'heart pain', 'heart is paining', 'crushing pain'])
+        cardiac_trigger = any(k in symptoms_lower for k in ['chest pain', 'chest is paining', 'heart pain', 'heart is paining', 'crushing pain'])
         if cardiac_trigger:
             return {
                 "severity": "severe",
@@ -439,6 +1145,7 @@ Clinical Guidelines:
                     "Chest pain with shortness of breath, fainting, or confusion requires immediate hospital care",
                     "Do not drive yourself if pain is severe or causing dizziness—call 108"
                 ],
+                "possible_conditions": ["Possible cardiac event"],
                 "next_steps": [
                     "Call 108 or reach the nearest emergency facility for ECG evaluation",
                     "Get vitals checked (blood pressure, pulse, oxygen saturation) as soon as possible",
@@ -489,13 +1196,13 @@ Clinical Guidelines:
         data['recommendations'] = recs[:8]
         return data
 
-    def _call_openai(self, symptoms: str, simple: bool = False) -> Optional[str]:
-        """Optional OpenAI fallback: invoke ChatCompletion if OPENAI_API_KEY is set.
+    def _call_openai(self, symptoms: str, simple: bool = False, timeout: Optional[float] = None) -> Optional[str]:
+        """Optional OpenAI fallback: one chat completion if OPENAI_API_KEY is set.
         Returns raw text or None on failure.
         """
         try:
             # Import lazily to avoid top-level dependency errors
-            import openai
+            from openai import OpenAI
         except Exception:
             logger.info("OpenAI not available")
             return None
@@ -505,17 +1212,18 @@ Clinical Guidelines:
             logger.info('OPENAI_API_KEY not set')
             return None
 
-        openai.api_key = api_key
         # Build a short prompt similar to our simple JSON schema
-        prompt = self._build_prompt(symptoms, None, None, simple=simple) if hasattr(self, '_build_prompt') else symptoms
+        prompt = self._build_prompt(symptoms, None, None, simple=simple)[1]
         try:
-            resp = openai.ChatCompletion.create(
+            # The router owns retries and the deadline, so the client gets neither
+            client = OpenAI(api_key=api_key, timeout=timeout or GEMINI_TIMEOUT, max_retries=0)
+            resp = client.chat.completions.create(
                 model=os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo'),
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.2,
-                max_tokens=500
+                max_tokens=500,
             )
-            text = resp.choices[0].message['content']
+            text = resp.choices[0].message.content
             logger.info('OpenAI fallback produced a response')
             return text
         except Exception as e:
@@ -523,20 +1231,14 @@ Clinical Guidelines:
             return None
 
     def _log_blocked(self, user_id: Optional[int], symptoms: str, raw_response: Optional[str], reason: str):
-        try:
-            db_url = os.getenv('DATABASE_URL', 'sqlite:///medicare.db')
-            if db_url.startswith('sqlite:///'):
-                path = db_url.replace('sqlite:///','')
-                conn = sqlite3.connect(path)
-                cur = conn.cursor()
-                cur.execute("CREATE TABLE IF NOT EXISTS blocked_ai_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, symptoms TEXT NOT NULL, raw_response TEXT, reason TEXT, model TEXT, created_at TEXT)")
-                cur.execute("INSERT INTO blocked_ai_logs (user_id, symptoms, raw_response, reason, model, created_at) VALUES (?,?,?,?,?,?)",
-                            (user_id, symptoms, raw_response, reason, 'gemini-2.5-flash', datetime.now(timezone.utc).isoformat()))
-                conn.commit()
-                conn.close()
-                logger.info("Blocked AI response logged")
-        except Exception as log_err:
-            logger.error(f"Failed to log blocked AI response: {log_err}")
+        blocked_log_writer.log({
+            'user_id': user_id,
+            'symptoms': symptoms,
+            'raw_response': raw_response,
+            'reason': reason,
+            'model': 'gemini-2.5-flash',
+            'created_at': datetime.now(timezone.utc),
+        })
 
 
 # Global instance
@@ -0,0 +1,144 @@
+"""
+Image and PDF rendering for uploads: document previews and profile photo sizes
+Work runs in a small process pool so decoding multi-megabyte scans and photos
+never competes with request threads for the GIL. Pool processes are started by
+a forkserver (spawn where that is unavailable), never forked from the threaded
+app process, and a pool broken by a crashed worker is replaced on next use. Images are handled by Pillow
+and PDFs by PyMuPDF (first page only); both are optional, and a file type
+whose library is missing is simply served as uploaded.
+"""
+
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    logger.warning("Pillow not installed; image thumbnails disabled. Run: pip install Pillow")
+
+try:
+    import pymupdf
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    PYMUPDF_AVAILABLE = False
+    logger.warning("PyMuPDF not installed; PDF previews disabled. Run: pip install PyMuPDF")
+
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", "2"))
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "320"))  # longest edge, pixels
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "70"))
+MEDIA_TIMEOUT = float(os.getenv("MEDIA_TIMEOUT", "60"))  # seconds a render may take, including queueing
+PROFILE_PHOTO_SIZES = (64, 256, 1024)  # one photo_url_<size> column each on users and doctors
+PROFILE_PHOTO_QUALITY = int(os.getenv("PROFILE_PHOTO_QUALITY", "80"))
+
+IMAGE_TYPES = {"image/jpeg", "image/jpg", "image/png", "image/webp"}
+PDF_TYPES = {"application/pdf"}
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def can_preview(content_type: Optional[str]) -> bool:
+    if content_type in IMAGE_TYPES:
+        return PIL_AVAILABLE
+    if content_type in PDF_TYPES:
+        return PYMUPDF_AVAILABLE
+    return False
+
+
+def _encode(image, size: int, quality: int) -> bytes:
+    image = ImageOps.exif_transpose(image)  # phone photos carry their rotation in EXIF
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    image.thumbnail((size, size), Image.LANCZOS)
+    out = io.BytesIO()
+    image.save(out, "WEBP", quality=quality, method=4)
+    return out.getvalue()
+
+
+def render_thumbnail(data: bytes, content_type: str, size: int = THUMBNAIL_SIZE, quality: int = THUMBNAIL_QUALITY) -> Optional[Tuple[bytes, str]]:
+    """(thumbnail bytes, content type) for an image or a PDF's first page; runs in a pool process"""
+    if content_type in PDF_TYPES and PYMUPDF_AVAILABLE:
+        with pymupdf.open(stream=data, filetype="pdf") as pdf:
+            if pdf.page_count == 0:
+                return None
+            page = pdf[0]
+            zoom = size / max(page.rect.width, page.rect.height)
+            pixmap = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+            if not PIL_AVAILABLE:
+                return pixmap.tobytes("png"), "image/png"
+            image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+            return _encode(image, size, quality), "image/webp"
+    if content_type in IMAGE_TYPES and PIL_AVAILABLE:
+        with Image.open(io.BytesIO(data)) as image:
+            image.draft("RGB", (size, size))  # JPEG decodes at reduced scale directly
+            return _encode(image, size, quality), "image/webp"
+    return None
+
+
+def render_profile_variants(data: bytes, sizes=PROFILE_PHOTO_SIZES, quality: int = PROFILE_PHOTO_QUALITY) -> Dict[int, bytes]:
+    """{size: WebP bytes} fitting each size's square, never upscaled; runs in a pool process"""
+    if not PIL_AVAILABLE:
+        return {}
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft("RGB", (max(sizes), max(sizes)))
+        image.load()
+        return {size: _encode(image.copy(), size, quality) for size in sorted(sizes, reverse=True)}
+
+
+def media_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Forking a process that holds threads, locks and DB connections is unsafe
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload([__name__])
+            else:
+                context = multiprocessing.get_context("spawn")
+            _pool = ProcessPoolExecutor(max_workers=MEDIA_WORKERS, mp_context=context)
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_media(fn, *args, timeout: float = MEDIA_TIMEOUT):
+    """fn(*args) in the media pool; a broken pool (a worker killed mid-render) is rebuilt"""
+    pool = media_pool()
+    try:
+        future = pool.submit(fn, *args)
+    except BrokenProcessPool:
+        # Broken by an earlier job: this one never ran, so it gets a fresh pool
+        _discard_pool(pool)
+        pool = media_pool()
+        future = pool.submit(fn, *args)
+    try:
+        return future.result(timeout=timeout)
+    except BrokenProcessPool:
+        # Possibly broken by this very input (a decompression bomb), so no retry
+        _discard_pool(pool)
+        raise
+
+
+def profile_variant_path(file_path: str, size: int) -> str:
+    return f"{file_path}.{size}.webp"
+
+
+def thumbnail_path(file_path: str) -> str:
+    """Storage path of a document's thumbnail, next to the original (its content type is set on upload)"""
+    return f"{file_path}.thumb"
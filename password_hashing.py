@@ -0,0 +1,129 @@
+"""
+Password hashing off the request threads
+bcrypt runs on a small dedicated thread pool (bcrypt releases the GIL while it
+works) behind a bounded queue, so a login storm occupies at most
+PASSWORD_HASH_WORKERS cores and excess attempts fail fast with
+PasswordHashingBusy instead of tying up every request thread. The work factor
+is calibrated once at startup (in the gunicorn master, which hands it to every
+worker through PASSWORD_HASH_COST) to take about PASSWORD_HASH_TARGET_MS, never
+below PASSWORD_HASH_MIN_COST; hashes stored with a lower cost are upgraded on
+the next login, and hashes with a higher cost are left alone.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "32"))  # waiting hashes beyond the running ones
+PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "10"))  # seconds a hash may take, including queueing
+PASSWORD_HASH_TARGET_MS = float(os.getenv("PASSWORD_HASH_TARGET_MS", "250"))
+PASSWORD_HASH_MIN_COST = int(os.getenv("PASSWORD_HASH_MIN_COST", "12"))
+PASSWORD_HASH_MAX_COST = int(os.getenv("PASSWORD_HASH_MAX_COST", "14"))
+PASSWORD_HASH_COST = os.getenv("PASSWORD_HASH_COST", "")  # fixed cost, skips calibration
+
+DEFAULT_COST = 12  # bcrypt.gensalt() default, used until calibrate() runs
+_COST = re.compile(r"^\$2[abxy]?\$(\d\d)\$")
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when the hashing queue is full; callers should answer 503"""
+
+
+def hash_cost(hashed: str) -> Optional[int]:
+    match = _COST.match(hashed or "")
+    return int(match.group(1)) if match else None
+
+
+class PasswordHasher:
+    """bcrypt hash/verify on a bounded pool with a machine-calibrated work factor"""
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, queue_size: int = PASSWORD_HASH_QUEUE, timeout: float = PASSWORD_HASH_TIMEOUT):
+        self.cost = int(PASSWORD_HASH_COST) if PASSWORD_HASH_COST else DEFAULT_COST
+        self.timeout = timeout
+        self._workers = workers
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.stats = {"hashes": 0, "verifies": 0, "rejected": 0, "rehashes": 0}
+
+    def calibrate(self, target_ms: float = PASSWORD_HASH_TARGET_MS) -> int:
+        """Pick the highest cost whose hash takes at most target_ms here (each step doubles the time)
+
+        The result is exported as PASSWORD_HASH_COST, so processes forked or
+        started afterwards (gunicorn workers) reuse it instead of measuring again.
+        """
+        pinned = os.getenv("PASSWORD_HASH_COST")
+        if pinned:
+            self.cost = int(pinned)
+            return self.cost
+        base = PASSWORD_HASH_MIN_COST
+        salt = bcrypt.gensalt(base)
+        best = float("inf")
+        for _ in range(3):
+            started = time.perf_counter()
+            bcrypt.hashpw(b"calibration", salt)
+            best = min(best, (time.perf_counter() - started) * 1000)
+        cost = base
+        while cost < PASSWORD_HASH_MAX_COST and best * 2 ** (cost + 1 - base) <= target_ms:
+            cost += 1
+        self.cost = cost
+        os.environ["PASSWORD_HASH_COST"] = str(cost)
+        logger.info(f"Password hashing calibrated: cost {cost} (~{best * 2 ** (cost - base):.0f}ms, target {target_ms:.0f}ms)")
+        return cost
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.record("rejected")
+            raise PasswordHashingBusy("Password hashing queue is full")
+        try:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="medicare-bcrypt")
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot belongs to the job, not the caller: a job the caller gave up on
+        # still occupies the pool until it finishes or is cancelled
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()  # only succeeds while the job is still queued
+            self.record("rejected")
+            raise PasswordHashingBusy(f"Password hashing took longer than {self.timeout}s")
+
+    def record(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def hash(self, password: str) -> str:
+        self.record("hashes")
+        salt = bcrypt.gensalt(self.cost)
+        return self._run(bcrypt.hashpw, password.encode("utf-8"), salt).decode("utf-8")
+
+    def verify(self, password: str, hashed: str) -> bool:
+        self.record("verifies")
+        return self._run(bcrypt.checkpw, password.encode("utf-8"), hashed.encode("utf-8"))
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """Only ever upgrade: a faster machine or worker must not weaken stored hashes"""
+        return (hash_cost(hashed) or 0) < self.cost
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["cost"] = self.cost
+        return stats
+
+
+password_hasher = PasswordHasher()
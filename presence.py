@@ -0,0 +1,126 @@
+"""
+Consultation presence shared across workers
+Who is currently viewing which consultation, kept in a database table so every
+gunicorn worker sees the same answer. A heartbeat is one primary-key upsert,
+entries expire after PRESENCE_TTL seconds without one, and a background
+sweeper deletes expired rows so the table stays the size of the live audience.
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import Table, and_, delete, insert, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_TTL = float(os.getenv("PRESENCE_TTL", "30"))  # seconds a heartbeat keeps a viewer present
+PRESENCE_SWEEP_INTERVAL = float(os.getenv("PRESENCE_SWEEP_INTERVAL", "60"))  # seconds, 0 disables
+
+
+def viewer_key(role: str, viewer_id: int) -> str:
+    return f"{role}_{viewer_id}"
+
+
+class PresenceService:
+    """Heartbeat-based presence over a (consultation_id, viewer_key, last_seen) table"""
+
+    def __init__(self, ttl: float = PRESENCE_TTL, sweep_interval: float = PRESENCE_SWEEP_INTERVAL):
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.engine: Optional[Engine] = None
+        self.table: Optional[Table] = None
+        self._upsert = None
+        self._sweeper: Optional[threading.Timer] = None
+
+    def configure(self, engine: Engine, table: Table):
+        self.engine = engine
+        self.table = table
+        # Native upsert where the dialect has one; otherwise update-then-insert
+        if engine.dialect.name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        elif engine.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            dialect_insert = None
+        if dialect_insert is not None:
+            stmt = dialect_insert(table)
+            self._upsert = stmt.on_conflict_do_update(
+                index_elements=[table.c.consultation_id, table.c.viewer_key],
+                set_={"last_seen": stmt.excluded.last_seen},
+            )
+
+    def heartbeat(self, consultation_id: int, key: str):
+        now = datetime.now()
+        row = {"consultation_id": consultation_id, "viewer_key": key, "last_seen": now}
+        with self.engine.begin() as conn:
+            if self._upsert is not None:
+                conn.execute(self._upsert, row)
+                return
+            refreshed = conn.execute(
+                update(self.table)
+                .where(and_(self.table.c.consultation_id == consultation_id, self.table.c.viewer_key == key))
+                .values(last_seen=now)
+            ).rowcount
+            if not refreshed:
+                try:
+                    with conn.begin_nested():
+                        conn.execute(insert(self.table), row)
+                except IntegrityError:
+                    pass  # another worker inserted the same heartbeat first
+
+    def viewers(self, consultation_id: int) -> Dict[str, datetime]:
+        """{viewer_key: last_seen} for viewers whose heartbeat has not expired"""
+        cutoff = datetime.now() - timedelta(seconds=self.ttl)
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(self.table.c.viewer_key, self.table.c.last_seen).where(and_(
+                    self.table.c.consultation_id == consultation_id,
+                    self.table.c.last_seen > cutoff,
+                ))
+            ).all()
+        return {key: last_seen for key, last_seen in rows}
+
+    def is_viewing(self, consultation_id: int, key: str) -> bool:
+        cutoff = datetime.now() - timedelta(seconds=self.ttl)
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(self.table.c.last_seen).where(and_(
+                    self.table.c.consultation_id == consultation_id,
+                    self.table.c.viewer_key == key,
+                    self.table.c.last_seen > cutoff,
+                ))
+            ).first() is not None
+
+    def sweep(self) -> int:
+        """Delete expired heartbeats; returns how many were removed"""
+        cutoff = datetime.now() - timedelta(seconds=self.ttl)
+        with self.engine.begin() as conn:
+            return conn.execute(delete(self.table).where(self.table.c.last_seen <= cutoff)).rowcount
+
+    def start_sweeper(self):
+        """Sweep every sweep_interval seconds on a daemon timer (every worker may run one)"""
+        if self.sweep_interval <= 0 or self._sweeper is not None:
+            return
+
+        def _tick():
+            try:
+                removed = self.sweep()
+                if removed:
+                    logger.debug(f"Presence sweep removed {removed} expired viewer(s)")
+            except Exception as exc:
+                logger.warning(f"Presence sweep failed: {exc}")
+            self._sweeper = threading.Timer(self.sweep_interval, _tick)
+            self._sweeper.daemon = True
+            self._sweeper.start()
+
+        self._sweeper = threading.Timer(self.sweep_interval, _tick)
+        self._sweeper.daemon = True
+        self._sweeper.start()
+
+
+presence = PresenceService()
@@ -0,0 +1,188 @@
+"""
+Prompt template registry for the symptom analyzer
+Templates are compiled once into literal chunks and slots, carry their own
+generation config and a token estimate, and are versioned so analyses can be
+traced back to the exact prompt that produced them.
+"""
+
+import math
+import os
+import threading
+from string import Formatter
+from typing import Dict, List, Optional, Tuple
+
+# Gemini averages roughly four characters per token for English prompts
+CHARS_PER_TOKEN = 4
+
+# Pin a family to one variant (e.g. "analysis=full") instead of size-based selection
+PROMPT_VARIANT_PINS = dict(
+    pin.split("=", 1) for pin in os.getenv("LLM_PROMPT_VARIANTS", "").split(",") if "=" in pin
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class PromptTemplate:
+    """A compiled prompt: literal chunks interleaved with named slots"""
+
+    def __init__(self, family: str, variant: str, version: int, text: str, generation_config: Dict, expected_output_tokens: int):
+        self.family = family
+        self.variant = variant
+        self.version = version
+        self.key = f"{family}-{variant}@v{version}"
+        self.generation_config = generation_config
+        self.expected_output_tokens = expected_output_tokens
+
+        # Compile once: str.format re-parses the whole template on every call
+        self._parts: List[Tuple[str, Optional[str]]] = [
+            (literal, field) for literal, field, _, _ in Formatter().parse(text)
+        ]
+        self.fields = [field for _, field in self._parts if field]
+        self.static_tokens = estimate_tokens("".join(literal for literal, _ in self._parts))
+
+    def render(self, **values) -> str:
+        out = []
+        for literal, field in self._parts:
+            out.append(literal)
+            if field:
+                out.append(str(values[field]))
+        return "".join(out)
+
+
+class PromptRegistry:
+    """Versioned templates grouped by family, with per-template usage statistics"""
+
+    def __init__(self):
+        self._templates: Dict[str, Dict[str, PromptTemplate]] = {}
+        self._lock = threading.Lock()
+        self.hits: Dict[str, int] = {}
+        self.prompt_tokens: Dict[str, int] = {}
+
+    def register(self, template: PromptTemplate) -> PromptTemplate:
+        variants = self._templates.setdefault(template.family, {})
+        current = variants.get(template.variant)
+        if current is None or template.version >= current.version:
+            variants[template.variant] = template
+        return template
+
+    def get(self, family: str, variant: str) -> PromptTemplate:
+        return self._templates[family][variant]
+
+    def select(self, family: str, output_budget: int) -> PromptTemplate:
+        """Shortest variant of `family` whose expected output fits in `output_budget` tokens"""
+        variants = self._templates[family]
+        pinned = PROMPT_VARIANT_PINS.get(family)
+        if pinned in variants:
+            return variants[pinned]
+        fitting = [t for t in variants.values() if t.expected_output_tokens <= output_budget]
+        if fitting:
+            return min(fitting, key=lambda t: t.static_tokens)
+        return min(variants.values(), key=lambda t: t.expected_output_tokens)
+
+    def render(self, family: str, output_budget: int, **values) -> Tuple[PromptTemplate, str]:
+        template = self.select(family, output_budget)
+        prompt = template.render(**values)
+        with self._lock:
+            self.hits[template.key] = self.hits.get(template.key, 0) + 1
+            self.prompt_tokens[template.key] = self.prompt_tokens.get(template.key, 0) + estimate_tokens(prompt)
+        return template, prompt
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                key: {
+                    "hits": hits,
+                    "avg_prompt_tokens": round(self.prompt_tokens[key] / hits, 1),
+                }
+                for key, hits in self.hits.items()
+            }
+
+    def templates(self) -> List[PromptTemplate]:
+        return [t for variants in self._templates.values() for t in variants.values()]
+
+
+ANALYSIS_CONFIG = {'temperature': 0.7, 'max_output_tokens': 1000, 'top_p': 0.9, 'top_k': 40}
+RETRY_CONFIG = {'temperature': 0.2, 'max_output_tokens': 400, 'top_p': 0.8, 'top_k': 20}
+BATCH_CONFIG = {'temperature': 0.4, 'max_output_tokens': 700, 'top_p': 0.9, 'top_k': 40}  # per case
+
+registry = PromptRegistry()
+
+registry.register(PromptTemplate("analysis", "full", 1, """You are a medical education AI providing health information for a telehealth platform in India.
+
+A patient reports the following for educational consultation purposes:
+Patient Context: {context}
+Patient Report: {symptoms}
+
+As a healthcare information system, provide a clinical assessment in JSON format for the medical team to review.
+
+Respond with ONLY valid JSON in this EXACT format:
+
+{{
+  "severity": "mild",
+  "summary": "Clinical assessment in 1-2 sentences",
+  "recommendations": [
+    "Recommendation 1 with specific details",
+    "Recommendation 2 with specific details",
+    "Recommendation 3 with specific details",
+    "Recommendation 4 with specific details",
+    "Recommendation 5 with specific details",
+    "Recommendation 6 with specific details"
+  ],
+  "warnings": [
+    "Warning sign 1",
+    "Warning sign 2",
+    "Warning sign 3"
+  ],
+  "next_steps": [
+    "Next step 1",
+    "Next step 2",
+    "Next step 3"
+  ]
+}}
+
+Clinical Guidelines:
+- severity: must be "mild", "moderate", or "severe"
+- summary: brief medical assessment under 30 words
+- recommendations: 5-6 specific healthcare recommendations for Indian context
+  * Include common Indian medications when appropriate (Paracetamol/Dolo, antacids, etc.)
+  * Mention home care methods suitable for India (steam, warm water, rest, etc.)
+  * Consider Indian healthcare infrastructure (PHCs, district hospitals, emergency 108)
+- warnings: 3 specific indicators requiring immediate medical attention
+- next_steps: 3 specific actions for the patient to take
+- Use Celsius for temperatures
+- Frame as educational health information, not diagnosis
+- Provide only the JSON, no other text""", ANALYSIS_CONFIG, expected_output_tokens=650))
+
+registry.register(PromptTemplate("analysis", "compact", 1, (
+    "You are a medical education AI for a telehealth platform in India. "
+    "Educational assessment for the medical team, not a diagnosis.\n"
+    "Patient Context: {context}\nPatient Report: {symptoms}\n\n"
+    "Respond with ONLY JSON, keys in this order:\n"
+    '{{"severity": "mild|moderate|severe", "summary": "under 30 words", '
+    '"recommendations": ["5-6 specific items"], "warnings": ["3 red flags needing urgent care"], '
+    '"next_steps": ["3 actions"]}}\n'
+    "Recommendations: Indian context - common medicines (Paracetamol/Dolo, antacids), home care "
+    "(steam, warm water, rest), PHCs/district hospitals, emergency 108. Use Celsius."
+), ANALYSIS_CONFIG, expected_output_tokens=600))
+
+registry.register(PromptTemplate("retry", "simple", 1, (
+    "You are a medical education AI for an Indian telehealth platform. Provide a concise JSON assessment.\n\n"
+    "Input: {symptoms}\n\n"
+    "Respond ONLY as JSON with this schema:\n{{\n  \"severity\": \"mild|moderate|severe\",\n"
+    "  \"summary\": \"Under 25 words clinical info\",\n  \"recommendations\": [\"Rec 1\",\"Rec 2\"],\n"
+    "  \"warnings\": [\"Warn 1\"],\n  \"next_steps\": [\"Step 1\"]\n}}\nUse Indian context, Celsius, no extra text."
+), RETRY_CONFIG, expected_output_tokens=250))
+
+registry.register(PromptTemplate("batch", "compact", 1, (
+    "You are a medical education AI providing health information for a telehealth platform in India.\n\n"
+    "Several patients report the following for educational consultation purposes:\n"
+    "{reports}\n\n"
+    "Respond with ONLY valid JSON: one object whose keys are the case labels ({labels}), each value in this format:\n"
+    '{{"severity": "mild|moderate|severe", "summary": "under 30 words", '
+    '"recommendations": ["4-5 specific items for Indian context"], '
+    '"warnings": ["3 red flags"], "next_steps": ["3 actions"]}}\n'
+    "Use Celsius, common Indian medications where appropriate, and emergency number 108. "
+    "Frame as educational health information, not diagnosis. No text outside the JSON."
+), BATCH_CONFIG, expected_output_tokens=500))
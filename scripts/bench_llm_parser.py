@@ -0,0 +1,182 @@
+"""
+LLM response parser benchmark and fuzz suite
+Runs TolerantJSONParser over the raw Gemini responses stored in
+blocked_ai_logs.raw_response (plus a few synthetic samples so the script is
+useful on a fresh database), then:
+
+  bench  - parse throughput per sample and a size-scaling check (time per byte
+           should stay flat as inputs grow if parsing is linear)
+  fuzz   - truncates and mutates every sample and checks the parser never
+           raises, well-formed samples round-trip exactly like json.loads, and
+           fields that were complete before a truncation point come back intact
+
+Usage: python scripts/bench_llm_parser.py [--db medicare.db] [--mode bench|fuzz|all] [--iterations 200] [--seed 1]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path to import from llm_service
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from llm_service import TolerantJSONParser
+
+SYNTHETIC = [
+    {
+        "severity": "moderate",
+        "summary": "Symptoms are consistent with a viral upper respiratory infection.",
+        "recommendations": [
+            "Rest and drink plenty of fluids",
+            "Use Paracetamol 500 mg every 6 hours if fever exceeds 38.5°C",
+            "Gargle with warm salt water for a sore throat",
+        ],
+        "warnings": ["Breathing difficulty", "Fever above 39.5°C for more than 3 days"],
+        "next_steps": ["Consult a general physician if symptoms persist beyond 5 days"],
+        "possible_conditions": ["Common cold", "Influenza"],
+    },
+    {
+        "severity": "severe",
+        "summary": "Possible cardiac chest pain — \"pressure-like\" discomfort radiating to the arm.",
+        "recommendations": ["Stop exertion immediately", "Call 108"],
+        "warnings": ["Sweating with chest pain is an emergency"],
+        "next_steps": ["ECG at the nearest emergency department"],
+    },
+]
+
+
+def load_corpus(db_path):
+    """Raw responses from blocked_ai_logs, followed by the synthetic samples"""
+    corpus = []
+    if db_path and os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = conn.execute(
+                "SELECT raw_response FROM blocked_ai_logs WHERE raw_response IS NOT NULL AND raw_response != ''"
+            ).fetchall()
+            corpus.extend(row[0] for row in rows)
+        except sqlite3.OperationalError:
+            pass  # table not created yet
+        finally:
+            conn.close()
+    stored = len(corpus)
+    for sample in SYNTHETIC:
+        corpus.append(json.dumps(sample, indent=2))
+        corpus.append("```json\n" + json.dumps(sample, indent=2, ensure_ascii=False) + "\n```")
+    return corpus, stored
+
+
+def time_parse(text, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        TolerantJSONParser(text).parse()
+    return (time.perf_counter() - started) / repeat
+
+
+def bench(corpus, iterations):
+    print("\n" + "=" * 70)
+    print(f"PARSE THROUGHPUT ({len(corpus)} samples, {iterations} iterations each)")
+    print("=" * 70)
+    total_bytes = sum(len(text) for text in corpus)
+    elapsed = sum(time_parse(text, iterations) for text in corpus)
+    print(f"corpus: {total_bytes} chars, {elapsed * 1000:.3f}ms per full pass, "
+          f"{total_bytes / elapsed / 1e6:.2f}M chars/s")
+
+    print("\n" + "=" * 70)
+    print("SIZE SCALING (truncated long response)")
+    print("=" * 70)
+    base = json.dumps({**SYNTHETIC[0], "recommendations": SYNTHETIC[0]["recommendations"] * 1000})
+    for size in (2_000, 8_000, 32_000, 128_000):
+        text = base[:size]  # truncated: exercises the repair path at every size
+        per_call = time_parse(text, max(1, iterations // 20))
+        print(f"{len(text):8} chars  {per_call * 1000:8.3f}ms  {per_call / len(text) * 1e9:7.1f}ns/char")
+
+
+def mutate(text, rng):
+    pos = rng.randrange(len(text) + 1)
+    choice = rng.randrange(5)
+    if choice == 0:
+        return text[:pos]  # truncation
+    if choice == 1:
+        return text[:pos] + text[pos + 1:]  # dropped character
+    if choice == 2:
+        return text[:pos] + rng.choice(',"}]{[:\\') + text[pos:]  # stray structural char
+    if choice == 3:
+        return text.replace('"', '', 1 + rng.randrange(3))  # missing quotes
+    return text[:pos] + text[pos:pos + 50] * 2 + text[pos + 50:]  # repeated chunk
+
+
+def fuzz(corpus, iterations, seed):
+    print("\n" + "=" * 70)
+    print(f"FUZZ ({len(corpus)} samples x {iterations} mutations, seed={seed})")
+    print("=" * 70)
+    rng = random.Random(seed)
+    failures = []
+    cases = 0
+
+    for text in corpus:
+        # Well-formed samples must round-trip exactly
+        try:
+            expected = json.loads(text)
+        except ValueError:
+            expected = None
+        if isinstance(expected, dict):
+            data, recovered = TolerantJSONParser(text).parse()
+            cases += 1
+            if data != expected or recovered:
+                failures.append(("roundtrip", text[:80]))
+
+            # Fields that were complete before the cut must survive truncation unchanged
+            for _ in range(iterations // 4):
+                cut = rng.randrange(len(text))
+                data, _ = TolerantJSONParser(text[:cut]).parse()
+                cases += 1
+                for key, value in (data or {}).items():
+                    closed = text.find(json.dumps(key)) != -1 and text.find(json.dumps(value), 0, cut) != -1
+                    if closed and key in expected and expected[key] != value:
+                        failures.append(("truncation", f"{key!r} at {cut}"))
+
+        # Arbitrary mutations must never raise
+        for _ in range(iterations):
+            mutated = mutate(text, rng)
+            cases += 1
+            try:
+                data, recovered = TolerantJSONParser(mutated).parse()
+                assert data is None or isinstance(data, dict)
+                assert all(isinstance(field, str) for field in recovered)
+            except Exception as exc:
+                failures.append(("exception", f"{type(exc).__name__}: {exc} on {mutated[:60]!r}"))
+
+    print(f"cases={cases}  failures={len(failures)}")
+    for kind, detail in failures[:20]:
+        print(f"  [{kind}] {detail}")
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    default_db = os.getenv("DATABASE_URL", "sqlite:///medicare.db").replace("sqlite:///", "")
+    parser.add_argument("--db", default=default_db, help="SQLite database with blocked_ai_logs")
+    parser.add_argument("--mode", choices=("bench", "fuzz", "all"), default="all")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    corpus, stored = load_corpus(args.db)
+    print(f"\nCorpus: {stored} stored responses from {args.db}, {len(corpus) - stored} synthetic")
+
+    ok = True
+    if args.mode in ("bench", "all"):
+        bench(corpus, args.iterations)
+    if args.mode in ("fuzz", "all"):
+        ok = fuzz(corpus, args.iterations, args.seed)
+    print()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+LLM router benchmark - sequential fallback chain vs hedged router
+Drives llm_router.LLMRouter with local stub providers (no network, no API
+keys) and compares end-to-end latency with the old strictly sequential chain
+(primary, then secondary only after the primary has failed or timed out).
+
+Scenarios:
+  healthy     - primary usually fast with a slow tail
+  flaky       - primary fails a share of calls outright
+  outage      - primary times out on every call (circuit breaker should open)
+
+Usage: python scripts/bench_llm_router.py [--requests 200] [--concurrency 8] [--scale 0.01]
+       --scale multiplies all stub latencies (1.0 = real seconds)
+"""
+import argparse
+import logging
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add parent directory to path to import llm_router
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from llm_router import CircuitBreaker, LLMRouter, Provider, RoutingFailed
+
+SCENARIOS = {
+    # name: (primary latency s, primary slow-tail share, slow latency s, primary failure share)
+    "healthy": (2.0, 0.10, 12.0, 0.00),
+    "flaky": (2.0, 0.05, 12.0, 0.30),
+    "outage": (30.0, 1.00, 30.0, 0.00),
+}
+SECONDARY_LATENCY = 3.0
+HISTORICAL_P95 = 4.0  # hedge delay each provider starts with before it has samples
+DEADLINE = 20.0
+
+
+class StubProvider:
+    """Sleeps like a remote LLM; raises on simulated failures or when past the deadline"""
+
+    def __init__(self, name, latency, slow_share, slow_latency, failure_share, scale, seed):
+        self.name = name
+        self.latency = latency * scale
+        self.slow_share = slow_share
+        self.slow_latency = slow_latency * scale
+        self.failure_share = failure_share
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def __call__(self, request, deadline):
+        with self.lock:
+            slow = self.rng.random() < self.slow_share
+            failed = self.rng.random() < self.failure_share
+            jitter = self.rng.uniform(0.8, 1.2)
+        delay = (self.slow_latency if slow else self.latency) * jitter
+        if failed:
+            time.sleep(delay * 0.2)
+            raise RuntimeError(f"{self.name}: simulated 500")
+        # Providers honour the propagated deadline as their network timeout
+        remaining = deadline - time.monotonic()
+        if delay > remaining:
+            time.sleep(max(0.0, remaining))
+            raise TimeoutError(f"{self.name}: timed out")
+        time.sleep(delay)
+        return {"severity": "mild", "summary": f"answer from {self.name}"}
+
+
+def sequential(primary, secondary, request, deadline):
+    """The previous behaviour: try each provider in turn"""
+    for provider in (primary, secondary):
+        try:
+            return provider.name, provider(request, deadline)
+        except Exception:
+            continue
+    raise RoutingFailed({}, timed_out=time.monotonic() >= deadline)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def run(label, call, requests, concurrency, deadline_s):
+    latencies, failures, winners = [], 0, {}
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal failures
+        started = time.monotonic()
+        try:
+            name, _result = call({"symptoms": "headache and fever"}, started + deadline_s)
+            with lock:
+                winners[name] = winners.get(name, 0) + 1
+        except RoutingFailed:
+            with lock:
+                failures += 1
+        with lock:
+            latencies.append(time.monotonic() - started)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+
+    mix = " ".join(f"{name}={count}" for name, count in sorted(winners.items()))
+    print(f"  {label:10} p50={percentile(latencies, 0.5):7.3f}s  p95={percentile(latencies, 0.95):7.3f}s  "
+          f"p99={percentile(latencies, 0.99):7.3f}s  failed={failures:4}  {mix}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--scale", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)  # per-failure router warnings are expected here
+
+    print("\n" + "=" * 70)
+    print(f"LLM ROUTER BENCHMARK ({args.requests} requests, concurrency {args.concurrency}, scale {args.scale})")
+    print("=" * 70)
+
+    for scenario, (latency, slow_share, slow_latency, failure_share) in SCENARIOS.items():
+        print(f"\n{scenario}:")
+        make_primary = lambda: StubProvider("primary", latency, slow_share, slow_latency, failure_share, args.scale, args.seed)
+        make_secondary = lambda: StubProvider("secondary", SECONDARY_LATENCY, 0.0, 0.0, 0.0, args.scale, args.seed + 1)
+
+        primary, secondary = make_primary(), make_secondary()
+        run("sequential", lambda req, dl: sequential(primary, secondary, req, dl),
+            args.requests, args.concurrency, DEADLINE * args.scale)
+
+        router = LLMRouter([
+            Provider("primary", make_primary(), default_p95=HISTORICAL_P95 * args.scale,
+                     breaker=CircuitBreaker(failure_threshold=5, reset_timeout=60 * args.scale)),
+            Provider("secondary", make_secondary(), default_p95=HISTORICAL_P95 * args.scale),
+        ], max_workers=args.concurrency * 2)
+        run("router", router.route, args.requests, args.concurrency, DEADLINE * args.scale)
+        print(f"  {'':10} stats={router.stats}  primary breaker={router.providers[0].breaker.state}")
+        router.executor.shutdown(wait=True)
+
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Login benchmark - doctor-then-user lookups vs the unified accounts view
+Replays a mix of login attempts (doctor, patient, doctor with a wrong password,
+unknown email) through the previous login lookup (query doctors, bcrypt, then
+query users, bcrypt) and through app.authenticate (one query over the accounts
+view, at most one bcrypt verify), and reports queries, bcrypt verifies and
+logins per second for a single worker thread.
+
+Usage: python scripts/bench_login.py [--attempts 200] [--rounds 11]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add parent directory to path to import from app
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Keep the app's own startup (init_db/seed) away from the real database
+_scratch_dir = tempfile.mkdtemp(prefix="medicare_bench_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_scratch_dir}/app_import.db")
+
+import bcrypt
+from sqlalchemy import event
+
+import app as medicare
+from app import Doctor, SessionLocal, User, authenticate
+from password_hashing import password_hasher
+
+PASSWORD = "bench-password"
+ACCOUNTS = 50
+
+
+def legacy_authenticate(db, email, password):
+    """The login lookup before the accounts view"""
+    doctor = db.query(Doctor).filter(Doctor.email == email).first()
+    if doctor and doctor.check_password(password):
+        return doctor, 'doctor'
+    user = db.query(User).filter(User.email == email).first()
+    if user and user.check_password(password):
+        return user, user.role.lower() if user.role else 'patient'
+    return None, None
+
+
+def seed(rounds):
+    hashed = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds)).decode()
+    db = SessionLocal()
+    try:
+        for i in range(ACCOUNTS):
+            db.add(Doctor(name=f"Bench Doctor {i}", email=f"bench.doctor{i}@medicare.com", password=hashed))
+            db.add(User(name=f"Bench Patient {i}", email=f"bench.patient{i}@medicare.com", password=hashed))
+        db.commit()
+    finally:
+        db.close()
+
+
+def attempts(n, seed_value=1):
+    rng = random.Random(seed_value)
+    mix = []
+    for _ in range(n):
+        i = rng.randrange(ACCOUNTS)
+        mix.append(rng.choice([
+            ("doctor ok", f"bench.doctor{i}@medicare.com", PASSWORD),
+            ("patient ok", f"bench.patient{i}@medicare.com", PASSWORD),
+            ("doctor wrong pw", f"bench.doctor{i}@medicare.com", "wrong-password"),
+            ("unknown email", f"nobody{i}@medicare.com", PASSWORD),
+        ]))
+    return mix
+
+
+def run(label, fn, mix):
+    counters = {"queries": 0, "verifies": 0}
+    per_kind = {}
+
+    def count_query(*_args, **_kwargs):
+        counters["queries"] += 1
+
+    real_checkpw = bcrypt.checkpw
+
+    def counting_checkpw(*args):
+        counters["verifies"] += 1
+        return real_checkpw(*args)
+
+    event.listen(medicare.engine, "before_cursor_execute", count_query)
+    bcrypt.checkpw = counting_checkpw
+    try:
+        started = time.perf_counter()
+        for kind, email, password in mix:
+            before = dict(counters)
+            db = SessionLocal()
+            try:
+                fn(db, email, password)
+            finally:
+                db.close()
+            stats = per_kind.setdefault(kind, {"n": 0, "queries": 0, "verifies": 0})
+            stats["n"] += 1
+            stats["queries"] += counters["queries"] - before["queries"]
+            stats["verifies"] += counters["verifies"] - before["verifies"]
+        elapsed = time.perf_counter() - started
+    finally:
+        bcrypt.checkpw = real_checkpw
+        event.remove(medicare.engine, "before_cursor_execute", count_query)
+
+    print(f"\n{label}: {len(mix) / elapsed:7.1f} logins/s per worker thread "
+          f"({counters['queries']} queries, {counters['verifies']} bcrypt verifies)")
+    for kind, stats in sorted(per_kind.items()):
+        print(f"  {kind:16} queries/login={stats['queries'] / stats['n']:.2f}  "
+              f"bcrypt/login={stats['verifies'] / stats['n']:.2f}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--attempts", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=None, help="bcrypt cost of the seeded accounts (default: calibrated cost)")
+    args = parser.parse_args()
+    if args.rounds is None:
+        args.rounds = password_hasher.cost
+    # Pin the cost so logins never queue background re-hashes into the measurement
+    password_hasher.cost = args.rounds
+
+    seed(args.rounds)
+    mix = attempts(args.attempts)
+
+    print("\n" + "=" * 70)
+    print(f"LOGIN BENCHMARK ({args.attempts} attempts, bcrypt cost {args.rounds}, {ACCOUNTS} doctors + {ACCOUNTS} patients)")
+    print("=" * 70)
+
+    legacy = run("doctor-then-user lookup", legacy_authenticate, mix)
+    unified = run("accounts view", authenticate, mix)
+    print(f"\nSpeedup: {legacy / unified:.2f}x\n")
+
+
+if __name__ == "__main__":
+    main()
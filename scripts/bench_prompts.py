@@ -0,0 +1,105 @@
+"""
+Prompt template benchmark - legacy f-string prompts vs compiled registry templates
+Compares estimated prompt tokens and build latency of the prompts
+SymptomAnalyzer used to assemble on every call (f-string prompt plus fresh
+generation-config and safety-settings structures) with the precompiled
+templates in prompt_templates, then prints per-template hit statistics.
+
+Usage: python scripts/bench_prompts.py [--iterations 20000] [--budget 1000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path to import prompt_templates
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from prompt_templates import PromptRegistry, estimate_tokens, registry
+
+SAMPLES = [
+    ("headache and mild fever since yesterday", 28, "female"),
+    ("chest pain spreading to left arm with sweating", 56, "male"),
+    ("loose motions six times today and weakness", None, None),
+    ("dry cough for two weeks, worse at night, no fever", 41, None),
+]
+
+
+def legacy_fstring(symptoms, context_str):
+    return f"""You are a medical education AI providing health information for a telehealth platform in India.
+
+A patient reports the following for educational consultation purposes:
+Patient Context: {context_str}
+Patient Report: {symptoms}
+""" + LEGACY_TAIL
+
+
+# Everything after the patient slots is static text, identical to the full template
+LEGACY_TAIL = registry.get("analysis", "full").render(symptoms="", context="").split("Patient Report: \n", 1)[1]
+
+
+def time_per_call(fn, iterations):
+    started = time.perf_counter()
+    for i in range(iterations):
+        fn(SAMPLES[i % len(SAMPLES)])
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--budget", type=int, default=1000, help="output token budget (LLM_OUTPUT_BUDGET)")
+    args = parser.parse_args()
+
+    print("\n" + "=" * 70)
+    print(f"PROMPT TEMPLATE BENCHMARK ({args.iterations} renders, output budget {args.budget})")
+    print("=" * 70)
+
+    print("\nRegistered templates:")
+    for template in registry.templates():
+        print(f"  {template.key:24} static~{template.static_tokens:4} tokens  "
+              f"expected output~{template.expected_output_tokens:4}  slots={template.fields}")
+
+    def context(age, gender):
+        parts = [p for p in (f"Age: {age}" if age else '', f"Gender: {gender}" if gender else '') if p]
+        return ", ".join(parts) or "No additional context"
+
+    def legacy(sample):
+        symptoms, age, gender = sample
+        prompt = legacy_fstring(symptoms, context(age, gender))
+        config = {'temperature': 0.7, 'max_output_tokens': 1000, 'top_p': 0.9, 'top_k': 40}
+        safety = [{"category": c, "threshold": "BLOCK_ONLY_HIGH"} for c in range(4)]
+        return prompt, config, safety
+
+    local = PromptRegistry()
+    for template in registry.templates():
+        local.register(template)
+
+    def compiled(sample):
+        symptoms, age, gender = sample
+        template, prompt = local.render("analysis", args.budget, symptoms=symptoms, context=context(age, gender))
+        return prompt, template.generation_config
+
+    legacy_tokens = sum(estimate_tokens(legacy(s)[0]) for s in SAMPLES) / len(SAMPLES)
+    compiled_tokens = sum(estimate_tokens(compiled(s)[0]) for s in SAMPLES) / len(SAMPLES)
+    local.hits.clear()
+    local.prompt_tokens.clear()
+
+    legacy_us = time_per_call(legacy, args.iterations)
+    compiled_us = time_per_call(compiled, args.iterations)
+    chosen = local.select("analysis", args.budget)
+
+    print(f"\nanalysis prompt (selected variant: {chosen.key})")
+    print(f"  {'legacy':10} ~{legacy_tokens:6.1f} prompt tokens  {legacy_us:6.2f}us per build")
+    print(f"  {'registry':10} ~{compiled_tokens:6.1f} prompt tokens  {compiled_us:6.2f}us per build")
+    saved = legacy_tokens - compiled_tokens
+    print(f"  saves ~{saved:.1f} tokens per call ({saved / legacy_tokens:.1%})")
+
+    print("\nPer-template hits:")
+    for key, stat in local.stats().items():
+        print(f"  {key:24} hits={stat['hits']:7}  avg prompt tokens={stat['avg_prompt_tokens']}")
+    print()
+
+
+if __name__ == "__main__":
+    main()
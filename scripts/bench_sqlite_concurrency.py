@@ -0,0 +1,153 @@
+"""
+SQLite concurrency benchmark - mixed message sends and notification polls
+Runs several worker processes (like gunicorn workers) against one SQLite file,
+once with the default rollback-journal settings and once with the production
+profile from app.apply_sqlite_pragmas, and compares throughput and lock errors.
+
+Usage: python scripts/bench_sqlite_concurrency.py [--workers 4] [--seconds 10] [--write-ratio 0.3]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add parent directory to path to import from app
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Keep the app's own startup (init_db/seed) away from the real database
+_scratch_dir = tempfile.mkdtemp(prefix="medicare_bench_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_scratch_dir}/app_import.db")
+
+from sqlalchemy import create_engine, event, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app import Base, Consultation, Doctor, Message, Notification, User, apply_sqlite_pragmas
+
+PATIENTS = 20
+
+
+def make_engine(db_path: str, tuned: bool):
+    engine = create_engine(
+        f"sqlite:///{db_path}",
+        connect_args={"check_same_thread": False},
+        future=True,
+    )
+    if tuned:
+        event.listen(engine, "connect", apply_sqlite_pragmas)
+    return engine
+
+
+def setup_database(db_path: str, tuned: bool) -> None:
+    engine = make_engine(db_path, tuned)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, future=True)
+    db = Session()
+    try:
+        doctor = Doctor(name="Bench Doctor", email="bench.doctor@medicare.com", password="x")
+        db.add(doctor)
+        db.flush()
+        for i in range(PATIENTS):
+            patient = User(name=f"Patient {i}", email=f"bench{i}@medicare.com", password="x")
+            db.add(patient)
+            db.flush()
+            db.add(Consultation(doctor_id=doctor.id, patient_id=patient.id, status="active"))
+        db.commit()
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def worker(db_path: str, tuned: bool, seconds: float, write_ratio: float, results) -> None:
+    engine = make_engine(db_path, tuned)
+    Session = sessionmaker(bind=engine, future=True)
+    rng = random.Random(os.getpid())
+    stats = {"writes": 0, "reads": 0, "errors": 0, "latencies": []}
+    deadline = time.perf_counter() + seconds
+
+    while time.perf_counter() < deadline:
+        consultation_id = rng.randint(1, PATIENTS)
+        started = time.perf_counter()
+        db = Session()
+        try:
+            if rng.random() < write_ratio:
+                # Mirrors send_message: insert message + notification for the recipient
+                db.add(Message(consultation_id=consultation_id, sender_type="doctor", sender_id=1, content="bench message"))
+                db.add(Notification(user_id=consultation_id, role="patient", title="New message", type="consult_message"))
+                db.commit()
+                stats["writes"] += 1
+            else:
+                # Mirrors list_notifications?summary=true
+                db.query(func.count(Notification.id)).filter(
+                    Notification.user_id == consultation_id,
+                    Notification.role == "patient",
+                ).scalar()
+                db.query(func.count(Notification.id)).filter(
+                    Notification.user_id == consultation_id,
+                    Notification.role == "patient",
+                    Notification.is_read == False,
+                ).scalar()
+                stats["reads"] += 1
+            stats["latencies"].append(time.perf_counter() - started)
+        except OperationalError:
+            db.rollback()
+            stats["errors"] += 1
+        finally:
+            db.close()
+
+    engine.dispose()
+    results.put(stats)
+
+
+def run(label: str, tuned: bool, workers: int, seconds: float, write_ratio: float) -> dict:
+    db_path = os.path.join(_scratch_dir, f"{label}.db")
+    setup_database(db_path, tuned)
+
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(db_path, tuned, seconds, write_ratio, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    collected = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    latencies = sorted(lat for s in collected for lat in s["latencies"])
+    summary = {
+        "writes": sum(s["writes"] for s in collected),
+        "reads": sum(s["reads"] for s in collected),
+        "errors": sum(s["errors"] for s in collected),
+        "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0,
+    }
+    summary["ops_per_sec"] = (summary["writes"] + summary["reads"]) / seconds
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    args = parser.parse_args()
+
+    print("\n" + "=" * 70)
+    print(f"SQLITE CONCURRENCY BENCHMARK ({args.workers} workers, {args.seconds:.0f}s, {args.write_ratio:.0%} writes)")
+    print("=" * 70)
+
+    for label, tuned in (("default", False), ("tuned", True)):
+        r = run(label, tuned, args.workers, args.seconds, args.write_ratio)
+        print(
+            f"{label:8} ops/s={r['ops_per_sec']:8.1f}  writes={r['writes']:6}  reads={r['reads']:6}  "
+            f"locked_errors={r['errors']:5}  p50={r['p50_ms']:6.2f}ms  p95={r['p95_ms']:6.2f}ms"
+        )
+
+    print(f"\nScratch databases: {_scratch_dir}\n")
+
+
+if __name__ == "__main__":
+    main()
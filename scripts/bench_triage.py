@@ -0,0 +1,164 @@
+"""
+Triage benchmark - local triage model vs the keyword fallback
+Compares severity accuracy and per-call latency of triage_model.TriageModel
+against SymptomAnalyzer._get_fallback_response (the keyword rules patients get
+today when Gemini is blocked or slow).
+
+Evaluation data: consultations in the database whose llm_summary records a
+severity (5-fold cross-validation when there are enough of them), otherwise a
+built-in held-out set of labelled descriptions.
+
+Usage: python scripts/bench_triage.py [--db medicare.db] [--folds 5]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+# Add parent directory to path to import the models
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from llm_service import SymptomAnalyzer
+from triage_model import SEVERITIES, severity_from_summary, train_triage_model
+
+# Held out from triage_model.SEED_EXAMPLES
+EVAL_SET = [
+    ("blocked nose and mild sneezing", 'mild'),
+    ("slight throat irritation in the morning", 'mild'),
+    ("mosquito bite swelling and itching", 'mild'),
+    ("feeling sleepy and a little tired", 'mild'),
+    ("minor scrape on knee from cycling", 'mild'),
+    ("occasional burping after meals", 'mild'),
+    ("mild back stiffness after sitting long hours", 'mild'),
+    ("dandruff and itchy scalp", 'mild'),
+    ("fever of 102 with headache since yesterday", 'moderate'),
+    ("cough with phlegm and low grade fever for five days", 'moderate'),
+    ("loose motions six times today and weakness", 'moderate'),
+    ("painful urination with fever", 'moderate'),
+    ("toothache with swollen gums and fever", 'moderate'),
+    ("migraine with vomiting not responding to paracetamol", 'moderate'),
+    ("sprained wrist, swollen and painful to move", 'moderate'),
+    ("body ache and chills with sore throat", 'moderate'),
+    ("chest pain while climbing stairs with breathlessness", 'severe'),
+    ("my heart is paining and I am sweating a lot", 'severe'),
+    ("sudden difficulty breathing after bee sting, throat swelling", 'severe'),
+    ("child had a seizure with high fever", 'severe'),
+    ("face drooping and cannot lift right arm", 'severe'),
+    ("coughing blood and losing weight", 'severe'),
+    ("fainted and unconscious for a minute after a fall", 'severe'),
+    ("heavy bleeding after delivery", 'severe'),
+]
+
+
+def load_from_db(db_path):
+    consultations, diseases = [], []
+    if not db_path or not os.path.exists(db_path):
+        return consultations, diseases
+    conn = sqlite3.connect(db_path)
+    try:
+        consultations = conn.execute(
+            "SELECT primary_symptoms, llm_summary FROM consultations "
+            "WHERE primary_symptoms IS NOT NULL AND llm_summary IS NOT NULL"
+        ).fetchall()
+        rows = conn.execute(
+            "SELECT d.name, s.name, d.precaution FROM diseases d "
+            "JOIN disease_symptoms ds ON ds.disease_id = d.id JOIN symptoms s ON s.id = ds.symptom_id"
+        ).fetchall()
+        grouped = {}
+        for disease, symptom, precaution in rows:
+            grouped.setdefault((disease, precaution), []).append(symptom)
+        diseases = [(name, symptoms, precaution) for (name, precaution), symptoms in grouped.items()]
+    except sqlite3.OperationalError:
+        pass  # tables not created yet
+    finally:
+        conn.close()
+    return consultations, diseases
+
+
+def evaluate(label, predict, samples):
+    correct = 0
+    under_triaged = 0  # predicted less severe than the label: the costly mistake
+    confusion = Counter()
+    latencies = []
+    for text, expected in samples:
+        started = time.perf_counter()
+        predicted = predict(text)
+        latencies.append(time.perf_counter() - started)
+        confusion[(expected, predicted)] += 1
+        correct += predicted == expected
+        if predicted in SEVERITIES and SEVERITIES.index(predicted) < SEVERITIES.index(expected):
+            under_triaged += 1
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1e6
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e6
+    print(f"{label:16} accuracy={correct / len(samples):6.1%}  under-triaged={under_triaged:3}  "
+          f"p50={p50:7.1f}us  p99={p99:7.1f}us")
+    return confusion
+
+
+def print_confusion(confusion):
+    print(f"{'':10}" + "".join(f"{p:>10}" for p in SEVERITIES))
+    for expected in SEVERITIES:
+        print(f"{expected:10}" + "".join(f"{confusion[(expected, p)]:10}" for p in SEVERITIES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    default_db = os.getenv("DATABASE_URL", "sqlite:///medicare.db").replace("sqlite:///", "")
+    parser.add_argument("--db", default=default_db)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    consultations, diseases = load_from_db(args.db)
+    labelled = [(text, severity_from_summary(summary)) for text, summary in consultations]
+    labelled = [(text, severity) for text, severity in labelled if severity]
+
+    keyword = SymptomAnalyzer.__new__(SymptomAnalyzer)  # only the rule-based fallback is used
+    keyword_predict = lambda text: keyword._get_fallback_response(text)['severity']
+
+    print("\n" + "=" * 70)
+    print(f"TRIAGE BENCHMARK ({len(labelled)} labelled consultations, {len(diseases)} diseases in {args.db})")
+    print("=" * 70)
+
+    if len(labelled) >= args.folds * 4:
+        random.Random(args.seed).shuffle(labelled)
+        print(f"{args.folds}-fold cross-validation on stored consultations\n")
+        folds = [labelled[i::args.folds] for i in range(args.folds)]
+        samples, fold_model = [], {}
+        for i, held_out in enumerate(folds):
+            train = [(text, f"Severity: {sev}") for j, fold in enumerate(folds) if j != i for text, sev in fold]
+            model = train_triage_model(train, diseases)
+            for text, severity in held_out:
+                fold_model[text] = model  # each sample is scored by the model that never saw it
+                samples.append((text, severity))
+        triage_predict = lambda text: fold_model[text].classify(text)[0]
+    else:
+        print("Not enough labelled consultations; using the built-in held-out set\n")
+        model = train_triage_model(consultations, diseases)
+        samples = EVAL_SET
+        triage_predict = lambda text: model.classify(text)[0]
+
+    keyword_confusion = evaluate("keyword fallback", keyword_predict, samples)
+    triage_confusion = evaluate("triage model", triage_predict, samples)
+
+    print("\nKeyword fallback confusion (rows = expected, columns = predicted):")
+    print_confusion(keyword_confusion)
+    print("\nTriage model confusion:")
+    print_confusion(triage_confusion)
+
+    # End-to-end latency including summary/conditions, as served by ?instant=1
+    model = train_triage_model(consultations, diseases)
+    started = time.perf_counter()
+    for text, _ in samples * 50:
+        model.predict(text)
+    per_call = (time.perf_counter() - started) / (len(samples) * 50)
+    print(f"\nTriageModel.predict(): {per_call * 1e6:.1f}us per call\n")
+
+
+if __name__ == "__main__":
+    main()
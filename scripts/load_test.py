@@ -0,0 +1,190 @@
+"""
+Load test - /api/doctors latency while symptom analyses are in flight
+Measures p50/p95 of GET /api/doctors on an idle server, then again while
+--analyses concurrent POST /api/analyze-symptoms requests are running.
+With sync workers the second p95 explodes; with gunicorn.conf.py it should
+stay flat.
+
+Usage:
+    python scripts/load_test.py --spawn
+        Starts gunicorn (gunicorn.conf.py) on a scratch SQLite database with
+        the LLM replaced by a stub that sleeps --llm-latency seconds.
+    python scripts/load_test.py --url http://localhost:5000 --email patient@example.com --password ...
+        Runs against an existing server with real Gemini calls.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SYMPTOMS = [
+    "I have had a headache and mild fever since yesterday evening",
+    "Dry cough and sore throat for three days, no fever",
+    "Stomach pain and nausea after eating outside food",
+    "Knee pain when climbing stairs for the last two weeks",
+]
+
+
+def create_stub_app():
+    """Gunicorn app factory used by --spawn: the real app with a sleeping LLM"""
+    sys.path.insert(0, str(ROOT))
+    import app as app_module
+
+    latency = float(os.getenv("LOAD_TEST_LLM_LATENCY", "3"))
+
+    class _StubAnalyzer:
+        def analyze_symptoms(self, symptoms, patient_age=None, patient_gender=None, user_id=None, **kwargs):
+            time.sleep(latency)  # stands in for the Gemini round trip
+            return {
+                "severity": "mild",
+                "summary": "Stubbed analysis for load testing.",
+                "recommendations": [],
+                "warnings": [],
+                "next_steps": [],
+            }
+
+    app_module.LLM_SERVICE_AVAILABLE = True
+    app_module.get_symptom_analyzer = lambda: _StubAnalyzer()
+    return app_module.app
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def sample_doctors(base_url, stop_event=None, count=50):
+    latencies = []
+    while len(latencies) < count and not (stop_event and stop_event.is_set()):
+        started = time.perf_counter()
+        requests.get(f"{base_url}/api/doctors", timeout=30)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def run_analysis(base_url, token, text, durations, failures):
+    started = time.perf_counter()
+    try:
+        resp = requests.post(
+            f"{base_url}/api/analyze-symptoms",
+            json={"symptoms": text},
+            headers={"Authorization": f"Bearer {token}"},
+            timeout=180,
+        )
+        if resp.status_code != 200:
+            failures.append(resp.status_code)
+    except requests.RequestException as exc:
+        failures.append(str(exc))
+    durations.append(time.perf_counter() - started)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn_server(llm_latency):
+    scratch = tempfile.mkdtemp(prefix="medicare_load_")
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{scratch}/load.db",
+        "PORT": str(port),
+        "LOAD_TEST_LLM_LATENCY": str(llm_latency),
+    })
+    # Create schema and seed data once, before workers race to do it
+    subprocess.run([sys.executable, "-c", "import app"], cwd=scratch, env={**env, "PYTHONPATH": str(ROOT)},
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", str(ROOT / "gunicorn.conf.py"),
+         "--pythonpath", f"{ROOT},{ROOT / 'scripts'}", "load_test:create_stub_app()"],
+        cwd=scratch, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(f"{base_url}/api/doctors", timeout=1)
+            return proc, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("gunicorn did not start")
+
+
+def get_token(base_url, email, password):
+    if email and password:
+        resp = requests.post(f"{base_url}/api/auth/login", json={"email": email, "password": password}, timeout=30)
+    else:
+        resp = requests.post(f"{base_url}/api/auth/register", json={
+            "email": f"load{int(time.time())}@example.com",
+            "password": "LoadTest123",
+            "name": "Load Test",
+        }, timeout=30)
+    resp.raise_for_status()
+    return resp.json()["token"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("--spawn", action="store_true", help="start a local gunicorn with a stubbed LLM")
+    parser.add_argument("--llm-latency", type=float, default=3.0)
+    parser.add_argument("--analyses", type=int, default=20)
+    parser.add_argument("--samples", type=int, default=50)
+    args = parser.parse_args()
+
+    proc = None
+    base_url = args.url.rstrip("/")
+    if args.spawn:
+        proc, base_url = spawn_server(args.llm_latency)
+
+    try:
+        token = get_token(base_url, args.email, args.password)
+
+        print("\n" + "=" * 70)
+        print(f"LOAD TEST: {base_url}")
+        print("=" * 70)
+
+        idle = sample_doctors(base_url, count=args.samples)
+
+        durations, failures = [], []
+        workers = [
+            threading.Thread(target=run_analysis, args=(base_url, token, SYMPTOMS[i % len(SYMPTOMS)], durations, failures))
+            for i in range(args.analyses)
+        ]
+        for t in workers:
+            t.start()
+        time.sleep(0.2)  # let the analyses reach the server first
+
+        stop = threading.Event()
+        watcher = threading.Thread(target=lambda: ([t.join() for t in workers], stop.set()))
+        watcher.start()
+        loaded = sample_doctors(base_url, stop_event=stop, count=args.samples)
+        watcher.join()
+
+        print(f"/api/doctors idle:       n={len(idle):4}  p50={percentile(idle, 0.5) * 1000:8.1f}ms  p95={percentile(idle, 0.95) * 1000:8.1f}ms")
+        print(f"/api/doctors under load: n={len(loaded):4}  p50={percentile(loaded, 0.5) * 1000:8.1f}ms  p95={percentile(loaded, 0.95) * 1000:8.1f}ms")
+        print(f"analyses: {args.analyses} in flight, p50={percentile(durations, 0.5):.2f}s  max={max(durations, default=0):.2f}s  failures={len(failures)}")
+        print()
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
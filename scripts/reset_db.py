@@ -7,6 +7,7 @@ from pathlib import Path
 
 db_path = Path("medicare.db")
 journal_path = Path("medicare.db-journal")
+wal_paths = [Path("medicare.db-wal"), Path("medicare.db-shm")]
 
 if db_path.exists():
     os.remove(db_path)
@@ -16,5 +17,10 @@ if journal_path.exists():
     os.remove(journal_path)
     print("[OK] Deleted medicare.db-journal")
 
+for wal_path in wal_paths:
+    if wal_path.exists():
+        os.remove(wal_path)
+        print(f"[OK] Deleted {wal_path}")
+
 print("[OK] Database reset complete. Run 'python app.py' to recreate the database with new schema.")
 
@@ -0,0 +1,287 @@
+"""
+Semantic near-duplicate cache for symptom analyses
+Symptom texts are normalized (synonym map built from the Symptom table, number
+words, negations, stop words) into a set of terms, summarized as a MinHash
+signature and indexed with LSH bands. A new report whose estimated Jaccard
+similarity to a cached one clears the threshold reuses that analysis, so
+"cough & fever 2 days" and "fever with cough for two days" cost one LLM call.
+Near-duplicate scoring only forgives phrasing: both reports must name exactly
+the same symptoms and red flags (including negations) before an entry is reused.
+Pure Python, no network or model downloads.
+"""
+
+import copy
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "2000"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "21600"))  # seconds
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.85"))
+
+NUM_PERM = 64
+BANDS = 16  # 16 bands x 4 rows: pairs at Jaccard 0.85 collide in some band >99.9% of the time
+ROWS = NUM_PERM // BANDS
+MAX_CANDIDATES = 8  # only the entries sharing the most bands get a full signature comparison
+_PRIME = (1 << 61) - 1
+
+# Colloquial phrasings -> symptom names used in the Symptom table
+BUILTIN_SYNONYMS = {
+    "temperature": "fever", "feverish": "fever", "pyrexia": "fever", "high temperature": "fever",
+    "coughing": "cough", "dry cough": "cough",
+    "head ache": "headache", "head pain": "headache", "head is paining": "headache",
+    "tired": "fatigue", "tiredness": "fatigue", "weakness": "fatigue", "exhaustion": "fatigue",
+    "throat pain": "sore throat", "throat is paining": "sore throat", "painful throat": "sore throat",
+    "running nose": "runny nose", "blocked nose": "runny nose", "stuffy nose": "runny nose",
+    "nauseous": "nausea", "queasy": "nausea",
+    "throwing up": "vomiting", "vomit": "vomiting", "puking": "vomiting",
+    "loose motions": "diarrhea", "loose motion": "diarrhea", "diarrhoea": "diarrhea", "loose stools": "diarrhea",
+    "stomach pain": "abdominal pain", "stomach ache": "abdominal pain", "tummy ache": "abdominal pain",
+    "belly pain": "abdominal pain", "stomachache": "abdominal pain",
+    "breathlessness": "shortness of breath", "difficulty breathing": "shortness of breath",
+    "short of breath": "shortness of breath", "trouble breathing": "shortness of breath",
+    "chest ache": "chest pain", "chest is paining": "chest pain",
+    "dizzy": "dizziness", "giddiness": "dizziness", "lightheaded": "dizziness",
+    "cannot taste": "loss of taste", "no taste": "loss of taste",
+    "cannot smell": "loss of smell", "no smell": "loss of smell",
+}
+
+# Red-flag phrasings -> one canonical term each. A report with a red flag never
+# reuses an analysis cached for a report without it (or with a different one)
+RED_FLAG_PHRASES = {
+    "blood": "blood", "bloody": "blood", "bleeding": "blood", "bleed": "blood",
+    "seizure": "seizure", "seizures": "seizure", "fits": "seizure", "convulsion": "seizure", "convulsions": "seizure",
+    "confusion": "confusion", "confused": "confusion", "disoriented": "confusion",
+    "unconscious": "fainting", "fainted": "fainting", "fainting": "fainting", "faint": "fainting",
+    "passed out": "fainting", "blacked out": "fainting", "collapsed": "fainting",
+    "stiff neck": "stiff neck", "neck stiffness": "stiff neck",
+    "chest pain": "chest pain", "chest tightness": "chest pain", "heart pain": "chest pain",
+    "shortness of breath": "shortness of breath", "cannot breathe": "shortness of breath",
+    "can't breathe": "shortness of breath", "unable to breathe": "shortness of breath", "gasping": "shortness of breath",
+    "slurred speech": "slurred speech", "face drooping": "face drooping", "paralysis": "paralysis",
+    "suicidal": "suicidal",
+}
+RED_FLAG_TERMS = {target.replace(" ", "_") for target in RED_FLAG_PHRASES.values()}
+
+NUMBER_WORDS = {
+    "one": "1", "two": "2", "three": "3", "four": "4", "five": "5", "six": "6", "seven": "7",
+    "eight": "8", "nine": "9", "ten": "10", "a couple": "2", "couple": "2", "few": "3", "several": "3",
+}
+UNITS = {"day": "day", "days": "day", "week": "week", "weeks": "week", "hour": "hour", "hours": "hour",
+         "month": "month", "months": "month", "night": "day", "nights": "day"}
+NEGATIONS = {"no", "not", "without", "never", "denies"}
+STOP_WORDS = {
+    "a", "an", "the", "and", "or", "with", "for", "since", "of", "in", "on", "at", "to", "from",
+    "i", "im", "i'm", "me", "my", "have", "has", "had", "having", "been", "is", "am", "are", "was",
+    "also", "some", "very", "bit", "little", "feel", "feeling", "got", "get", "last", "past",
+    "patient", "reports", "experiencing", "suffering",
+}
+
+_WORD = re.compile(r"[a-z0-9'_]+")
+
+
+class SymptomNormalizer:
+    """Maps free-text symptoms to a set of canonical terms"""
+
+    def __init__(self, symptom_names: Iterable[str] = ()):
+        canonical = {name.strip().lower().replace("_", " ") for name in symptom_names if name and name.strip()}
+        phrases = {alias: target for alias, target in BUILTIN_SYNONYMS.items()}
+        for name in canonical | set(BUILTIN_SYNONYMS.values()):
+            phrases.setdefault(name, name)
+            if not name.endswith("s"):
+                phrases.setdefault(name + "s", name)
+        phrases.update(NUMBER_WORDS)
+        phrases.update(RED_FLAG_PHRASES)
+        self.canonical = canonical
+        # Terms that must match exactly between two reports for a cached analysis to be reused
+        self.key_terms = {
+            name.replace(" ", "_") for name in canonical | set(BUILTIN_SYNONYMS.values())
+        } | RED_FLAG_TERMS
+        self._phrases = {phrase: target.replace(" ", "_") for phrase, target in phrases.items()}
+        # Longest phrases first so "sore throat" wins over "throat"
+        alternation = "|".join(re.escape(p) for p in sorted(self._phrases, key=len, reverse=True))
+        self._pattern = re.compile(r"\b(" + alternation + r")\b")
+
+    def terms(self, text: str) -> List[str]:
+        lowered = text.lower().replace("&", " and ").replace("-", " ")
+        mapped = self._pattern.sub(lambda m: " " + self._phrases[m.group(1)] + " ", lowered)
+        words = _WORD.findall(mapped)
+        terms = []
+        negate = False
+        for word in words:
+            if word in NEGATIONS:
+                negate = True
+                continue
+            if word in UNITS and terms and terms[-1].isdigit():
+                terms[-1] = f"{terms[-1]}_{UNITS[word]}"  # "2 days" -> "2_day"
+                continue
+            if word in STOP_WORDS:
+                continue
+            if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+                word = word[:-1]
+            terms.append(f"no_{word}" if negate else word)
+            negate = False
+        return terms
+
+    def clinical_key(self, terms: Iterable[str]) -> frozenset:
+        """The symptom and red-flag terms (negated or not) of a report"""
+        return frozenset(t for t in terms if (t[3:] if t.startswith("no_") else t) in self.key_terms)
+
+
+def _token_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _permutations(seed: int = 1) -> List[Tuple[int, int]]:
+    out = []
+    for i in range(NUM_PERM):
+        digest = hashlib.blake2b(f"{seed}:{i}".encode(), digest_size=16).digest()
+        out.append((int.from_bytes(digest[:8], "big") % (_PRIME - 1) + 1, int.from_bytes(digest[8:], "big") % _PRIME))
+    return out
+
+
+_PERMS = _permutations()
+
+
+def minhash(terms: Iterable[str]) -> Tuple[int, ...]:
+    hashes = {_token_hash(t) for t in terms}
+    if not hashes:
+        return ()
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS)
+
+
+def similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+    if not sig_a or not sig_b:
+        return 0.0
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+class _Entry:
+    __slots__ = ("signature", "terms", "context", "analysis", "stored_at", "hits")
+
+    def __init__(self, signature, terms, context, analysis):
+        self.signature = signature
+        self.terms = terms
+        self.context = context
+        self.analysis = analysis
+        self.stored_at = time.monotonic()
+        self.hits = 0
+
+
+class SemanticCache:
+    """LRU + TTL cache of analyses, looked up by MinHash/LSH near-duplicate search.
+
+    Entries only match reports with the same age and gender context and the same
+    clinical key (symptom and red-flag terms); negated terms ("no fever") never
+    match their positive form.
+    """
+
+    def __init__(self, max_entries: int = SEMANTIC_CACHE_SIZE, ttl: float = SEMANTIC_CACHE_TTL, threshold: float = SEMANTIC_CACHE_THRESHOLD, symptom_names: Iterable[str] = ()):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.normalizer = SymptomNormalizer(symptom_names)
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._bands: Dict[Tuple, set] = {}
+        self._exact: Dict[Tuple, int] = {}  # (terms, context) -> newest entry id
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "exact_hits": 0, "near_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def configure(self, symptom_names: Iterable[str]):
+        """Rebuild the synonym map (e.g. from the Symptom table); clears cached entries"""
+        normalizer = SymptomNormalizer(symptom_names)
+        with self._lock:
+            self.normalizer = normalizer
+            self._entries.clear()
+            self._bands.clear()
+            self._exact.clear()
+
+    @staticmethod
+    def _band_keys(signature: Tuple[int, ...], context: Tuple):
+        # The context is part of the key, so other patients' age/gender never compete for candidate slots
+        return [(context, band, signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+    def _context(self, terms: frozenset, age, gender) -> Tuple:
+        # The clinical key is part of the context, so LSH candidates always share it
+        return (age, (gender or "").lower() or None, self.normalizer.clinical_key(terms))
+
+    def lookup(self, symptoms: str, age=None, gender=None) -> Optional[Dict]:
+        """Deep copy of the best cached analysis for a near-duplicate report, or None"""
+        terms = frozenset(self.normalizer.terms(symptoms))
+        signature = minhash(terms)
+        context = self._context(terms, age, gender)
+        with self._lock:
+            self.stats["lookups"] += 1
+            if not signature:
+                self.stats["misses"] += 1
+                return None
+            best_id, best_score = None, 0.0
+            now = time.monotonic()
+            exact_id = self._exact.get((terms, context))
+            if exact_id is not None and now - self._entries[exact_id].stored_at <= self.ttl:
+                best_id, best_score = exact_id, 1.0
+            else:
+                shared = Counter()
+                for key in self._band_keys(signature, context):
+                    shared.update(self._bands.get(key, ()))
+                for entry_id, _ in shared.most_common(MAX_CANDIDATES):
+                    entry = self._entries[entry_id]
+                    if now - entry.stored_at > self.ttl or entry.context != context:
+                        continue
+                    score = similarity(signature, entry.signature)
+                    if score > best_score:
+                        best_id, best_score = entry_id, score
+
+            if best_id is None or best_score < self.threshold:
+                self.stats["misses"] += 1
+                return None
+            entry = self._entries[best_id]
+            self._entries.move_to_end(best_id)
+            entry.hits += 1
+            self.stats["exact_hits" if best_id == exact_id else "near_hits"] += 1
+            analysis = copy.deepcopy(entry.analysis)
+        analysis['cached'] = True
+        analysis['cache_similarity'] = round(best_score, 3)
+        return analysis
+
+    def store(self, symptoms: str, analysis: Dict, age=None, gender=None):
+        terms = frozenset(self.normalizer.terms(symptoms))
+        signature = minhash(terms)
+        if not signature:
+            return
+        entry = _Entry(signature, terms, self._context(terms, age, gender), copy.deepcopy(analysis))
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._exact[(terms, entry.context)] = entry_id
+            for key in self._band_keys(signature, entry.context):
+                self._bands.setdefault(key, set()).add(entry_id)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._evict_oldest()
+
+    def _evict_oldest(self):
+        entry_id, entry = self._entries.popitem(last=False)
+        if self._exact.get((entry.terms, entry.context)) == entry_id:
+            del self._exact[(entry.terms, entry.context)]
+        for key in self._band_keys(entry.signature, entry.context):
+            bucket = self._bands.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._bands[key]
+        self.stats["evictions"] += 1
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        hits = stats["exact_hits"] + stats["near_hits"]
+        stats["hit_rate"] = round(hits / stats["lookups"], 3) if stats["lookups"] else 0.0
+        return stats
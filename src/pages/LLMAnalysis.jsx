@@ -53,11 +53,12 @@ function LLMAnalysis() {
         return;
       }
 
-      const response = await fetch(`${API_BASE_URL}/analyze-symptoms`, {
+      const response = await fetch(`${API_BASE_URL}/analyze-symptoms?stream=1`, {
         method: 'POST',
         headers: {
           'Authorization': `Bearer ${token}`,
-          'Content-Type': 'application/json'
+          'Content-Type': 'application/json',
+          'Accept': 'text/event-stream'
         },
         body: JSON.stringify({
           symptoms: input.trim()
@@ -69,8 +70,52 @@ function LLMAnalysis() {
         throw new Error(errorData.error || errorData.message || 'Failed to analyze symptoms');
       }
 
-      const analysisData = await response.json();
-      setResult(analysisData);
+      if (!response.body || !(response.headers.get('Content-Type') || '').includes('text/event-stream')) {
+        const analysisData = await response.json();
+        setResult(analysisData);
+        return;
+      }
+
+      // Server-Sent Events: show severity/summary as soon as they arrive
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let partial = {};
+      let finished = false;
+
+      while (!finished) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+          const rawEvent = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+
+          let eventName = 'message';
+          let data = '';
+          rawEvent.split('\n').forEach((line) => {
+            if (line.startsWith('event:')) eventName = line.slice(6).trim();
+            else if (line.startsWith('data:')) data += line.slice(5).trim();
+          });
+          if (!data) continue;
+          const payload = JSON.parse(data);
+
+          if (eventName === 'triage') {
+            // Instant local estimate, replaced as soon as the AI analysis arrives
+            if (!partial.severity) setResult({ ...payload, preliminary: true });
+          } else if (eventName === 'field') {
+            partial = { ...partial, [payload.key]: payload.value };
+            if (partial.severity) setResult(partial);
+          } else if (eventName === 'result') {
+            setResult(payload);
+            finished = true;
+          } else if (eventName === 'error') {
+            throw new Error(payload.error || payload.message || 'Failed to analyze symptoms');
+          }
+        }
+      }
     } catch (err) {
       console.error('Analysis error:', err);
       setError(err.message || 'Failed to analyze symptoms. Please try again.');
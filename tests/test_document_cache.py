@@ -0,0 +1,55 @@
+"""Document disk cache: one byte budget per directory, safe against concurrent eviction"""
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from document_cache import DocumentCache
+
+
+def test_budget_covers_every_worker(tmp_path):
+    # Two workers sharing the directory, each storing under its own budget
+    first = DocumentCache(str(tmp_path), max_bytes=250)
+    second = DocumentCache(str(tmp_path), max_bytes=250)
+    for i in range(3):
+        first.put(f"a/{i}", b"x" * 50)
+        second.put(f"b/{i}", b"y" * 50)
+        time.sleep(0.01)
+    files = [entry for entry in tmp_path.iterdir() if not entry.name.startswith(".tmp")]
+    assert sum(entry.stat().st_size for entry in files) <= 250
+    assert len(files) == 5
+
+
+def test_hits_are_least_recently_used_last(tmp_path):
+    cache = DocumentCache(str(tmp_path), max_bytes=100)
+    cache.put("old", b"o" * 50)
+    time.sleep(0.01)
+    cache.put("newer", b"n" * 50)
+    time.sleep(0.01)
+    cache.open("old").close()  # touched: now the most recent
+    time.sleep(0.01)
+    cache.put("newest", b"w" * 50)
+    assert cache.open("newer") is None
+    assert cache.open("old").read() == b"o" * 50
+
+
+def test_open_handle_survives_eviction(tmp_path):
+    cache = DocumentCache(str(tmp_path), max_bytes=1000)
+    cache.put("report.pdf", b"%PDF-1.7 body")
+    handle = cache.open("report.pdf")
+    for entry in tmp_path.iterdir():
+        os.unlink(entry)  # another worker evicts it mid-send
+    assert handle.read() == b"%PDF-1.7 body"
+    handle.close()
+    assert cache.open("report.pdf") is None
+
+
+def test_discard_removes_deleted_documents(tmp_path):
+    cache = DocumentCache(str(tmp_path), max_bytes=1000)
+    cache.put("users/1/documents/scan.pdf", b"data")
+    cache.discard("users/1/documents/scan.pdf")
+    cache.discard("users/1/documents/never-cached.pdf")
+    assert cache.open("users/1/documents/scan.pdf") is None
+    assert cache.metrics()["misses"] == 1
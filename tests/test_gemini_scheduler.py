@@ -0,0 +1,28 @@
+"""Gemini quota: each worker process enforces its share of the account limits"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from llm_service import PRIORITY_INTERACTIVE, GeminiScheduler, QuotaExceeded
+
+
+def burst(scheduler):
+    granted = 0
+    with pytest.raises(QuotaExceeded):
+        while True:
+            scheduler.acquire(PRIORITY_INTERACTIVE, time.monotonic() + 0.05)
+            granted += 1
+    return granted
+
+
+def test_single_process_gets_the_whole_limit():
+    assert burst(GeminiScheduler(rpm=15, rpd=1500, share=1)) == 15
+
+
+def test_workers_split_the_limit():
+    assert burst(GeminiScheduler(rpm=15, rpd=1500, share=3)) == 5
+    assert burst(GeminiScheduler(rpm=15, rpd=10, share=4)) == 2  # the daily share binds first
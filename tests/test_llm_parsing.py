@@ -0,0 +1,59 @@
+"""Model output parsing: repairs what it can, never passes a fallback off as an answer"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from llm_router import LLMRouter, Provider
+from llm_service import SymptomAnalyzer, TolerantJSONParser, UnparseableResponse
+
+
+def parse(text):
+    return TolerantJSONParser(text).parse()
+
+
+@pytest.mark.parametrize("text", [
+    '{"a": 1 "b": 2}',
+    '{"a": 1\n"b": 2}',
+    '{"a": "x" "b": 2}',
+])
+def test_missing_comma_is_repaired(text):
+    data, _ = parse(text)
+    assert data["b"] == 2 and data["a"] in (1, "x")
+
+
+def test_missing_comma_after_literal():
+    data, _ = parse('{"ok": true "severity": "mild"}')
+    assert data == {"ok": True, "severity": "mild"}
+
+
+def test_quote_inside_string_is_kept():
+    data, recovered = parse('{"summary": "he said "hi" there", "severity": "mild"}')
+    assert data == {"summary": 'he said "hi" there', "severity": "mild"}
+    assert recovered == ["summary"]
+
+
+def analyzer():
+    instance = SymptomAnalyzer.__new__(SymptomAnalyzer)
+    instance._log_blocked = lambda *args: None
+    return instance
+
+
+def test_unparseable_response_raises():
+    with pytest.raises(UnparseableResponse):
+        analyzer()._parse_llm_response("I'm sorry, I can't help with that.", "fever and cough")
+
+
+def test_unparseable_response_fails_over():
+    def garbled(request, deadline):
+        return analyzer()._parse_llm_response("no json here", request["symptoms"])
+
+    def healthy(request, deadline):
+        return analyzer()._parse_llm_response('{"severity": "moderate", "summary": "Viral fever"}', request["symptoms"])
+
+    router = LLMRouter([Provider("gemini", garbled), Provider("openai", healthy)])
+    name, analysis = router.route({"symptoms": "fever and cough"}, deadline=float("inf"))
+    assert name == "openai"
+    assert analysis["severity"] == "moderate"
@@ -0,0 +1,52 @@
+"""Provider failover: when Gemini fails, the OpenAI provider's answer is served"""
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import openai
+
+from llm_service import SymptomAnalyzer
+from semantic_cache import SemanticCache
+
+ANSWER = '{"severity": "moderate", "summary": "Likely viral fever", "recommendations": ["Rest"], "warnings": [], "next_steps": []}'
+
+
+class FailingGemini:
+    def generate_content(self, *args, **kwargs):
+        raise ConnectionError("gemini unreachable")
+
+
+class FakeOpenAI:
+    calls = []
+
+    def __init__(self, api_key=None, timeout=None, max_retries=None):
+        self.options = {"api_key": api_key, "timeout": timeout, "max_retries": max_retries}
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        FakeOpenAI.calls.append({**self.options, **kwargs})
+        message = SimpleNamespace(content=ANSWER)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def test_secondary_provider_answers(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    monkeypatch.setattr(openai, "OpenAI", FakeOpenAI)
+
+    analyzer = SymptomAnalyzer()
+    analyzer.api_token = "test"
+    analyzer.model = FailingGemini()
+    analyzer.cache = SemanticCache(max_entries=10, ttl=60, threshold=0.85)
+
+    result = analyzer.analyze_symptoms("fever and body ache since yesterday")
+    assert result["provider"] == "openai"
+    assert result["severity"] == "moderate"
+    assert result.get("source") != "local_fallback"
+
+    call = FakeOpenAI.calls[-1]
+    assert call["api_key"] == "sk-test" and call["max_retries"] == 0
+    assert 0 < call["timeout"] <= 30
+    assert call["messages"][0]["role"] == "user"
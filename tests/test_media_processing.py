@@ -0,0 +1,40 @@
+"""Media pool: renders off the app process and survives a crashed worker"""
+import io
+import os
+import sys
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+import media_processing
+from media_processing import media_pool, render_thumbnail, run_media
+
+pytestmark = pytest.mark.skipif(not media_processing.PIL_AVAILABLE, reason="Pillow not installed")
+
+
+def png(size=(800, 600)):
+    from PIL import Image
+
+    out = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(out, "PNG")
+    return out.getvalue()
+
+
+def test_pool_does_not_fork():
+    assert media_pool()._mp_context.get_start_method() in ("forkserver", "spawn")
+
+
+def test_thumbnail_renders_in_pool():
+    data, content_type = run_media(render_thumbnail, png(), "image/png")
+    assert content_type == "image/webp" and data[:4] == b"RIFF"
+
+
+def test_broken_pool_is_rebuilt():
+    broken = media_pool()
+    with pytest.raises(BrokenProcessPool):
+        run_media(os._exit, 1)  # the worker dies mid-job
+    assert media_pool() is not broken
+    assert run_media(render_thumbnail, png((64, 64)), "image/png")[1] == "image/webp"
@@ -0,0 +1,66 @@
+"""Password hashing cost: calibrated once, never below the floor, only upgraded"""
+import os
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import bcrypt
+import pytest
+
+from password_hashing import PASSWORD_HASH_MIN_COST, PasswordHasher, PasswordHashingBusy
+
+
+def hashed_at(cost):
+    return bcrypt.hashpw(b"secret", bcrypt.gensalt(cost)).decode()
+
+
+def test_only_lower_costs_are_rehashed():
+    hasher = PasswordHasher()
+    hasher.cost = 12
+    assert hasher.needs_rehash(hashed_at(10))
+    assert not hasher.needs_rehash(hashed_at(12))
+    assert not hasher.needs_rehash(hashed_at(13))
+
+
+def test_calibration_is_floored_and_exported(monkeypatch):
+    monkeypatch.delenv("PASSWORD_HASH_COST", raising=False)
+    assert PASSWORD_HASH_MIN_COST >= 12
+    hasher = PasswordHasher()
+    cost = hasher.calibrate(target_ms=1)  # too small for any cost: the floor wins
+    assert cost == PASSWORD_HASH_MIN_COST
+    assert os.environ["PASSWORD_HASH_COST"] == str(cost)
+
+
+def test_later_processes_reuse_the_calibrated_cost(monkeypatch):
+    monkeypatch.setenv("PASSWORD_HASH_COST", "13")
+    hasher = PasswordHasher()
+    assert hasher.calibrate() == 13
+    assert hasher.cost == 13
+
+
+def test_timed_out_job_keeps_its_slot_until_it_finishes():
+    release = threading.Event()
+    hasher = PasswordHasher(workers=1, queue_size=0, timeout=0.05)
+    with pytest.raises(PasswordHashingBusy):
+        hasher._run(release.wait)
+    with pytest.raises(PasswordHashingBusy, match="queue is full"):
+        hasher._run(lambda: True)  # the abandoned job is still running
+    release.set()
+    hasher._executor.shutdown(wait=True)  # the finished job's callback has released its slot
+    hasher._executor = None
+    assert hasher._run(lambda: True) is True
+    assert hasher.metrics()["rejected"] == 2
+
+
+def test_cancelled_queued_job_frees_its_slot():
+    release = threading.Event()
+    hasher = PasswordHasher(workers=1, queue_size=1, timeout=0.05)
+    with pytest.raises(PasswordHashingBusy):
+        hasher._run(release.wait)  # occupies the only worker
+    with pytest.raises(PasswordHashingBusy, match="longer than"):
+        hasher._run(lambda: True)  # queued behind it, then cancelled
+    with pytest.raises(PasswordHashingBusy, match="longer than"):
+        hasher._run(lambda: True)  # the cancelled job's slot is free again
+    release.set()
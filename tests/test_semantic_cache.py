@@ -0,0 +1,49 @@
+"""Semantic cache reuse rules: phrasing is forgiven, clinical differences never are"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from semantic_cache import SemanticCache
+
+BASE = "fever, headache, cough, body ache, sore throat, vomiting and runny nose"
+MILD = {"severity": "mild", "summary": "Likely viral illness"}
+
+
+def make_cache():
+    cache = SemanticCache(max_entries=100, ttl=3600, threshold=0.85)
+    cache.store(BASE, MILD)
+    return cache
+
+
+def test_paraphrase_reuses_analysis():
+    cache = make_cache()
+    hit = cache.lookup("feverish with headache, coughing, body ache, throat pain, throwing up and running nose")
+    assert hit is not None and hit["severity"] == "mild"
+    assert cache.lookup("runny nose, sore throat, cough, headache, fever, vomiting and body ache") is not None
+
+
+def test_added_red_flag_never_reuses_analysis():
+    cache = make_cache()
+    for extra in ("seizure", "confusion", "blood in vomit", "stiff neck", "fainted", "can't breathe", "chest pain"):
+        assert cache.lookup(f"{BASE} + {extra}") is None, extra
+
+
+def test_red_flag_on_cached_side_only_is_not_reused():
+    cache = SemanticCache(max_entries=100, ttl=3600, threshold=0.85)
+    cache.store(f"{BASE} and blood in stool", {"severity": "severe"})
+    assert cache.lookup(BASE) is None
+
+
+def test_added_symptom_or_negation_is_not_reused():
+    cache = make_cache()
+    assert cache.lookup(f"{BASE} and diarrhoea") is None
+    cache.store("cough and fever for 2 days", MILD)
+    assert cache.lookup("cough and no fever for 2 days") is None
+
+
+def test_context_must_match():
+    cache = SemanticCache(max_entries=100, ttl=3600, threshold=0.85)
+    cache.store(BASE, MILD, age=30, gender="female")
+    assert cache.lookup(BASE, age=30, gender="Female") is not None
+    assert cache.lookup(BASE, age=70, gender="female") is None
@@ -0,0 +1,54 @@
+"""Local triage when no provider answers: never rated below the keyword fallback"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from llm_service import SymptomAnalyzer
+from triage_model import merge_fallback, train_triage_model
+
+MODEL = train_triage_model([])
+
+
+def local_triage(text):
+    fallback = SymptomAnalyzer.__new__(SymptomAnalyzer).local_fallback(text)
+    return merge_fallback(MODEL.predict(text, floor=fallback["severity"]), fallback), fallback
+
+
+@pytest.mark.parametrize("text", [
+    "blood in my stool",
+    "coughing up blood for 2 days",
+    "chest is paining a lot",
+    "I can't breathe properly since morning",
+    "fainted twice today",
+    "fever and confused since last night",
+    "high fever with a stiff neck",
+])
+def test_red_flags_are_severe(text):
+    assert MODEL.predict(text)["severity"] == "severe"
+    assert local_triage(text)[0]["severity"] == "severe"
+
+
+def test_minor_bleeding_is_not_a_red_flag():
+    assert MODEL.predict("small cut on finger, minor bleeding stopped")["severity"] == "mild"
+
+
+def test_floor_raises_severity():
+    assert MODEL.predict("runny nose and sneezing", floor="moderate")["severity"] == "moderate"
+    assert MODEL.predict("runny nose and sneezing", floor="mild")["severity"] == "mild"
+
+
+def test_fallback_warnings_and_cardiac_advice_survive():
+    result, fallback = local_triage("my chest pain started an hour ago")
+    assert result["severity"] == "severe"
+    assert result["source"] == "local_triage"
+    assert set(fallback["warnings"]) <= set(result["warnings"])
+    assert result["recommendations"][:len(fallback["recommendations"])] == fallback["recommendations"]
+
+
+def test_generic_fallback_keeps_model_advice_first():
+    result, fallback = local_triage("high fever with body ache")
+    assert result["recommendations"][0] == "Book a consultation with a doctor within the next day"
+    assert set(fallback["warnings"]) <= set(result["warnings"])
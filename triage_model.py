@@ -0,0 +1,223 @@
+"""
+Local triage model for instant symptom severity
+A small multinomial naive Bayes classifier (pure Python, CPU only) trained from
+historical consultations (primary_symptoms labelled by the severity recorded in
+llm_summary), the Disease/Symptom tables and a built-in seed set. It answers in
+well under a millisecond, so analyses can show a preliminary result while the
+LLM is still working, or when it never answers.
+"""
+
+import math
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+SEVERITIES = ('mild', 'moderate', 'severe')
+
+# Matches the auto-summary format written by request_consultation
+SUMMARY_SEVERITY = re.compile(r"severity:\s*(mild|moderate|severe)", re.IGNORECASE)
+
+# Phrases that always warrant urgent care, whatever the classifier says
+RED_FLAGS = (
+    'chest pain', 'chest is paining', 'heart pain', 'heart is paining', 'crushing pain',
+    'difficulty breathing', 'shortness of breath', "can't breathe", 'cannot breathe',
+    'unable to breathe', 'trouble breathing', 'struggling to breathe', 'breathless', 'gasping',
+    'unconscious', 'fainted', 'fainting', 'passed out', 'collapsed',
+    'seizure', 'confusion', 'confused', 'disoriented', 'stiff neck', 'neck stiffness',
+    'blood in', 'blood from', 'bloody', 'vomiting blood', 'coughing blood', 'coughing up blood',
+    'spitting blood', 'severe bleeding', 'heavy bleeding', 'bleeding heavily', 'rectal bleeding',
+    'slurred speech', 'face drooping',
+)
+
+# Labelled seed examples so the model is usable on an empty database
+SEED_EXAMPLES = [
+    ("runny nose and sneezing since this morning", 'mild'),
+    ("mild sore throat and a slight cough", 'mild'),
+    ("small cut on finger, minor bleeding stopped", 'mild'),
+    ("itchy skin rash on my arm for two days", 'mild'),
+    ("feeling a bit tired after poor sleep", 'mild'),
+    ("occasional sneezing and watery eyes from dust", 'mild'),
+    ("mild acidity after spicy food", 'mild'),
+    ("slight headache after long screen time", 'mild'),
+    ("dry lips and mild dehydration in summer", 'mild'),
+    ("minor muscle soreness after exercise", 'mild'),
+    ("high fever with body ache for three days", 'moderate'),
+    ("persistent cough with yellow phlegm for a week", 'moderate'),
+    ("vomiting and diarrhea since last night", 'moderate'),
+    ("severe headache with nausea and sensitivity to light", 'moderate'),
+    ("burning urination and lower abdominal pain", 'moderate'),
+    ("ear pain with fever in child", 'moderate'),
+    ("painful swollen ankle after a fall, can walk with difficulty", 'moderate'),
+    ("stomach pain and loose motions after eating outside", 'moderate'),
+    ("fever with chills and joint pain", 'moderate'),
+    ("back pain radiating to leg for two weeks", 'moderate'),
+    ("crushing chest pain spreading to left arm with sweating", 'severe'),
+    ("sudden shortness of breath and bluish lips", 'severe'),
+    ("difficulty breathing and wheezing not relieved by inhaler", 'severe'),
+    ("seizure lasting several minutes, now confused", 'severe'),
+    ("sudden weakness on one side and slurred speech", 'severe'),
+    ("vomiting blood and black stools", 'severe'),
+    ("unconscious after head injury", 'severe'),
+    ("severe bleeding that will not stop", 'severe'),
+    ("high fever with stiff neck and confusion", 'severe'),
+    ("severe abdominal pain with rigid belly and fainting", 'severe'),
+]
+
+_TOKEN = re.compile(r"[a-z]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word unigrams plus bigrams"""
+    words = _TOKEN.findall(text.lower())
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+def severity_from_summary(llm_summary: Optional[str]) -> Optional[str]:
+    match = SUMMARY_SEVERITY.search(llm_summary or '')
+    return match.group(1).lower() if match else None
+
+
+class TriageModel:
+    """Multinomial naive Bayes over symptom text, with a red-flag override"""
+
+    def __init__(self, alpha: float = 1.0):
+        self.alpha = alpha
+        self.doc_counts = Counter()
+        self.token_counts: Dict[str, Counter] = {s: Counter() for s in SEVERITIES}
+        self.token_totals = Counter()
+        self.vocabulary = set()
+        self.diseases: List[Tuple[str, frozenset, Optional[str]]] = []
+        self.trained_at = 0.0
+        self.examples = 0
+        self._log_prior: Dict[str, float] = {}
+        self._log_unseen: Dict[str, float] = {}
+        self._log_likelihood: Dict[str, Dict[str, float]] = {}
+
+    def fit(self, examples: Iterable[Tuple[str, str]], diseases: Sequence[Tuple[str, Sequence[str], Optional[str]]] = ()) -> "TriageModel":
+        """Train on (text, severity) pairs; diseases are (name, symptom names, precaution) for condition hints"""
+        for text, severity in examples:
+            if severity not in SEVERITIES or not text:
+                continue
+            tokens = tokenize(text)
+            self.doc_counts[severity] += 1
+            self.token_counts[severity].update(tokens)
+            self.token_totals[severity] += len(tokens)
+            self.vocabulary.update(tokens)
+            self.examples += 1
+
+        self.diseases = [(name, frozenset(s.lower() for s in symptoms), precaution) for name, symptoms, precaution in diseases if symptoms]
+        for _, symptoms, _ in self.diseases:
+            for symptom in symptoms:
+                self.vocabulary.update(tokenize(symptom))
+
+        # Precompute log probabilities so predict() is a dictionary lookup per token
+        total_docs = sum(self.doc_counts.values()) or 1
+        vocab_size = len(self.vocabulary) or 1
+        for severity in SEVERITIES:
+            denominator = self.token_totals[severity] + self.alpha * vocab_size
+            self._log_prior[severity] = math.log((self.doc_counts[severity] + 1) / (total_docs + len(SEVERITIES)))
+            self._log_unseen[severity] = math.log(self.alpha / denominator)
+            self._log_likelihood[severity] = {
+                token: math.log((count + self.alpha) / denominator)
+                for token, count in self.token_counts[severity].items()
+            }
+        self.trained_at = time.time()
+        return self
+
+    def classify(self, text: str) -> Tuple[str, float]:
+        """(severity, posterior probability)"""
+        tokens = [t for t in tokenize(text) if t in self.vocabulary]
+        scores = {}
+        for severity in SEVERITIES:
+            likelihood = self._log_likelihood.get(severity, {})
+            unseen = self._log_unseen.get(severity, 0.0)
+            scores[severity] = self._log_prior.get(severity, 0.0) + sum(likelihood.get(t, unseen) for t in tokens)
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        norm = sum(math.exp(score - top) for score in scores.values())
+        confidence = 1.0 / norm
+
+        lowered = text.lower()
+        if best != 'severe' and any(flag in lowered for flag in RED_FLAGS):
+            return 'severe', max(confidence, 0.9)
+        return best, confidence
+
+    def possible_conditions(self, text: str, limit: int = 3) -> List[Tuple[str, Optional[str]]]:
+        lowered = text.lower()
+        ranked = []
+        for name, symptoms, precaution in self.diseases:
+            overlap = sum(1 for symptom in symptoms if symptom in lowered)
+            if overlap:
+                ranked.append((overlap / len(symptoms), overlap, name, precaution))
+        ranked.sort(reverse=True)
+        return [(name, precaution) for _, _, name, precaution in ranked[:limit]]
+
+    def predict(self, text: str, floor: Optional[str] = None) -> Dict:
+        """Analysis-shaped result (same keys as SymptomAnalyzer.analyze_symptoms), never below `floor`"""
+        started = time.perf_counter()
+        severity, confidence = self.classify(text)
+        if floor in SEVERITIES and SEVERITIES.index(floor) > SEVERITIES.index(severity):
+            severity = floor
+        conditions = self.possible_conditions(text)
+        names = [name for name, _ in conditions]
+
+        summary = f"Quick local assessment suggests {severity} symptoms"
+        if names:
+            summary += f", possibly consistent with {' or '.join(names)}"
+        summary += "."
+
+        recommendations = [precaution for _, precaution in conditions if precaution]
+        recommendations += {
+            'mild': ["Rest, stay hydrated and monitor your symptoms for the next 24-48 hours"],
+            'moderate': ["Book a consultation with a doctor within the next day", "Rest and maintain hydration"],
+            'severe': ["Seek medical care immediately", "Call 108 if symptoms are life-threatening"],
+        }[severity]
+
+        warnings = ["Go to the nearest emergency department now if symptoms worsen"] if severity == 'severe' else [
+            "Seek care if you develop difficulty breathing, chest pain or confusion",
+            "See a doctor if symptoms persist beyond 3 days or get worse",
+        ]
+
+        return {
+            'severity': severity,
+            'summary': summary,
+            'recommendations': recommendations[:6],
+            'warnings': warnings,
+            'next_steps': ["Review the full AI analysis or consult a doctor for a proper assessment"],
+            'possible_conditions': names,
+            'confidence': round(confidence, 3),
+            'source': 'local_triage',
+            'latency_ms': round((time.perf_counter() - started) * 1000, 3),
+        }
+
+
+def _union(first: Sequence[str], second: Sequence[str]) -> List[str]:
+    return list(dict.fromkeys([*first, *second]))
+
+
+def merge_fallback(result: Dict, fallback: Dict) -> Dict:
+    """Fold the keyword fallback into a prediction made with floor=fallback severity
+
+    Neither side may lower the other: the prediction already carries the higher
+    severity, every fallback warning is kept, and condition-specific fallback
+    advice (the cardiac instructions) leads the generic recommendations.
+    """
+    merged = dict(result)
+    fallback_leads = bool(fallback.get('possible_conditions'))
+    merged['possible_conditions'] = _union(fallback.get('possible_conditions', []), result.get('possible_conditions', []))
+    for key, limit in (('recommendations', 8), ('next_steps', 4)):
+        ours, theirs = result.get(key, []), fallback.get(key, [])
+        merged[key] = (_union(theirs, ours) if fallback_leads else _union(ours, theirs))[:limit]
+    merged['warnings'] = _union(fallback.get('warnings', []), result.get('warnings', []))
+    return merged
+
+
+def train_triage_model(consultations: Iterable[Tuple[Optional[str], Optional[str]]], diseases: Sequence[Tuple[str, Sequence[str], Optional[str]]] = ()) -> TriageModel:
+    """Train from (primary_symptoms, llm_summary) rows plus the seed set"""
+    examples = list(SEED_EXAMPLES)
+    for symptoms, llm_summary in consultations:
+        severity = severity_from_summary(llm_summary)
+        if symptoms and severity:
+            examples.append((symptoms, severity))
+    return TriageModel().fit(examples, diseases)